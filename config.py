@@ -6,6 +6,13 @@ IB_HOST = "127.0.0.1"
 IB_PORT = 7497
 CLIENT_ID = 99
 
+# Flux live : profondeur L2 (reqMktDepth) par contrat.
+# IB limite le nombre de carnets simultanés : DEPTH_SYMBOLS = None souscrit tous les contrats.
+DEPTH_ROWS = 10
+DEPTH_SYMBOLS = None
+# Tick-by-tick 'BidAsk' (classement exact de l'agresseur) : sinon la meilleure limite du DOM sert de référence.
+TBT_BID_ASK_SYMBOLS = ()
+
 # Définition des Paires (Gauche, Droite)
 # Le robot affichera une fenêtre par paire.
 PAIRS = [
@@ -28,6 +35,9 @@ for p in PAIRS:
 # Paramètres graphiques
 ROW_HEIGHT = 20
 MAX_ROWS = 120
+# Un widget dont les données n'ont pas changé est tout de même redessiné après ce délai
+# (fenêtres glissantes qui vieillissent, vitesse de marché...)
+GUI_REFRESH_MAX_AGE_SEC = 1.0
 
 # config.py (Ajout à la fin)
 
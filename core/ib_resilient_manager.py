@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # core/ib_resilient_manager.py
-# IB Resilient Manager — v1.9 (debounce reco + auto-heal + rebind hook)
+# IB Resilient Manager — v2.0 (debounce reco + auto-heal + rebind hook + subs TBT/L2)
 from __future__ import annotations
 
 import asyncio, logging, random, time, contextlib
@@ -32,6 +32,10 @@ class SubRecord:
     regulatorySnapshot: bool = False
     options: Optional[list] = None
     ticker: Optional[Ticker] = None
+    kind: str = "mkt"                 # "mkt" (reqMktData) | "tbt" (reqTickByTickData) | "depth" (reqMktDepth)
+    tickType: str = "AllLast"         # tbt
+    numRows: int = 10                 # depth
+    isSmartDepth: bool = False        # depth
 
 @dataclass
 class IBResilientManager:
@@ -100,40 +104,39 @@ class IBResilientManager:
         Enregistre une souscription reqMktData, persistante à travers les reco.
         """
         rec = SubRecord(contract, genericTickList, snapshot, regulatorySnapshot, options)
-        self._subs[key] = rec
+        return self._register(key, rec)
 
-        if not self.ib.isConnected():
-            return None
-
-        # Idempotent côté IB : refaire reqMarketDataType(1) ne casse rien.
-        with contextlib.suppress(Exception):
-            self.ib.reqMarketDataType(1)
+    def subscribe_tick_by_tick(self, key: str, contract: Contract, tickType: str = "AllLast") -> Optional[Ticker]:
+        """
+        Enregistre une souscription reqTickByTickData, persistante à travers les reco.
+        """
+        return self._register(key, SubRecord(contract, kind="tbt", tickType=tickType))
 
-        try:
-            t = self.ib.reqMktData(
-                contract,
-                genericTickList=genericTickList,
-                snapshot=snapshot,
-                regulatorySnapshot=regulatorySnapshot,
-                mktDataOptions=options
-            )
-            rec.ticker = t
-            return t
-        except Exception as e:
-            log.error(f"[IBRM] subscribe({key}) failed: {e}")
-            return None
+    def subscribe_depth(self, key: str, contract: Contract, numRows: int = 10,
+                        isSmartDepth: bool = False) -> Optional[Ticker]:
+        """
+        Enregistre une souscription reqMktDepth (L2), persistante à travers les reco.
+        """
+        return self._register(key, SubRecord(contract, kind="depth", numRows=numRows, isSmartDepth=isSmartDepth))
 
     def unsubscribe(self, key: str) -> None:
         rec = self._subs.pop(key, None)
         if not rec:
             return
-        # Annule “proprement” via le Contract (plus robuste)
-        with contextlib.suppress(Exception):
-            if rec.ticker is not None and getattr(rec.ticker, "contract", None):
-                self.ib.cancelMktData(rec.ticker.contract)
-        with contextlib.suppress(Exception):
-            if rec.ticker is not None:
-                self.ib.cancelMktData(rec.ticker)
+        if rec.kind == "tbt":
+            with contextlib.suppress(Exception):
+                self.ib.cancelTickByTickData(rec.contract, rec.tickType)
+        elif rec.kind == "depth":
+            with contextlib.suppress(Exception):
+                self.ib.cancelMktDepth(rec.contract, isSmartDepth=rec.isSmartDepth)
+        else:
+            # Annule “proprement” via le Contract (plus robuste)
+            with contextlib.suppress(Exception):
+                if rec.ticker is not None and getattr(rec.ticker, "contract", None):
+                    self.ib.cancelMktData(rec.ticker.contract)
+            with contextlib.suppress(Exception):
+                if rec.ticker is not None:
+                    self.ib.cancelMktData(rec.ticker)
         rec.ticker = None
 
     def tickers(self) -> Dict[str, Ticker]:
@@ -142,6 +145,36 @@ class IBResilientManager:
     # ════════════════════════════════════════════════════════
     # Internals
     # ════════════════════════════════════════════════════════
+    def _register(self, key: str, rec: SubRecord) -> Optional[Ticker]:
+        self._subs[key] = rec
+
+        if not self.ib.isConnected():
+            return None
+
+        # Idempotent côté IB : refaire reqMarketDataType(1) ne casse rien.
+        with contextlib.suppress(Exception):
+            self.ib.reqMarketDataType(1)
+
+        try:
+            rec.ticker = self._request(rec)
+            return rec.ticker
+        except Exception as e:
+            log.error(f"[IBRM] subscribe({key}) failed: {e}")
+            return None
+
+    def _request(self, rec: SubRecord) -> Ticker:
+        if rec.kind == "tbt":
+            return self.ib.reqTickByTickData(rec.contract, rec.tickType)
+        if rec.kind == "depth":
+            return self.ib.reqMktDepth(rec.contract, numRows=rec.numRows, isSmartDepth=rec.isSmartDepth)
+        return self.ib.reqMktData(
+            rec.contract,
+            genericTickList=rec.genericTickList,
+            snapshot=rec.snapshot,
+            regulatorySnapshot=rec.regulatorySnapshot,
+            mktDataOptions=rec.options
+        )
+
     def _attach_handlers(self) -> None:
         # Évite doublons quand on recrée IB (auto-heal)
         with contextlib.suppress(Exception):
@@ -257,18 +290,12 @@ class IBResilientManager:
             log.error("[IBRM] on_rebind_ib error: %s", e)
 
     async def _resubscribe_all(self) -> None:
-        # Re-issue reqMktData pour chaque sub connue (idempotent côté TWS)
+        # Re-issue reqMktData / reqTickByTickData / reqMktDepth pour chaque sub connue (idempotent côté TWS)
         with contextlib.suppress(Exception):
             self.ib.reqMarketDataType(1)
         for key, rec in self._subs.items():
             try:
-                rec.ticker = self.ib.reqMktData(
-                    rec.contract,
-                    genericTickList=rec.genericTickList,
-                    snapshot=rec.snapshot,
-                    regulatorySnapshot=rec.regulatorySnapshot,
-                    mktDataOptions=rec.options
-                )
+                rec.ticker = self._request(rec)
                 log.info("[IBRM] Resub %s ✓", key)
             except Exception as e:
                 log.error("[IBRM] Resub %s failed: %s", key, e)
@@ -282,8 +309,8 @@ class IBResilientManager:
                 if not t:
                     continue
                 try:
-                    # “vivant” si on observe last/close/marketPrice
-                    if (t.last is not None) or (t.close is not None) or (t.marketPrice() is not None):
+                    # “vivant” si on observe last/close/marketPrice (ou un carnet L2 non vide)
+                    if (t.last is not None) or (t.close is not None) or (t.marketPrice() is not None) or t.domBids:
                         ready += 1
                 except Exception:
                     pass
@@ -1,14 +1,47 @@
 # engine/aggregator.py
 from __future__ import annotations
-import os, pickle, atexit, threading, time
-from collections import defaultdict, deque
+import os, atexit, logging, threading, time
+from collections import defaultdict
+from types import MappingProxyType
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Tuple, Optional, Any
+
+import numpy as np
+
+from engine.candles import CandleSeries
+from engine.depth_book import ASK, BID, DepthBook
+from engine.liquidity import LiquidityHistory
+from engine.journal import TickJournal, read_checkpoint, write_checkpoint
+from engine.session_store import LevelArray, levels_path, open_levels, purge_levels, save_levels
+from engine.tick_store import TICK_BYTES, TickStore
+
+log = logging.getLogger("Aggregator")
 
 DEBUG_VOLUME = False 
 MAX_VALID_TICK_SIZE = 5000 
 
+# Fenêtres affichées par MultiHorizonWidget (S/M/L) : maintenues dès la création du profil
+LADDER_WINDOWS = {"s": ("time", 5), "m": ("time", 30), "l": ("vol", 10000)}
+DEFAULT_PROFILE_WINDOWS = tuple(LADDER_WINDOWS.values())
+# Instantanés UI : bougies publiées par série ; republication périodique (s) pour que
+# les fenêtres temporelles vieillissent même sans tick
+SNAPSHOT_CANDLES = 100
+SNAPSHOT_REFRESH_SEC = 1.0
+# Éviction : marge (s) au-delà de l'horizon avant de purger par lot ; fraction purgée au plafond dur
+EVICT_BATCH_SEC = 30
+CAP_EVICT_FRACTION = 0.1
+# Déséquilibre du carnet publié aux instantanés : n meilleurs niveaux de chaque côté
+DOM_IMBALANCE_LEVELS = 5
+# Horodatage : écart horloge locale / échange (ms) au-delà duquel on prévient, au plus une fois par période (s)
+CLOCK_SKEW_WARN_MS = 2000.0
+CLOCK_SKEW_LOG_EVERY_SEC = 300.0
+# Fenêtres sans niveaux de prix : VWAP glissant 60 min et vitesse de marché 60 s
+DEFAULT_STAT_WINDOWS = (("time", 60), ("sec", 60))
+
+# Résolutions proposées par MiniChartWidget (secondes) : maintenues dès le premier tick
+DEFAULT_CANDLE_SERIES = tuple(("time", sec) for sec in (5, 15, 30, 60, 300, 900, 3600))
+
 NY = ZoneInfo("America/New_York")
 def _session_key() -> str:
     now = datetime.now(tz=NY)
@@ -17,142 +50,323 @@ def _session_key() -> str:
 _DATA_DIR = "./data"
 os.makedirs(_DATA_DIR, exist_ok=True)
 
-def _snap_to_grid(px: float, tick: float) -> float:
-    if tick <= 0: return float(px)
-    steps = round(px / tick)
-    val = steps * tick
-    return float(f"{val:.6f}")
+def _tick_index(px: float, tick: float) -> int:
+    """Prix → index de tick entier (clé exacte des dicts de volume / DOM)."""
+    return int(round(px / tick)) if tick > 0 else int(round(px))
+
+def _px_of(idx, tick: float) -> float:
+    """Index de tick → prix affichable (uniquement en bordure d'affichage)."""
+    return float(f"{idx * tick:.6f}")
+
+# Fenêtres temporelles : multiplicateur unité → secondes
+_TIME_UNITS = {"time": 60, "sec": 1}
+
+def group_bucket(tick_idx: int, grp: int) -> int:
+    """Index de tick → index de groupe (arrondi au plus proche, demi vers le haut)."""
+    return (tick_idx + grp // 2) // grp if grp > 1 else tick_idx
+
+def _group_levels(vol: dict, grp: int, delta: Optional[dict] = None):
+    """Regroupe {index de tick: valeur} par paquets de 'grp' ticks en une passe vectorisée."""
+    if grp <= 1 or not vol: return dict(vol), (dict(delta) if delta is not None else None)
+    keys = np.fromiter(vol.keys(), dtype=np.int64, count=len(vol))
+    buckets, inv = np.unique((keys + grp // 2) // grp, return_inverse=True)
+    b_list = buckets.tolist()
+    g_vol = dict(zip(b_list, np.bincount(inv, weights=np.fromiter(vol.values(), dtype=np.float64, count=len(vol))).tolist()))
+    if delta is None: return g_vol, None
+    d = np.fromiter((delta.get(k, 0.0) for k in vol.keys()), dtype=np.float64, count=len(vol))
+    return g_vol, dict(zip(b_list, np.bincount(inv, weights=d).tolist()))
+
+class LadderView(NamedTuple):
+    """Échelle DOM pré-groupée pour un (symbole, facteur) : clés = index de groupe."""
+    grp: int
+    vol: Dict[str, Dict[int, float]] # "s" / "m" / "l" (LADDER_WINDOWS)
+    delta: Dict[int, float]          # delta de la fenêtre courte
+    bids: Dict[int, float]
+    asks: Dict[int, float]
+    max_vol: float
+
+class SymbolSnapshot(NamedTuple):
+    """
+    État d'un symbole publié par le thread moteur (une fois par lot) et lu sans verrou
+    par le thread Tk. Rien n'est modifié après publication : le moteur remplace
+    l'instantané entier, ce qui est une simple affectation d'entrée de dict.
+    """
+    version: int
+    ts: float
+    tick_size: float
+    last_tick: Optional[int]
+    speed: float                                      # volume des 60 dernières secondes
+    vwap_60: Optional[float]                          # VWAP glissant 60 min
+    vol: Mapping[str, Mapping[int, float]]            # fenêtres LADDER_WINDOWS, clés = index de tick
+    delta: Mapping[int, float]                        # delta de la fenêtre courte
+    bids: Mapping[int, int]
+    asks: Mapping[int, int]
+    candles: Mapping[Tuple[str, int], tuple]          # (mode, valeur) -> dernières bougies
+    imbalance: float = 0.0                            # déséquilibre du carnet (bid - ask) / (bid + ask), DOM_IMBALANCE_LEVELS niveaux
+
+    @property
+    def last_price(self) -> Optional[float]:
+        return _px_of(self.last_tick, self.tick_size) if self.last_tick is not None else None
+
+_EMPTY = MappingProxyType({})
+
+class _ProfileWindow:
+    """
+    Fenêtre glissante (temps ou volume) avec cumuls maintenus à l'ajout/retrait.
+    Sans 'levels', seuls les totaux (volume, prix x volume) sont tenus : VWAP / vitesse en O(1).
+    """
+    __slots__ = ("mode", "value", "span", "levels", "tail", "vol", "delta", "total_vol", "total_pv")
+    def __init__(self, mode: str, value: int, tail: int, levels: bool = True):
+        self.mode = mode; self.value = value; self.levels = levels
+        self.span = value * _TIME_UNITS[mode] if mode in _TIME_UNITS else None # secondes (None = fenêtre en volume)
+        self.tail = tail # séquence absolue du plus vieux tick de la fenêtre (dans le TickStore)
+        self.vol = {}; self.delta = {}; self.total_vol = 0.0; self.total_pv = 0.0
+
+    def push(self, px: int, size: float, direction: int):
+        if self.levels:
+            self.vol[px] = self.vol.get(px, 0.0) + size
+            self.delta[px] = self.delta.get(px, 0.0) + (size * direction)
+        self.total_vol += size; self.total_pv += px * size
+
+    def push_many(self, levels, total_vol: float, total_pv: float):
+        """Ajout d'un lot déjà cumulé par niveau : levels = (index de tick, volumes, deltas) en listes."""
+        if self.levels:
+            vol = self.vol; delta = self.delta
+            for p, v, d in zip(*levels): vol[p] = vol.get(p, 0.0) + v; delta[p] = delta.get(p, 0.0) + d
+        self.total_vol += total_vol; self.total_pv += total_pv
+
+    def trim(self, store: TickStore, now: float, history_limit: float, min_seq: int = 0):
+        ts = store._ts; px = store._px; sz = store._size; dr = store._dir
+        i = store.slot(self.tail); end = store._end; forced = store.slot(min_seq) # ticks < min_seq : éviction imposée
+        span = self.span
+        limit = max(now - span, history_limit) if span is not None else history_limit
+        while i < end:
+            size = float(sz[i])
+            if i >= forced and ts[i] >= limit and (span is not None or self.total_vol - size < self.value): break
+            p = int(px[i]); self.total_vol -= size; self.total_pv -= p * size
+            if self.levels:
+                v = self.vol.get(p, 0.0) - size
+                if v <= 1e-9: self.vol.pop(p, None); self.delta.pop(p, None) # niveau vidé → on le retire
+                else: self.vol[p] = v; self.delta[p] = self.delta.get(p, 0.0) - (size * int(dr[i]))
+            i += 1
+        self.tail = store.first_seq + (i - store._start)
+        if i == end: self.total_vol = 0.0; self.total_pv = 0.0 # fenêtre vide : purge la dérive flottante
 
 class RollingProfile:
-    def __init__(self, max_history_sec=7200):
-        self.history = deque() # (ts, px, size, dir)
+    def __init__(self, max_history_sec=7200, windows=(), tick_size=0.25, stat_windows=(), max_ticks=None, max_bytes=None):
+        # max_bytes borne la mémoire allouée (capacité du store), pas seulement les ticks vivants
+        max_slots = max(1, int(max_bytes) // TICK_BYTES) if max_bytes else None
+        self.store = TickStore(max_capacity=max_slots) # colonnes (ts, px en index de tick, size, dir)
         self.max_history_sec = max_history_sec
+        # Plafond dur optionnel (le plus strict des deux), en plus de l'horizon temporel
+        caps = [int(max_ticks)] if max_ticks else []
+        if max_slots: caps.append(max_slots)
+        self.max_ticks = max(1, min(caps)) if caps else None
+        self._evict_at = float("-inf") # filigrane : ts du plus vieux tick + horizon + marge de lot (-inf = à armer)
+        self.evicted_total = 0; self.capped_total = 0
+        self.tick_size = float(tick_size) if tick_size and tick_size > 0 else 0.25
+        self._windows: Dict[Tuple[str, int], _ProfileWindow] = {}
+        for mode, value in windows: self.register_window(mode, value)
+        for mode, value in stat_windows: self.register_window(mode, value, levels=False)
 
-    def add(self, px, size, direction):
+    def __len__(self): return len(self.store)
+
+    def register_window(self, mode: str, value: int, levels: bool = True) -> _ProfileWindow:
+        """Déclare une fenêtre maintenue en continu (remplie depuis l'historique existant)."""
+        key = (mode.lower().strip(), int(value))
+        w = self._windows.get(key)
+        if w is not None and (w.levels or not levels): return w
         now = time.time()
-        self.history.append((now, px, size, direction))
-        if len(self.history) % 100 == 0:
-            limit = now - self.max_history_sec
-            while self.history and self.history[0][0] < limit:
-                self.history.popleft()
+        ts, px, sz, dr = self.store.columns()
+        start = int(np.searchsorted(ts, now - self.max_history_sec, side="left"))
+        if key[0] in _TIME_UNITS: start = max(start, int(np.searchsorted(ts, now - key[1] * _TIME_UNITS[key[0]], side="left")))
+        elif len(sz) > start:
+            cum = np.cumsum(sz[start:][::-1], dtype=np.float64)
+            k = int(np.searchsorted(cum, key[1], side="left")) # 1er cumul (depuis la fin) >= value
+            if k < len(cum): start = len(sz) - 1 - k
+        w = _ProfileWindow(key[0], key[1], self.store.first_seq + start, levels)
+        if len(px) > start:
+            size = sz[start:].astype(np.float64)
+            if levels:
+                lv, inv = np.unique(px[start:], return_inverse=True)
+                vol = np.bincount(inv, weights=size); dlt = np.bincount(inv, weights=size * dr[start:])
+                w.vol = dict(zip(lv.tolist(), vol.tolist())); w.delta = dict(zip(lv.tolist(), dlt.tolist()))
+            w.total_vol = float(size.sum()); w.total_pv = float(np.dot(px[start:].astype(np.float64), size))
+        self._windows[key] = w
+        return w
 
-    def get_profile(self, mode: str, value: int):
-        data = defaultdict(float)
-        delta = defaultdict(float)
-        mode_clean = mode.lower().strip()
-        
-        # --- BLINDAGE LECTURE HISTORIQUE ---
-        # On prépare les variables de boucle pour éviter les erreurs de crash
-        
-        if mode_clean == "time":
-            now = time.time()
-            limit = now - (value * 60)
-            for i in range(len(self.history) - 1, -1, -1):
-                item = self.history[i]
-                # Protection contre vieux format (qui n'avait pas direction)
-                if len(item) == 4: ts, px, size, direction = item
-                else: ts, px, size = item[0], item[1], item[2]; direction = 1
-                
-                if ts < limit: break
-                data[px] += size
-                delta[px] += (size * direction)
-                
-        elif mode_clean == "vol":
-            cum_vol = 0
-            for i in range(len(self.history) - 1, -1, -1):
-                item = self.history[i]
-                if len(item) == 4: ts, px, size, direction = item
-                else: ts, px, size = item[0], item[1], item[2]; direction = 1
-                
-                cum_vol += size
-                data[px] += size
-                delta[px] += (size * direction)
-                if cum_vol >= value: break 
+    def add(self, p: int, size, direction, now: Optional[float] = None):
+        """Ajoute un tick ; 'p' est l'index de tick du prix."""
+        if now is None: now = time.time()
+        if self.max_ticks is not None and len(self.store) >= self.max_ticks: self._evict_overflow(now, 1) # place faite avant l'ajout
+        self.store.append(now, p, size, direction)
+        history_limit = now - self.max_history_sec
+        for w in self._windows.values():
+            w.push(p, size, direction); w.trim(self.store, now, history_limit)
+        if now >= self._evict_at: self.evict(now)
+
+    def add_batch(self, ts, px, size, direction):
+        """
+        Ajoute un lot (colonnes NumPy, ts croissants) : cumuls des fenêtres en une passe,
+        puis un seul trim au ts du dernier tick (même état final que des add() successifs).
+        """
+        if not len(ts): return
+        ts, px, size, direction = self._fit(float(ts[-1]), ts, px, size, direction)
+        self.store.extend(ts, px, size, direction)
+        sz = np.asarray(size, dtype=np.float64)
+        lv, inv = np.unique(px, return_inverse=True)
+        levels = (lv.tolist(), np.bincount(inv, weights=sz).tolist(), np.bincount(inv, weights=sz * direction).tolist())
+        total_vol = float(sz.sum()); total_pv = float(np.dot(px.astype(np.float64), sz))
+        now = float(ts[-1]); history_limit = now - self.max_history_sec
+        for w in self._windows.values():
+            w.push_many(levels, total_vol, total_pv); w.trim(self.store, now, history_limit)
+        if now >= self._evict_at: self.evict(now)
+
+    def load_history(self, ts, px, size, direction):
+        """Chargement en bloc (reprise de session) : colonnes puis fenêtres reconstruites en vectoriel."""
+        now = time.time()
+        if len(ts): self.store.extend(*self._fit(now, ts, px, size, direction))
+        keys = [(k, w.levels) for k, w in self._windows.items()]; self._windows = {}
+        for key, levels in keys: self.register_window(*key, levels=levels)
+        self.evict(now)
+
+    def evict(self, now: Optional[float] = None):
+        """Éviction par lot des ticks plus vieux que l'horizon ; réarme le filigrane."""
+        if now is None: now = time.time()
+        history_limit = now - self.max_history_sec
+        for w in self._windows.values(): w.trim(self.store, now, history_limit) # les fenêtres lâchent ces ticks d'abord
+        self.evicted_total += self.store.drop_before(history_limit)
+        oldest = float(self.store.ts[0]) if len(self.store) else now
+        self._evict_at = oldest + self.max_history_sec + EVICT_BATCH_SEC
+
+    def _fit(self, now: float, ts, px, size, direction):
+        """Fait de la place pour un lot avant de l'ajouter ; un lot plus grand que le plafond n'en garde que la fin."""
+        if self.max_ticks is None: return ts, px, size, direction
+        n = len(ts)
+        if n > self.max_ticks:
+            cut = n - self.max_ticks; self.capped_total += cut; n = self.max_ticks
+            ts, px, size, direction = ts[cut:], px[cut:], size[cut:], direction[cut:]
+        if len(self.store) + n > self.max_ticks: self._evict_overflow(now, n)
+        return ts, px, size, direction
+
+    def _evict_overflow(self, now: float, incoming: int = 0):
+        # On descend sous le plafond (ticks à venir compris) avec une marge pour ne pas évincer à chaque tick
+        excess = min(len(self.store), len(self.store) + incoming - int(self.max_ticks * (1.0 - CAP_EVICT_FRACTION)))
+        min_seq = self.store.first_seq + excess; history_limit = now - self.max_history_sec
+        for w in self._windows.values(): w.trim(self.store, now, history_limit, min_seq)
+        self.capped_total += self.store.drop(excess)
+        self._evict_at = (float(self.store.ts[0]) if len(self.store) else now) + self.max_history_sec + EVICT_BATCH_SEC
+
+    def memory_stats(self) -> dict:
+        return {"ticks": len(self.store), "bytes": len(self.store) * TICK_BYTES, "allocated_bytes": self.store.nbytes,
+                "evicted": self.evicted_total, "capped": self.capped_total}
 
+    def get_profile(self, mode: str, value: int):
+        vol, dlt = self.get_profile_ticks(mode, value)
+        tick = self.tick_size
+        data = defaultdict(float); delta = defaultdict(float)
+        for p, v in vol.items(): px = _px_of(p, tick); data[px] = v; delta[px] = dlt.get(p, 0.0)
         return data, delta
 
+    def get_profile_ticks(self, mode: str, value: int):
+        """Comme get_profile, mais clés = index de tick (copies des cumuls de la fenêtre)."""
+        mode_clean = mode.lower().strip()
+        if mode_clean not in ("time", "vol"): return {}, {}
+        w = self._window(mode_clean, value, levels=True)
+        return dict(w.vol), dict(w.delta)
+
     def get_candles(self, mode: str, value: int, limit_candles=100):
-        if not self.history: return []
-        candles = []
-        hist = list(self.history)
-        current_candle = { "open": None, "high": -float('inf'), "low": float('inf'), "close": None, "vol": 0, "delta": 0, "ts": 0 }
-        bucket_end_time = 0
+        ts, px, sz, dr = self.store.columns()
+        n = len(ts)
+        if not n: return []
         mode_clean = mode.lower().strip()
-        
         if mode_clean == "time":
-            tf_sec = value 
-            if hist:
-                # Protection lecture premier item
-                first_item = hist[0]
-                ts_start = first_item[0]
-                bucket_end_time = (int(ts_start) // tf_sec) * tf_sec + tf_sec
-        
-        for item in hist:
-            # Protection lecture item
-            if len(item) == 4: ts, px, size, direc = item
-            else: ts, px, size = item[0], item[1], item[2]; direc = 1
-
-            is_new = False
-            if mode_clean == "time":
-                if ts >= bucket_end_time:
-                    is_new = True
-                    bucket_end_time = (int(ts) // tf_sec) * tf_sec + tf_sec
-            elif mode_clean == "vol":
-                if current_candle["vol"] >= value: is_new = True
-            
-            if is_new and current_candle["open"] is not None:
-                candles.append(current_candle)
-                current_candle = { "open": None, "high": -float('inf'), "low": float('inf'), "close": None, "vol": 0, "delta": 0, "ts": ts }
-
-            if current_candle["open"] is None: 
-                current_candle["open"] = px; current_candle["ts"] = ts
-            current_candle["high"] = max(current_candle["high"], px)
-            current_candle["low"] = min(current_candle["low"], px)
-            current_candle["close"] = px
-            current_candle["vol"] += size
-            current_candle["delta"] += (size * direc)
-
-        if current_candle["open"] is not None:
-            candles.append(current_candle)
-            
-        return candles[-limit_candles:]
-    
+            # Nouvelle bougie dès que int(ts)//tf dépasse le plus haut seau déjà vu
+            b = ts.astype(np.int64) // max(1, int(value))
+            prev_max = np.maximum.accumulate(b)
+            starts = np.flatnonzero(np.concatenate(([True], b[1:] > prev_max[:-1])))
+        elif mode_clean == "vol":
+            # Une bougie se ferme quand son volume atteint 'value' (avant le tick suivant)
+            cum = np.cumsum(sz, dtype=np.float64)
+            starts_l = [0]; base = 0.0
+            while True:
+                e = int(np.searchsorted(cum, base + value, side="left"))
+                if e >= n - 1: break
+                starts_l.append(e + 1); base = cum[e]
+            starts = np.asarray(starts_l, dtype=np.int64)
+        else:
+            return []
+        starts = starts[-limit_candles:]
+        s0 = int(starts[0]); rel = starts - s0
+        px_w = px[s0:]; sz_w = sz[s0:].astype(np.float64)
+        ends = np.append(starts[1:], n) - 1
+        highs = np.maximum.reduceat(px_w, rel); lows = np.minimum.reduceat(px_w, rel)
+        vols = np.add.reduceat(sz_w, rel); deltas = np.add.reduceat(sz_w * dr[s0:], rel)
+        tick = self.tick_size
+        return [
+            {"open": _px_of(o, tick), "high": _px_of(h, tick), "low": _px_of(l, tick), "close": _px_of(c, tick),
+             "vol": v, "delta": d, "ts": t}
+            for o, h, l, c, v, d, t in zip(px[starts].tolist(), highs.tolist(), lows.tolist(), px[ends].tolist(),
+                                           vols.tolist(), deltas.tolist(), ts[starts].tolist())
+        ]
+
     def get_vwap(self, minutes: int):
-        total_pv = 0.0; total_vol = 0.0
-        now = time.time(); limit = now - (minutes * 60)
-        for i in range(len(self.history) - 1, -1, -1):
-            item = self.history[i]
-            if len(item) == 4: ts, px, size, _ = item
-            else: ts, px, size = item[0], item[1], item[2]
-            
-            if ts < limit: break
-            total_pv += (px * size); total_vol += size
-        return (total_pv / total_vol) if total_vol > 0 else None
+        w = self._window("time", minutes)
+        return (w.total_pv * self.tick_size / w.total_vol) if w.total_vol > 0 else None
+
+    def get_volume(self, seconds: int) -> float:
+        """Volume échangé sur les 'seconds' dernières secondes (vitesse de marché)."""
+        return max(0.0, self._window("sec", seconds).total_vol)
+
+    def _window(self, mode: str, value: int, levels: bool = False) -> _ProfileWindow:
+        w = self._windows.get((mode, int(value)))
+        if w is None or (levels and not w.levels): w = self.register_window(mode, value, levels)
+        now = time.time()
+        w.trim(self.store, now, now - self.max_history_sec) # vieillissement même sans nouveau tick
+        if now >= self._evict_at: self.evict(now) # marché calme : l'horizon est tenu aussi à la lecture
+        return w
 
     def __getstate__(self):
-        return {'history': list(self.history), 'max_history_sec': self.max_history_sec}
+        # Les cumuls se reconstruisent depuis les colonnes : on ne sauve que les clés de fenêtres
+        return {'store': self.store, 'max_history_sec': self.max_history_sec, 'tick_size': self.tick_size,
+                'max_ticks': self.max_ticks, 'windows': [(k, w.levels) for k, w in self._windows.items()]}
     def __setstate__(self, state):
-        self.history = deque(state.get('history', []))
         self.max_history_sec = state.get('max_history_sec', 7200)
+        self.max_ticks = state.get('max_ticks'); self._evict_at = float("-inf")
+        self.evicted_total = 0; self.capped_total = 0
+        self.tick_size = state.get('tick_size', 0.25)
+        self.store = state.get('store') or TickStore()
+        if 'history' in state: # ancien format : liste de tuples (ts, px, size[, dir])
+            for item in state['history']:
+                d = item[3] if len(item) == 4 else 1
+                self.store.append(item[0], int(round(item[1] / self.tick_size)), item[2], d)
+        self._windows = {}
+        for key in state.get('windows', DEFAULT_PROFILE_WINDOWS):
+            if isinstance(key[0], tuple): self.register_window(*key[0], levels=key[1])
+            else: self.register_window(*key)
 
 class Aggregator:
     _SESSION = _session_key()
-    _SCHEMA  = 33 # On garde le schema
+    _SCHEMA  = 37 # 35 : clés en index de tick (vbp, delta, dom) ; 36 : journal binaire + checkpoint compact ; 37 : VBP/delta en .npy mappés
 
-    def __init__(self, ctx, autosave_secs=30, persist=False, tick_size_map=None, prefer_mode="auto"):
+    def __init__(self, ctx, autosave_secs=30, persist=False, tick_size_map=None, prefer_mode="auto", max_ticks=None, max_bytes=None):
         self.ctx = ctx
         self._persist = bool(persist)
+        self._profile_caps = {"max_ticks": max_ticks, "max_bytes": max_bytes} # plafonds durs par symbole (None = horizon seul)
 
-        self.volume_by_price = defaultdict(lambda: defaultdict(float))
-        self.delta_session = defaultdict(lambda: defaultdict(float))
-        self.dom = defaultdict(lambda: {'bids': defaultdict(int), 'asks': defaultdict(int)})
-        self.rolling_profiles = defaultdict(RollingProfile)
+        # Cumuls de session en tableaux denses par index de tick (mappés depuis data/ à la reprise)
+        self.volume_by_price: Dict[str, LevelArray] = defaultdict(LevelArray)
+        self.delta_session: Dict[str, LevelArray] = defaultdict(LevelArray)
+        self.books: Dict[str, DepthBook] = {} # carnets L2 tenus en place (thread moteur)
+        self.liquidity: Dict[str, LiquidityHistory] = {} # historique échantillonné des carnets (heatmap)
+        self.dom = defaultdict(lambda: {'bids': {}, 'asks': {}}) # vues {index de tick: taille} sur les carnets
+        self.rolling_profiles: Dict[str, RollingProfile] = {}
+        self.candle_series: Dict[str, Dict[Tuple[str, int], CandleSeries]] = {}
         self.active_windows = defaultdict(lambda: 30) 
-        self._speed_buffer = defaultdict(deque)
         self.vwap_data = defaultdict(lambda: {"total_pv": 0.0, "total_vol": 0.0})
 
         self._prev_price = {}; self._prev_dir = defaultdict(lambda: 1)
-        self.last_price = {}; self.start_time = {}; self._rt_total_seen = {}
+        self.last_tick = {}; self.start_time = {}; self._rt_total_seen = {}
         self._tick_size = defaultdict(lambda: 0.25)
         if tick_size_map:
             for k, v in tick_size_map.items():
@@ -160,31 +374,87 @@ class Aggregator:
                 except: self._tick_size[k] = 0.25
 
         self._alias = {}; self._last_seen = defaultdict(lambda: (None, None))
-        self._booted = defaultdict(lambda: False); self._tbt_idx = defaultdict(int)
+        self._booted = defaultdict(lambda: False); self._tbt_idx = {} # sym -> (liste tickByTicks, nb déjà lus)
+        self._version = defaultdict(int); self._dirty = set() # symboles modifiés depuis la dernière publication
+        self._snapshots: Dict[str, SymbolSnapshot] = {} # lu par le thread UI ; remplacé (jamais modifié) par publish()
+        self._ladder_cache = {} # (sym, grp, with_volume) -> (SymbolSnapshot, LadderView) ; thread UI uniquement
+        self._listeners = [] # callbacks(sym) appelés à chaque publication d'un symbole modifié (thread moteur)
+        self._last_ts = {} # sym -> dernier ts stocké (les ts du store restent croissants)
+        self._quote = {} # sym -> (meilleur bid, meilleur ask) en prix, nan si inconnu (DOM ou TBT BidAsk)
+        self._aggressor_stats = defaultdict(lambda: {"quote": 0, "tick_rule": 0})
+        self._clock_stats: Dict[str, dict] = {}; self._last_skew_log = 0.0
         self._prefer_tbt_sym = defaultdict(bool); self._prefer_mode = (prefer_mode or "auto").strip().lower()
 
-        if self._persist: self._load_session()
-        if self._persist and int(autosave_secs) > 0:
-            t = threading.Thread(target=self._autosave_loop, args=(int(autosave_secs),), daemon=True)
-            t.start()
-            atexit.register(self._dump_session)
+        # Persistance : journal des ticks (ajout par lot) + checkpoint compact toutes les 'autosave_secs'
+        self._journal = TickJournal(_DATA_DIR, self._SESSION) if self._persist else None
+        self._checkpoint_path = os.path.join(_DATA_DIR, f"aggregator_{self._SESSION}.ckpt")
+        self._autosave_secs = max(0, int(autosave_secs)); self._last_checkpoint = time.time(); self._checkpoint_gen = 0
+        self._saver: Optional[threading.Thread] = None # écriture du checkpoint en cours (hors thread moteur)
+        self._save_stats = {"saves": 0, "errors": 0, "gen": 0, "last_ms": 0.0, "max_ms": 0.0, "last_bytes": 0, "last_save": 0.0}
+        if self._persist:
+            self._load_session(); self.publish(refresh_all=True)
+            atexit.register(self.close)
 
+    def _new_profile(self, sym: str) -> RollingProfile:
+        return RollingProfile(windows=DEFAULT_PROFILE_WINDOWS, tick_size=self._tick_size[sym], stat_windows=DEFAULT_STAT_WINDOWS, **self._profile_caps)
+    def end_batch(self, refresh_all: bool = False) -> None:
+        """Fin de lot (thread moteur) : journal sur disque, checkpoint si dû, puis instantanés UI."""
+        if self._journal is not None:
+            self._journal.flush()
+            if self._autosave_secs and time.time() - self._last_checkpoint >= self._autosave_secs: self._dump_session(background=True)
+        self.publish(refresh_all)
+    def close(self) -> None:
+        if self._journal is not None: self._dump_session(); self._journal.close()
+    def get_save_stats(self) -> Dict[str, Any]:
+        """Derniers checkpoints : durée d'écriture (ms, hors thread moteur), octets écrits, génération."""
+        return {**self._save_stats, "pending": self._saver is not None and self._saver.is_alive()}
+    def _profile(self, sym: str) -> RollingProfile:
+        rp = self.rolling_profiles.get(sym)
+        if rp is None: rp = self.rolling_profiles[sym] = self._new_profile(sym)
+        return rp
     def _key(self, sym: str) -> str: return self._alias.get(sym, sym)
-    def get_last_price(self, sym): return self.last_price.get(self._key(sym))
+    def get_last_price(self, sym):
+        s = self._key(sym); t = self.last_tick.get(s)
+        return _px_of(t, self._tick_size[s]) if t is not None else None
+    def get_last_tick(self, sym) -> Optional[int]: return self.last_tick.get(self._key(sym))
+    def get_tick_size(self, sym) -> float: return self._tick_size[self._key(sym)]
+    def get_session_vbp(self, sym: str) -> Dict[float, float]:
+        """VBP de session avec clés en prix (conversion en bordure d'affichage)."""
+        s = self._key(sym); tick = self._tick_size[s]
+        return {_px_of(p, tick): v for p, v in list(self.volume_by_price.get(s, {}).items())}
     def get_speed(self, sym: str, window_sec: float=60.0):
-        s = self._key(sym); buf = self._speed_buffer[s]; now = time.time(); limit = now - window_sec
-        while buf and buf[0][0] < limit: buf.popleft()
-        return float(sum(item[1] for item in buf))
+        rp = self.rolling_profiles.get(self._key(sym))
+        return rp.get_volume(int(window_sec)) if rp is not None else 0.0
 
+    def get_memory_stats(self) -> Dict[str, dict]:
+        """Occupation mémoire des historiques glissants, par symbole et au total."""
+        stats = {s: rp.memory_stats() for s, rp in list(self.rolling_profiles.items())}
+        stats["total"] = {k: sum(st[k] for st in stats.values()) for k in ("ticks", "bytes", "allocated_bytes", "evicted", "capped")}
+        stats["total"]["liquidity_bytes"] = sum(h.nbytes for h in list(self.liquidity.values()))
+        return stats
     def set_rolling_window(self, sym: str, minutes: int): pass
     def get_rolling_data(self, sym: str, mode: str, value: int):
-        s = self._key(sym)
-        if s not in self.rolling_profiles: self.rolling_profiles[s] = RollingProfile()
-        return self.rolling_profiles[s].get_profile(mode, value)
+        return self._profile(self._key(sym)).get_profile(mode, value)
+    def get_rolling_ticks(self, sym: str, mode: str, value: int):
+        return self._profile(self._key(sym)).get_profile_ticks(mode, value)
+    def _series_map(self, sym: str) -> Dict[Tuple[str, int], CandleSeries]:
+        series = self.candle_series.get(sym)
+        if series is None:
+            series = self.candle_series[sym] = {}
+            for mode, value in DEFAULT_CANDLE_SERIES: self._register_series(sym, series, mode, value)
+        return series
+    def _register_series(self, sym, series, mode, value) -> CandleSeries:
+        cs = CandleSeries(mode, value, self._tick_size[sym])
+        rp = self.rolling_profiles.get(sym)
+        if rp is not None: cs.seed(rp.get_candles(mode, value, limit_candles=cs.closed.maxlen)) # rattrapage depuis l'historique
+        series[(cs.mode, cs.value)] = cs
+        return cs
     def get_candles_data(self, sym: str, mode: str = "time", value: int = 60):
         s = self._key(sym)
         if s not in self.rolling_profiles: return []
-        return self.rolling_profiles[s].get_candles(mode, value)
+        series = self._series_map(s); key = (mode.lower().strip(), max(1, int(value)))
+        cs = series.get(key) or self._register_series(s, series, *key)
+        return cs.get(100)
     def get_rolling_vwap(self, sym: str, minutes: int = 60) -> Optional[float]:
         s = self._key(sym)
         if s not in self.rolling_profiles: return None
@@ -193,46 +463,240 @@ class Aggregator:
         s = self._key(sym); d = self.vwap_data[s]
         return (d["total_pv"] / d["total_vol"]) if d["total_vol"] > 0 else None
 
+    def version(self, sym: str) -> int:
+        """Compteur incrémenté à chaque trade / mise à jour DOM du symbole (thread moteur)."""
+        return self._version[self._key(sym)]
+
+    def add_change_listener(self, cb) -> None:
+        """cb(sym) est appelé depuis le thread moteur à la publication : il doit rester trivial (ex. Event.set)."""
+        self._listeners.append(cb)
+
+    def _touch(self, s: str) -> None:
+        self._version[s] += 1; self._dirty.add(s)
+
+    # ─────────────── Instantanés (passage moteur -> UI sans verrou) ───────────────
+    def publish(self, refresh_all: bool = False) -> None:
+        """
+        Thread moteur, une fois par lot : reconstruit l'instantané des symboles modifiés.
+        refresh_all republie aussi les autres (vieillissement des fenêtres sans tick).
+        """
+        now = time.time(); self._sample_liquidity(now)
+        dirty = self._dirty; self._dirty = set()
+        syms = (dirty | set(self._snapshots) | set(self.last_tick)) if refresh_all else dirty
+        if not syms: return
+        changed = []
+        for s in syms:
+            prev = self._snapshots.get(s); snap = self._build_snapshot(s, now)
+            self._snapshots[s] = snap
+            if prev is None or prev.version != snap.version: changed.append(s)
+        for s in changed:
+            for cb in self._listeners: cb(s)
+
+    def _sample_liquidity(self, now: float) -> None:
+        """Échantillonne chaque carnet dans son anneau (au plus une ligne par résolution)."""
+        for s, book in self.books.items():
+            center = book.best(BID)
+            if center is None: center = book.best(ASK)
+            if center is None: center = self.last_tick.get(s)
+            if center is None: continue
+            hist = self.liquidity.get(s)
+            if hist is None: hist = self.liquidity[s] = LiquidityHistory()
+            hist.sample(now, book.levels[BID], book.levels[ASK], center)
+
+    def get_liquidity_window(self, sym: str, t0: float, t1: float, cols: int, lo: int, hi: int) -> Optional[np.ndarray]:
+        """Heatmap (index de tick hi..lo) x (cols tranches de [t0, t1]) ; lisible depuis le thread UI."""
+        hist = self.liquidity.get(self._key(sym))
+        return hist.window(t0, t1, cols, lo, hi) if hist is not None else None
+
+    def liquidity_version(self, sym: str) -> int:
+        hist = self.liquidity.get(self._key(sym))
+        return hist.version if hist is not None else 0
+
+    def _build_snapshot(self, s: str, now: float) -> SymbolSnapshot:
+        rp = self.rolling_profiles.get(s)
+        vol = {k: _EMPTY for k in LADDER_WINDOWS}; delta = _EMPTY; speed = 0.0; vwap = None; candles = {}
+        if rp is not None:
+            for k, (mode, value) in LADDER_WINDOWS.items():
+                v, d = rp.get_profile_ticks(mode, value) # copies
+                vol[k] = MappingProxyType(v)
+                if k == "s": delta = MappingProxyType(d)
+            speed = rp.get_volume(60); vwap = rp.get_vwap(60)
+            candles = {key: tuple(cs.get(SNAPSHOT_CANDLES)) for key, cs in self._series_map(s).items()}
+        # Le carnet est modifié en place : copie figée, refaite seulement s'il a bougé
+        book = self.books.get(s); bids, asks = book.frozen() if book is not None else (_EMPTY, _EMPTY)
+        imb = book.imbalance(DOM_IMBALANCE_LEVELS) if book is not None else 0.0
+        return SymbolSnapshot(self._version[s], now, self._tick_size[s], self.last_tick.get(s), speed, vwap,
+                              MappingProxyType(vol), delta, bids, asks, MappingProxyType(candles), imb)
+
+    def snapshot(self, sym: str) -> Optional[SymbolSnapshot]:
+        """Dernier instantané publié (lecture sans verrou depuis le thread UI)."""
+        return self._snapshots.get(self._key(sym))
+
+    def get_ladder(self, sym: str, grp: int = 1, with_volume: bool = True, snap: Optional[SymbolSnapshot] = None) -> LadderView:
+        """
+        Volumes S/M/L, delta court et DOM groupés par 'grp' ticks, calculés depuis
+        l'instantané publié (thread UI) et mis en cache jusqu'à la publication suivante.
+        """
+        s = self._key(sym); grp = max(1, int(grp))
+        if snap is None: snap = self._snapshots.get(s)
+        key = (s, grp, with_volume)
+        hit = self._ladder_cache.get(key)
+        if hit is not None and hit[0] is snap: return hit[1]
+        vol = {k: {} for k in LADDER_WINDOWS}; delta = {}; max_vol = 1
+        bids = asks = {}
+        if snap is not None:
+            if with_volume:
+                for k in LADDER_WINDOWS:
+                    v, d = _group_levels(snap.vol[k], grp, snap.delta if k == "s" else None)
+                    vol[k] = v
+                    if k == "s": delta = d
+                    if v: max_vol = max(max_vol, max(v.values()))
+            bids, _ = _group_levels(snap.bids, grp)
+            asks, _ = _group_levels(snap.asks, grp)
+        view = LadderView(grp, vol, delta, bids, asks, max_vol)
+        self._ladder_cache[key] = (snap, view)
+        return view
+
     def reset_session(self, sym: str | None = None):
         keys = [self._key(sym)] if sym else list(self.volume_by_price.keys())
         for s in keys:
             self.volume_by_price.pop(s, None)
             self.delta_session.pop(s, None)
-            if s in self.rolling_profiles: self.rolling_profiles[s] = RollingProfile()
-            self.last_price.pop(s, None)
-            self._speed_buffer.pop(s, None)
+            if s in self.rolling_profiles: self.rolling_profiles[s] = self._new_profile(s)
+            self.last_tick.pop(s, None)
+            self.candle_series.pop(s, None)
             if s in self._rt_total_seen: del self._rt_total_seen[s]
             self._tbt_idx.pop(s, None); self._prefer_tbt_sym.pop(s, None)
-            if s in self.dom: self.dom[s] = {'bids': defaultdict(int), 'asks': defaultdict(int)}
+            if s in self.books: self.books[s].clear()
+            self._quote.pop(s, None)
             self.vwap_data.pop(s, None) 
-        if self._persist: self._dump_session()
+            self._touch(s)
+        if self._journal is not None:
+            for s in keys: self._journal.reset(s)
+            self._dump_session()
+
+    def _book(self, s: str) -> DepthBook:
+        book = self.books.get(s)
+        if book is None:
+            book = self.books[s] = DepthBook(self._tick_size[s])
+            self.dom[s] = {'bids': book.levels[BID], 'asks': book.levels[ASK]}
+        return book
+    def _book_changed(self, s: str, book: DepthBook) -> None:
+        bid = book.best(BID); ask = book.best(ASK); tick = book.tick_size
+        self._quote[s] = (bid * tick if bid is not None else np.nan, ask * tick if ask is not None else np.nan)
+        self._touch(s)
+
+    def on_depth(self, sym: str, ops: Iterable[Tuple[int, int, int, float, float]]) -> None:
+        """Opérations reqMktDepth (position, opération 0/1/2, côté 0 ask / 1 bid, prix, taille) appliquées en place."""
+        s = self._key(sym); book = self._book(s)
+        book.apply_many(ops); self._book_changed(s, book)
 
     def on_dom_update(self, sym: str, bids: List[Tuple[float, int]], asks: List[Tuple[float, int]]):
-        s = self._key(sym); tick = self._tick_size[s]
-        new_bids = defaultdict(int)
-        for p, sz in bids:
-            if sz > 0: new_bids[_snap_to_grid(p, tick)] += int(sz)
-        self.dom[s]['bids'] = new_bids
-        new_asks = defaultdict(int)
-        for p, sz in asks:
-            if sz > 0: new_asks[_snap_to_grid(p, tick)] += int(sz)
-        self.dom[s]['asks'] = new_asks
+        """Carnet complet (listes meilleur d'abord) : reconstruction, pour les sources sans opérations."""
+        s = self._key(sym); book = self._book(s)
+        book.replace(bids, asks); self._book_changed(s, book)
+
+    def clear_depth(self, sym: str) -> None:
+        """Carnet vidé (flux L2 interrompu : IB renverra des insert à la resouscription)."""
+        s = self._key(sym); book = self.books.get(s)
+        if book is not None: book.clear(); self._book_changed(s, book)
+
+    def on_bid_ask(self, sym: str, bid: float, ask: float) -> None:
+        """Meilleure limite hors DOM (TBT BidAsk) : sert à classer l'agresseur des trades suivants."""
+        self._quote[self._key(sym)] = (float(bid) if bid and bid > 0 else np.nan, float(ask) if ask and ask > 0 else np.nan)
 
     def _ingest(self, sym, px, size, *, source):
         if size > MAX_VALID_TICK_SIZE: return 
         if sym not in self.start_time: self.start_time[sym] = datetime.now(tz=NY)
-        tick_sz = self._tick_size[sym]; px_snap = _snap_to_grid(px, tick_sz)
+        p = _tick_index(px, self._tick_size[sym])
         prev = self._prev_price.get(sym, px); direc = self._prev_dir[sym]
         if px > prev: direc = 1 
         elif px < prev: direc = -1 
         self._prev_price[sym] = px; self._prev_dir[sym] = direc
-        self.last_price[sym] = px_snap
-        self.volume_by_price[sym][px_snap] += size
-        self.delta_session[sym][px_snap] += (size * direc)
+        bid, ask = self._quote.get(sym, (np.nan, np.nan)); st = self._aggressor_stats[sym]
+        if bid < ask and (px >= ask or px <= bid): direc = 1 if px >= ask else -1; st["quote"] += 1 # agresseur lu sur la meilleure limite
+        else: st["tick_rule"] += 1
+        self.last_tick[sym] = p
+        self.volume_by_price[sym][p] += size
+        self.delta_session[sym][p] += (size * direc)
+        self._touch(sym)
         self.vwap_data[sym]["total_pv"] += (px * size)
         self.vwap_data[sym]["total_vol"] += size
-        self.rolling_profiles[sym].add(px_snap, size, direc)
-        self._speed_buffer[sym].append((time.time(), size))
+        now = max(time.time(), self._last_ts.get(sym, 0.0)); self._last_ts[sym] = now
+        series = self._series_map(sym) # avant add() : le rattrapage ne doit pas inclure ce tick
+        self._profile(sym).add(p, size, direc, now)
+        if self._journal is not None: self._journal.append(sym, now, p, size, direc)
+        for cs in series.values(): cs.update(now, p, size, direc)
+
+    def ingest_batch(self, sym: str, prices, sizes, timestamps=None, bids=None, asks=None) -> int:
+        """
+        Ingestion vectorisée d'un lot de trades (ordre chronologique) : classement de l'agresseur,
+        index de tick, VBP / delta, VWAP, profils glissants et journal en opérations sur tableaux.
+        timestamps : heures d'échange (epoch s), bornées à l'heure locale puis rendues croissantes ;
+        None = horodatage local unique pour tout le lot.
+        bids / asks : meilleure limite en vigueur à chaque trade (nan si inconnue) ; None = dernière
+        limite connue (DOM / BidAsk). Un trade au bid ou à l'ask est classé par la limite, les autres
+        (dans le spread, limite absente ou croisée) par la règle du tick. Retourne le nombre ingéré.
+        """
+        s = self._key(sym); tick = self._tick_size[s]; now = time.time()
+        px = np.asarray(prices, dtype=np.float64); sz = np.asarray(sizes, dtype=np.float64)
+        ts = np.full(len(px), now) if timestamps is None else np.asarray(timestamps, dtype=np.float64)
+        quote = self._quote.get(s, (np.nan, np.nan))
+        bid = np.full(len(px), quote[0]) if bids is None else np.asarray(bids, dtype=np.float64)
+        ask = np.full(len(px), quote[1]) if asks is None else np.asarray(asks, dtype=np.float64)
+        keep = (px > 0) & (sz > 0) & (sz <= MAX_VALID_TICK_SIZE)
+        if not keep.all(): px, sz, ts, bid, ask = px[keep], sz[keep], ts[keep], bid[keep], ask[keep]
+        n = len(px)
+        if not n: return 0
+        if timestamps is not None:
+            raw = ts; ts = np.maximum.accumulate(np.maximum(np.minimum(raw, now), self._last_ts.get(s, 0.0)))
+            self._record_latency(s, now, raw, int(np.count_nonzero(ts != raw)))
+        self._last_ts[s] = float(ts[-1])
+        if s not in self.start_time: self.start_time[s] = datetime.now(tz=NY)
+        idx = np.rint(px / tick if tick > 0 else px).astype(np.int32)
+        # Règle du tick : signe de la variation, la dernière direction est reportée sur les prix inchangés
+        step = np.sign(np.diff(px, prepend=self._prev_price.get(s, px[0]))).astype(np.int8)
+        last = np.maximum.accumulate(np.where(step != 0, np.arange(n), -1))
+        direc = np.where(last >= 0, step[np.maximum(last, 0)], np.int8(self._prev_dir[s])).astype(np.int8)
+        self._prev_price[s] = float(px[-1]); self._prev_dir[s] = int(direc[-1])
+        # Agresseur : comparaison en index de tick (nan -> faux, donc repli sur la règle du tick)
+        with np.errstate(invalid="ignore"):
+            b = np.rint(bid / tick); a = np.rint(ask / tick); ok = b < a
+            at_ask = ok & (idx >= a); at_bid = ok & (idx <= b)
+        direc = np.where(at_ask, np.int8(1), np.where(at_bid, np.int8(-1), direc)).astype(np.int8)
+        st = self._aggressor_stats[s]; q = int(np.count_nonzero(at_ask | at_bid)); st["quote"] += q; st["tick_rule"] += n - q
+        self.last_tick[s] = int(idx[-1])
+        self.volume_by_price[s].add(idx, sz); self.delta_session[s].add(idx, sz * direc)
+        vw = self.vwap_data[s]; vw["total_pv"] += float(np.dot(px, sz)); vw["total_vol"] += float(sz.sum())
+        self._touch(s)
+        series = self._series_map(s) # avant add_batch() : le rattrapage ne doit pas inclure ce lot
+        self._profile(s).add_batch(ts, idx, sz, direc)
+        if self._journal is not None: self._journal.extend(s, ts, idx, sz, direc)
+        if series:
+            rows = list(zip(ts.tolist(), idx.tolist(), sz.tolist(), direc.tolist()))
+            for cs in series.values():
+                upd = cs.update
+                for row in rows: upd(*row)
+        return n
+
+    def _record_latency(self, s: str, now: float, ts: np.ndarray, clamped: int) -> None:
+        """Latence échange -> ingestion (ms) ; son plancher estime le décalage d'horloge (négatif : horloge locale en retard)."""
+        lat = (now - ts) * 1000.0; lo = float(lat.min())
+        st = self._clock_stats.get(s)
+        if st is None: st = self._clock_stats[s] = {"batches": 0, "last_ms": 0.0, "avg_ms": 0.0, "max_ms": 0.0, "skew_ms": lo, "clamped": 0}
+        st["batches"] += 1; st["last_ms"] = float(lat[-1]); st["max_ms"] = max(st["max_ms"], float(lat.max()))
+        st["avg_ms"] = st["last_ms"] if st["batches"] == 1 else st["avg_ms"] * 0.95 + st["last_ms"] * 0.05
+        st["skew_ms"] = min(lo, st["skew_ms"] * 0.99 + lo * 0.01) # plancher qui remonte lentement
+        st["clamped"] += clamped
+        if abs(st["skew_ms"]) > CLOCK_SKEW_WARN_MS and now - self._last_skew_log > CLOCK_SKEW_LOG_EVERY_SEC:
+            self._last_skew_log = now
+            log.warning("[Aggregator] %s : décalage horloge locale / échange ~%.0f ms", s, st["skew_ms"])
+    def get_aggressor_stats(self, sym: str) -> Dict[str, int]:
+        """Trades classés par la meilleure limite vs par la règle du tick (repli)."""
+        return dict(self._aggressor_stats[self._key(sym)])
+    def get_clock_stats(self, sym: str) -> Dict[str, float]:
+        """Latence échange -> ingestion (ms : dernière, moyenne, max), décalage estimé, ticks réhorodatés."""
+        return dict(self._clock_stats.get(self._key(sym), {}))
 
     def on_tick(self, sym: str, tick: Any) -> None:
         if tick is None: return
@@ -242,9 +706,18 @@ class Aggregator:
             try:
                 tbt = getattr(tick, "tickByTicks", None)
                 if tbt:
-                    start = self._tbt_idx[sym]; n = len(tbt)
+                    # ib_insync remplace la liste à chaque cycle : on ne reprend à l'index
+                    # mémorisé que s'il s'agit toujours de la même liste
+                    seen, start = self._tbt_idx.get(sym, (None, 0))
+                    if seen is not tbt: start = 0
+                    n = len(tbt)
                     if start < n:
+                        prices = []; sizes = []; stamps = []; bids = []; asks = []; now = time.time()
+                        bid, ask = self._quote.get(sym_log, (np.nan, np.nan))
                         for rec in tbt[start:n]:
+                            bp = getattr(rec, "bidPrice", None)
+                            if bp is not None: # TBT BidAsk entrelacé : limite en vigueur pour les trades qui suivent
+                                self.on_bid_ask(sym_log, bp, rec.askPrice); bid, ask = self._quote[sym_log]; continue
                             px = getattr(rec, "price", None); sz = getattr(rec, "size", None)
                             if px and sz and sz > 0:
                                 if self._persist:
@@ -252,9 +725,13 @@ class Aggregator:
                                     if not self._booted[sym_log] and self._last_seen[sym_log] == key: 
                                         self._booted[sym_log] = True; continue
                                     self._booted[sym_log] = True; self._last_seen[sym_log] = key
-                                self._ingest(sym_log, float(px), float(sz), source="TBT")
-                                ingested = True; self._prefer_tbt_sym[sym_log] = True
-                        self._tbt_idx[sym] = n
+                                t = getattr(rec, "time", None) # heure d'échange (voir FeedPump)
+                                prices.append(float(px)); sizes.append(float(sz)); stamps.append(t.timestamp() if isinstance(t, datetime) else now)
+                                bids.append(bid); asks.append(ask)
+                        self._tbt_idx[sym] = (tbt, n)
+                        if prices:
+                            self.ingest_batch(sym_log, prices, sizes, stamps, bids, asks)
+                            ingested = True; self._prefer_tbt_sym[sym_log] = True
             except: pass
         if (not ingested) and (self._prefer_mode in ("auto", "rtv")) and (not self._prefer_tbt_sym[sym_log]):
             px, size, total = None, None, None
@@ -278,7 +755,7 @@ class Aggregator:
                     self._booted[sym_log] = True; self._last_seen[sym_log] = key
                 self._ingest(sym_log, px, size, source="RTV")
                 ingested = True
-        if not ingested:
+        if not ingested and not self._prefer_tbt_sym[sym_log]:
             last = getattr(tick, "last", None); lsz = getattr(tick, "lastSize", None)
             if last and lsz and lsz > 0:
                 px, size = float(last), float(lsz)
@@ -286,30 +763,73 @@ class Aggregator:
                 if self._last_seen[sym_log] != key:
                     self._last_seen[sym_log] = key
                     self._ingest(sym_log, px, size, source="LAST")
-    def _snapshot(self):
-        return { "session": self._SESSION, "schema": self._SCHEMA, "vbp": {s: dict(v) for s, v in self.volume_by_price.items()}, "last_px": dict(self.last_price), "tick_sz": dict(self._tick_size), "vwap": dict(self.vwap_data), "rolling": self.rolling_profiles }
-    def _dump_session(self):
-        if not self._persist: return
-        fn = os.path.join(_DATA_DIR, f"aggregator_{self._SESSION}.pkl")
-        try: pickle.dump(self._snapshot(), open(fn, "wb"), protocol=4)
-        except: pass
-    def _load_session(self):
-        fn = os.path.join(_DATA_DIR, f"aggregator_{self._SESSION}.pkl")
-        if not os.path.exists(fn): return
+    def _dump_session(self, background: bool = False):
+        """
+        Checkpoint compact : VBP / delta de session en .npy (nouvelle génération), puis un petit
+        pickle (renommé atomiquement) qui référence cette génération et les offsets du journal.
+        Le thread moteur ne fait que la capture (copie des tableaux) ; sérialisation, fsync et
+        renommages se font dans _write_checkpoint, en arrière-plan si 'background'.
+        """
+        if self._journal is None: return
+        if self._saver is not None:
+            if background and self._saver.is_alive(): return # un seul checkpoint en vol : on réessaiera au lot suivant
+            self._saver.join(); self._saver = None
+        cap = self._capture_checkpoint()
+        if not background: self._write_checkpoint(cap); return
+        self._saver = threading.Thread(target=self._write_checkpoint, args=(cap,), name="AggregatorCheckpoint", daemon=True)
+        self._saver.start()
+    def _capture_checkpoint(self) -> Dict[str, Any]:
+        """Instantané cohérent (thread moteur) : n° de génération, offsets du journal, copies des tableaux."""
+        self._journal.flush()
+        gen = self._checkpoint_gen = self._checkpoint_gen + 1; self._last_checkpoint = time.time()
+        arrays = {s: (self.volume_by_price[s].lo, np.array(self.volume_by_price[s].arr), self.delta_session[s].lo, np.array(self.delta_session[s].arr))
+                  for s in set(self.volume_by_price) | set(self.delta_session)}
+        return {"gen": gen, "offsets": self._journal.counts(), "arrays": arrays,
+                "vwap": {s: dict(v) for s, v in self.vwap_data.items()}}
+    def _write_checkpoint(self, cap: Dict[str, Any]) -> None:
+        t0 = time.perf_counter(); gen = cap["gen"]; written = 0; st = self._save_stats
         try:
-            snap = pickle.load(open(fn, "rb"))
-            if snap.get("session") != self._SESSION: return
-            if snap.get("schema") != self._SCHEMA: return 
-            self.volume_by_price = defaultdict(lambda: defaultdict(float), {k: defaultdict(float, v) for k, v in snap.get("vbp", {}).items()})
-            self.last_price = dict(snap.get("last_px", {}))
-            for k, v in snap.get("tick_sz", {}).items(): self._tick_size[k] = float(v)
-            if "vwap" in snap:
-                for k, v in snap["vwap"].items(): self.vwap_data[k] = v
-            if "rolling" in snap:
-                loaded = snap["rolling"]
-                self.rolling_profiles = defaultdict(RollingProfile)
-                for k, v in loaded.items():
-                    if isinstance(v, RollingProfile): self.rolling_profiles[k] = v
-        except: pass
-    def _autosave_loop(self, secs):
-        while True: time.sleep(secs); self._dump_session()
\ No newline at end of file
+            self._journal.sync() # les offsets capturés doivent être durables avant le checkpoint qui les référence
+            for s, (lo_v, vbp, lo_d, dlt) in cap["arrays"].items():
+                written += save_levels(levels_path(_DATA_DIR, self._SESSION, s, "vbp", gen), LevelArray(vbp, lo_v))
+                written += save_levels(levels_path(_DATA_DIR, self._SESSION, s, "delta", gen), LevelArray(dlt, lo_d))
+            state = {"session": self._SESSION, "schema": self._SCHEMA, "offsets": cap["offsets"], "gen": gen,
+                     "levels": {s: (a[0], a[2]) for s, a in cap["arrays"].items()}, "vwap": cap["vwap"]}
+            written += write_checkpoint(self._checkpoint_path, state)
+        except OSError:
+            st["errors"] += 1; return
+        purge_levels(_DATA_DIR, self._SESSION, gen)
+        ms = (time.perf_counter() - t0) * 1000.0
+        st.update(saves=st["saves"] + 1, gen=gen, last_ms=ms, max_ms=max(st["max_ms"], ms), last_bytes=written, last_save=time.time())
+    def _load_session(self):
+        """
+        Reprise : VBP / delta ouverts en place (mmap), rejeu vectorisé de la queue du journal
+        (lui aussi mappé) ; l'historique glissant ne relit que l'horizon utile.
+        """
+        ck = read_checkpoint(self._checkpoint_path) or {}
+        if ck.get("session") != self._SESSION or ck.get("schema") != self._SCHEMA: ck = {}
+        offsets = ck.get("offsets", {}); gen = ck.get("gen", 0); self._checkpoint_gen = gen
+        for sym in self._journal.symbols():
+            recs = self._journal.load(sym); n = len(recs)
+            self._journal.seed(sym, n) # le prochain checkpoint doit référencer ces enregistrements
+            if not n: continue
+            start = offsets.get(sym, 0)
+            if sym in offsets and start <= n and sym in ck.get("levels", {}): # le checkpoint couvre les 'start' premiers enregistrements
+                lo_v, lo_d = ck["levels"][sym]
+                self.volume_by_price[sym] = open_levels(levels_path(_DATA_DIR, self._SESSION, sym, "vbp", gen), lo_v)
+                self.delta_session[sym] = open_levels(levels_path(_DATA_DIR, self._SESSION, sym, "delta", gen), lo_d)
+                if sym in ck.get("vwap", {}): self.vwap_data[sym] = dict(ck["vwap"][sym])
+            else: start = 0 # pas de checkpoint, ou journal plus court que lui : on repart du journal seul
+            self._replay_totals(sym, recs[start:])
+            last = recs[-1]; tick = self._tick_size[sym]
+            self.last_tick[sym] = int(last["px"]); self._prev_price[sym] = _px_of(int(last["px"]), tick)
+            self._prev_dir[sym] = int(last["dir"]); self._last_ts[sym] = float(last["ts"]); self._touch(sym)
+            rp = self._profile(sym)
+            h = recs[int(np.searchsorted(recs["ts"], time.time() - rp.max_history_sec, side="left")):]
+            rp.load_history(h["ts"], h["px"], h["size"], h["dir"])
+    def _replay_totals(self, sym, recs):
+        if not len(recs): return
+        px = recs["px"]; size = recs["size"].astype(np.float64)
+        self.volume_by_price[sym].add(px, size); self.delta_session[sym].add(px, size * recs["dir"])
+        tick = self._tick_size[sym]; vw = self.vwap_data[sym]
+        vw["total_pv"] += float(np.dot(recs["px"].astype(np.float64) * tick, size)); vw["total_vol"] += float(size.sum())
@@ -16,7 +16,7 @@ class AuctionMonitor:
     def sync_with_existing_data(self, symbol):
         """Récupère les H/L historiques au démarrage"""
         # On regarde dans le VBP Session de l'agrégateur
-        vbp = self.aggr.volume_by_price.get(symbol, {})
+        vbp = self.aggr.get_session_vbp(symbol)
         if not vbp: return
         
         prices = list(vbp.keys())
@@ -0,0 +1,154 @@
+# engine/bar_cache.py
+"""
+Cache incrémental des barres historiques IB, par (contrat, taille de barre).
+
+Le premier appel pour une durée donnée télécharge la fenêtre complète et retient
+le nombre de barres obtenu. Les appels suivants ne demandent que le delta depuis
+la dernière barre en cache, plus une barre de recouvrement : la barre en cours
+est ainsi rafraîchie. Les barres reçues remplacent celles de même date, et la
+fenêtre rendue garde la taille du backfill initial en glissant avec le temps.
+
+Deux durées sur la même taille de barre (ex. M15 sur 5 D et niveaux de session
+sur 3 D) partagent le même cache. Le cache est écrit de façon atomique dans
+data/ : un redémarrage ne retélécharge que le delta.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+import time
+from datetime import date, datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from engine.journal import read_checkpoint, write_checkpoint
+
+log = logging.getLogger("BarCache")
+
+BAR_CACHE_FILE = "bar_cache.pkl"
+_SCHEMA = 1
+
+_UNIT_SEC = {"S": 1, "D": 86400, "W": 7 * 86400, "M": 31 * 86400, "Y": 366 * 86400}
+_BAR_UNIT_SEC = {"sec": 1, "secs": 1, "min": 60, "mins": 60, "hour": 3600, "hours": 3600,
+                 "day": 86400, "days": 86400, "week": 7 * 86400, "month": 31 * 86400}
+
+Fetch = Callable[[object, str, str], Awaitable[Optional[list]]]
+
+
+def duration_seconds(duration: str) -> int:
+    """'14400 S' / '5 D' / '2 W' -> secondes (calendaires, borne haute)."""
+    n, unit = duration.split()
+    return int(n) * _UNIT_SEC[unit.upper()]
+
+
+def bar_seconds(bar_size: str) -> int:
+    """'1 min' / '15 mins' / '4 hours' / '1 day' -> secondes."""
+    n, unit = bar_size.split()
+    return int(n) * _BAR_UNIT_SEC[unit.lower()]
+
+
+def bar_ts(d) -> float:
+    """Date d'une barre IB (datetime pour l'intraday, date pour le quotidien) -> epoch."""
+    if isinstance(d, datetime): return d.timestamp()
+    if isinstance(d, date): return datetime(d.year, d.month, d.day).timestamp()
+    return float(d)
+
+
+def contract_key(contract) -> str:
+    con_id = getattr(contract, "conId", 0)
+    if con_id: return str(con_id)
+    return f"{contract.symbol}_{contract.secType}_{getattr(contract, 'lastTradeDateOrContractMonth', '')}"
+
+
+def delta_duration(age_sec: float, bar_sec: int) -> str:
+    """Durée IB couvrant 'age_sec' plus une barre de recouvrement."""
+    need = age_sec + bar_sec
+    if bar_sec >= 86400 or need > 86400: return f"{max(1, math.ceil(need / 86400))} D"
+    return f"{max(60, math.ceil(need))} S"
+
+
+class BarCache:
+    def __init__(self, data_dir: Optional[str] = None, clock: Callable[[], float] = time.time):
+        self.path = os.path.join(data_dir, BAR_CACHE_FILE) if data_dir else None
+        self._clock = clock
+        self._bars: Dict[Tuple[str, str], List] = {}         # (contrat, taille) -> barres triées par date
+        self._counts: Dict[Tuple[str, str, str], int] = {}   # (contrat, taille, durée) -> barres du backfill
+        self._dirty = False
+        self.stats = {"full": 0, "delta": 0, "failed": 0, "bars_received": 0}
+        self._load()
+
+    async def get(self, contract, duration: str, bar_size: str, fetch: Fetch) -> Optional[list]:
+        """Barres de la fenêtre 'duration' : backfill au premier appel, delta ensuite (None si indisponible)."""
+        key = (contract_key(contract), bar_size); ckey = key + (duration,)
+        cached = self._bars.get(key); count = self._counts.get(ckey)
+        req = duration
+        if cached and count:
+            age = self._clock() - bar_ts(cached[-1].date)
+            if age + bar_seconds(bar_size) < duration_seconds(duration): req = delta_duration(max(0.0, age), bar_seconds(bar_size))
+
+        bars = await fetch(contract, req, bar_size)
+        if not bars:
+            self.stats["failed"] += 1
+            return cached[-count:] if cached and count else None
+        self.stats["full" if req == duration else "delta"] += 1
+        self.stats["bars_received"] += len(bars)
+
+        return self._store(key, ckey, self._merge(cached or [], list(bars)), full=req == duration, n=len(bars))
+
+    def peek(self, contract, duration: str, bar_size: str) -> Optional[list]:
+        """Fenêtre en cache sans requête IB (None si jamais backfillée)."""
+        key = (contract_key(contract), bar_size); count = self._counts.get(key + (duration,))
+        cached = self._bars.get(key)
+        return cached[-count:] if cached and count else None
+
+    def merge(self, contract, duration: str, bar_size: str, bars: list) -> Optional[list]:
+        """
+        Remplace la queue de la série par des barres construites localement (ré-échantillonnage) :
+        les barres en cache à partir de la première reçue sont écartées.
+        """
+        key = (contract_key(contract), bar_size); ckey = key + (duration,)
+        cached = self._bars.get(key)
+        if not cached or ckey not in self._counts: return None
+        if not bars: return cached[-self._counts[ckey]:]
+        first = bars[0].date
+        return self._store(key, ckey, [b for b in cached if b.date < first] + list(bars))
+
+    def _store(self, key, ckey, merged: list, full: bool = False, n: int = 0) -> list:
+        if full: self._counts[ckey] = n
+        keep = max(c for k, c in self._counts.items() if k[:2] == key)
+        self._bars[key] = merged[-keep:]
+        self._dirty = True
+        return self._bars[key][-self._counts[ckey]:]
+
+    @staticmethod
+    def _merge(cached: list, fresh: list) -> list:
+        """Union triée par date ; une barre reçue remplace la barre en cache de même date."""
+        if not cached: return fresh
+        first = fresh[0].date
+        if cached[-1].date < first: return cached + fresh
+        by_date = {b.date: b for b in cached}
+        by_date.update((b.date, b) for b in fresh)
+        return [by_date[d] for d in sorted(by_date)]
+
+    # ─────────────── Persistance ───────────────
+    def save(self) -> int:
+        """Écrit le cache s'il a changé ; retourne la taille écrite (0 sinon)."""
+        if not self.path or not self._dirty: return 0
+        self._dirty = False
+        state = {"schema": _SCHEMA, "bars": dict(self._bars), "counts": dict(self._counts)}
+        try:
+            return write_checkpoint(self.path, state)
+        except OSError as e:
+            self._dirty = True
+            log.warning(f"Écriture du cache de barres impossible : {e}")
+            return 0
+
+    def _load(self) -> None:
+        if not self.path: return
+        state = read_checkpoint(self.path)
+        if not state or state.get("schema") != _SCHEMA: return
+        self._bars = state.get("bars", {}); self._counts = state.get("counts", {})
+        log.info(f"Cache de barres rechargé : {sum(len(b) for b in self._bars.values())} barres, {len(self._bars)} séries")
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "series": len(self._bars), "bars": sum(len(b) for b in self._bars.values())}
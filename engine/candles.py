@@ -0,0 +1,76 @@
+# engine/candles.py
+"""
+Séries de bougies OHLCV + delta maintenues tick par tick.
+
+Les bougies fermées sont figées (mappings en lecture seule) ; seule la bougie
+en formation est modifiée. Une lecture pour le graphique est donc une simple
+tranche des N dernières bougies.
+
+Les prix entrent en index de tick ; ils sont convertis en prix à la clôture
+d'une bougie (une fois) et à la lecture de la bougie en formation.
+"""
+from __future__ import annotations
+
+from collections import deque
+from types import MappingProxyType
+from typing import Iterable, List, Mapping, Optional
+
+DEFAULT_MAX_CANDLES = 300
+
+
+class CandleSeries:
+    """Série 'time' (value = secondes) ou 'vol' (value = volume par bougie)."""
+
+    __slots__ = ("mode", "value", "tick_size", "closed", "forming", "_bucket")
+
+    def __init__(self, mode: str, value: int, tick_size: float = 0.25, max_candles: int = DEFAULT_MAX_CANDLES):
+        self.mode = mode.lower().strip()
+        self.value = max(1, int(value))
+        self.tick_size = tick_size
+        self.closed: deque = deque(maxlen=max_candles)
+        self.forming: Optional[dict] = None
+        self._bucket = None  # seau temporel de la bougie en formation
+
+    def update(self, ts: float, px: int, size: float, direction: int) -> None:
+        c = self.forming
+        if c is not None:
+            if self.mode == "time":
+                b = int(ts) // self.value
+                if b > self._bucket:
+                    self._close(); c = None; self._bucket = b
+            elif c["vol"] >= self.value:
+                self._close(); c = None
+        if c is None:
+            if self.mode == "time" and self._bucket is None: self._bucket = int(ts) // self.value
+            self.forming = {"open": px, "high": px, "low": px, "close": px, "vol": size, "delta": size * direction, "ts": ts}
+            return
+        if px > c["high"]: c["high"] = px
+        if px < c["low"]: c["low"] = px
+        c["close"] = px
+        c["vol"] += size
+        c["delta"] += size * direction
+
+    def _close(self) -> None:
+        self.closed.append(MappingProxyType(self._to_prices(self.forming)))
+        self.forming = None
+
+    def _to_prices(self, c: dict) -> dict:
+        tick = self.tick_size; out = dict(c)
+        for k in ("open", "high", "low", "close"): out[k] = float(f"{c[k] * tick:.6f}")
+        return out
+
+    def seed(self, candles: Iterable[dict]) -> None:
+        """Initialise la série depuis une reconstruction complète (la dernière reste en formation)."""
+        candles = list(candles)
+        if not candles: return
+        for c in candles[:-1]: self.closed.append(MappingProxyType(dict(c)))
+        self.forming = dict(candles[-1])
+        for k in ("open", "high", "low", "close"): self.forming[k] = int(round(self.forming[k] / self.tick_size))
+        if self.mode == "time": self._bucket = int(self.forming["ts"]) // self.value
+
+    def get(self, limit: int = 100) -> List[Mapping]:
+        if self.forming is None: return list(self.closed)[-limit:]
+        n = len(self.closed); k = max(0, limit - 1)
+        closed = [self.closed[i] for i in range(max(0, n - k), n)] if k else []
+        closed.append(self._to_prices(self.forming))
+        return closed
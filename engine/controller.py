@@ -8,7 +8,8 @@ from typing import Dict, Iterable, List, Optional
 
 import config
 from core.ib_resilient_manager import IBResilientManager
-from engine.aggregator import Aggregator
+from engine.aggregator import SNAPSHOT_REFRESH_SEC, Aggregator
+from engine.feed import FeedPump
 from engine.guardian import TradeGuardian
 from engine.market_analyzer import MarketAnalyzer
 from ib_insync import Contract
@@ -31,12 +32,23 @@ class BotController:
         self.aggregator = Aggregator(self, tick_size_map=self.tick_sizes_map)
         self.guardian = TradeGuardian(self.ibm, self.aggregator)
         self.analyzer = MarketAnalyzer(self.ibm, self.tick_sizes_map)
+        self.analyzer.attach_live_prices(self.aggregator)
+        self.feed = FeedPump(
+            self.ibm,
+            self.aggregator,
+            self.contracts_map,
+            depth_rows=getattr(config, "DEPTH_ROWS", 10),
+            depth_symbols=getattr(config, "DEPTH_SYMBOLS", None),
+            bid_ask_symbols=getattr(config, "TBT_BID_ASK_SYMBOLS", ()),
+        )
 
         self._dom_levels: Dict[str, List[dict]] = defaultdict(list)
         self._markers: Dict[str, Dict[float, str]] = defaultdict(dict)
+        self._state_version: Dict[str, int] = defaultdict(int)
         self.active_symbol: Optional[str] = None
         self._stop_event: Optional[asyncio.Event] = None
         self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
 
     # ─────────────────────────── Helpers ───────────────────────────
     def _extract_tick_sizes(self, pairs: Iterable[dict]) -> Dict[str, float]:
@@ -75,19 +87,39 @@ class BotController:
         return self.tick_sizes_map.get(symbol, 0.25)
 
     def get_market_speed(self, symbol: str) -> float:
-        return self.aggregator.get_speed(symbol)
+        snap = self.aggregator.snapshot(symbol)
+        return snap.speed if snap else 0.0
 
     def get_dom_levels(self, symbol: str) -> List[dict]:
         return list(self._dom_levels.get(symbol, []))
 
     def set_dom_levels(self, symbol: str, levels: List[dict]) -> None:
-        self._dom_levels[symbol] = list(levels)
+        levels = list(levels)
+        if levels != self._dom_levels.get(symbol):
+            self._dom_levels[symbol] = levels
+            self._state_version[symbol] += 1
+
+    def state_version(self, symbol: str) -> int:
+        """Compteur des changements pilotés par l'UI (niveaux DOM)."""
+        return self._state_version[symbol]
 
     def get_trading_markers(self, symbol: str) -> Dict[float, str]:
         return dict(self._markers.get(symbol, {}))
 
     def reset_data(self, symbol: Optional[str] = None) -> None:
-        self.aggregator.reset_session(symbol)
+        # Appelé depuis l'UI : la remise à zéro est exécutée sur la boucle moteur
+        self._run_on_engine(self.aggregator.reset_session, symbol)
+
+    def _run_on_engine(self, fn, *args) -> None:
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self._engine_call, fn, args)
+        else:
+            self._engine_call(fn, args)
+
+    def _engine_call(self, fn, args) -> None:
+        fn(*args)
+        self.aggregator.end_batch()
 
     def update_guardian_config(self, symbol: str, active: bool, trigger_ticks: int) -> None:
         self.guardian.update_config(symbol, active, trigger_ticks)
@@ -111,20 +143,30 @@ class BotController:
         self._stop_event = stop_event or asyncio.Event()
 
         await self.ibm.start()
+        self.feed.start()
 
-        loop = asyncio.get_running_loop()
+        loop = self._loop = asyncio.get_running_loop()
         self._tasks.append(loop.create_task(self.guardian.start(), name="guardian"))
+        self._tasks.append(loop.create_task(self._snapshot_refresh_loop(), name="snapshot_refresh"))
         self._tasks.append(
             loop.create_task(self.analyzer.start_radar_loop(self.contracts_map), name="market_radar")
         )
+        self._tasks.append(loop.create_task(self.analyzer.start_live_indicator_loop(), name="radar_live"))
         return self._stop_event
 
+    async def _snapshot_refresh_loop(self) -> None:
+        """Republie les instantanés même sans tick (fenêtres glissantes, vitesse) ; checkpoint si dû."""
+        while True:
+            await asyncio.sleep(SNAPSHOT_REFRESH_SEC)
+            self.aggregator.end_batch(refresh_all=True)
+
     async def close(self) -> None:
         """Nettoyage à la fermeture de l'application."""
         if self._stop_event and not self._stop_event.is_set():
             self._stop_event.set()
 
         self.guardian.running = False
+        self.feed.stop()
         for task in list(self._tasks):
             task.cancel()
         self._tasks.clear()
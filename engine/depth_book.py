@@ -0,0 +1,113 @@
+# engine/depth_book.py
+"""
+Carnet L2 d'un symbole tenu en place à partir des opérations de reqMktDepth.
+
+IB envoie, par côté, des insert / update / delete sur une position (0 = meilleure
+limite) : on tient la même liste de lignes que le ticker ib_insync, en index de
+tick, plus un dict {index de tick: taille} (plusieurs teneurs de marché peuvent
+partager un prix en SMART depth) et le total de chaque côté. Une opération coûte
+O(numRows) au pire (insertion dans une liste de 10 à 20 lignes), soit O(1) en
+pratique ; la meilleure limite, le top N, la profondeur cumulée et le déséquilibre
+se lisent sans reconstruire le carnet.
+
+Le carnet est modifié en place par le thread moteur : le thread UI n'en lit que
+la copie figée (frozen), refaite au plus une fois par version.
+"""
+from __future__ import annotations
+
+from types import MappingProxyType
+from typing import Iterable, List, Optional, Tuple
+
+ASK, BID = 0, 1            # convention IB (MktDepthData.side)
+INSERT, UPDATE, DELETE = 0, 1, 2
+
+
+def _tick(price: float, tick: float) -> int:
+    return int(round(price / tick)) if tick > 0 else int(round(price))
+
+
+class DepthBook:
+    __slots__ = ("tick_size", "rows", "levels", "totals", "version", "_frozen")
+
+    def __init__(self, tick_size: float = 0.25):
+        self.tick_size = tick_size
+        self.rows: Tuple[List[list], List[list]] = ([], [])   # côté -> [[index de tick, taille], ...] par position
+        self.levels: Tuple[dict, dict] = ({}, {})             # côté -> {index de tick: taille}
+        self.totals = [0, 0]
+        self.version = 0
+        self._frozen = None   # (version, bids, asks) : copie publiée aux instantanés
+
+    # ─────────────── Mise à jour ───────────────
+    def apply(self, position: int, operation: int, side: int, price: float, size: float) -> None:
+        rows = self.rows[side]
+        if operation == DELETE:
+            if position < len(rows): self._sub(side, *rows.pop(position))
+        elif operation == UPDATE and position < len(rows):
+            row = rows[position]; self._sub(side, *row)
+            row[0] = _tick(price, self.tick_size); row[1] = int(size); self._add(side, *row)
+        else: # insert (ou update d'une position pas encore reçue)
+            row = [_tick(price, self.tick_size), int(size)]
+            rows.insert(min(position, len(rows)), row); self._add(side, *row)
+        self.version += 1
+
+    def apply_many(self, ops: Iterable[Tuple[int, int, int, float, float]]) -> None:
+        for op in ops: self.apply(*op)
+
+    def replace(self, bids: Iterable[Tuple[float, float]], asks: Iterable[Tuple[float, float]]) -> None:
+        """Reconstruction complète depuis des listes (prix, taille) ordonnées meilleur d'abord."""
+        self.clear()
+        for side, levels in ((BID, bids), (ASK, asks)):
+            for price, size in levels:
+                if size > 0:
+                    row = [_tick(price, self.tick_size), int(size)]
+                    self.rows[side].append(row); self._add(side, *row)
+        self.version += 1
+
+    def clear(self) -> None:
+        for side in (ASK, BID): self.rows[side].clear(); self.levels[side].clear()
+        self.totals = [0, 0]; self.version += 1
+
+    def _add(self, side: int, k: int, size: int) -> None:
+        if size <= 0: return
+        lv = self.levels[side]; lv[k] = lv.get(k, 0) + size; self.totals[side] += size
+
+    def _sub(self, side: int, k: int, size: int) -> None:
+        if size <= 0: return
+        lv = self.levels[side]; v = lv.get(k, 0) - size
+        if v > 0: lv[k] = v
+        else: lv.pop(k, None)
+        self.totals[side] -= size
+
+    # ─────────────── Lecture ───────────────
+    def best(self, side: int) -> Optional[int]:
+        """Meilleure limite (index de tick) : la ligne de position 0 ayant une taille."""
+        for k, size in self.rows[side]:
+            if size > 0: return k
+        return None
+
+    def top(self, side: int, n: int) -> List[Tuple[int, int]]:
+        """N meilleurs niveaux de prix (index de tick, taille), lignes de même prix fusionnées."""
+        out: List[Tuple[int, int]] = []
+        for k, size in self.rows[side]:
+            if size <= 0: continue
+            if out and out[-1][0] == k: out[-1] = (k, out[-1][1] + size)
+            elif len(out) == n: break
+            else: out.append((k, size))
+        return out
+
+    def depth(self, side: int, n: Optional[int] = None) -> int:
+        """Profondeur cumulée sur les n meilleurs niveaux (None = tout le carnet reçu)."""
+        if n is None: return self.totals[side]
+        return sum(size for _, size in self.top(side, n))
+
+    def imbalance(self, n: Optional[int] = None) -> float:
+        """(bid - ask) / (bid + ask) sur les n meilleurs niveaux, dans [-1, 1] (0 si vide)."""
+        b = self.depth(BID, n); a = self.depth(ASK, n)
+        return (b - a) / (b + a) if b + a else 0.0
+
+    def frozen(self):
+        """(bids, asks) en lecture seule pour les instantanés : recopiés seulement si le carnet a bougé."""
+        f = self._frozen
+        if f is None or f[0] != self.version:
+            f = self._frozen = (self.version, MappingProxyType(dict(self.levels[BID])), MappingProxyType(dict(self.levels[ASK])))
+        return f[1], f[2]
@@ -0,0 +1,159 @@
+# engine/feed.py
+"""
+Pompe du flux live : IB -> Aggregator.
+
+Souscrit, pour chaque contrat, le tick-by-tick 'AllLast' et la profondeur
+(reqMktDepth) via IBResilientManager, donc persistants à travers les reco.
+En option, le tick-by-tick 'BidAsk' : ses enregistrements arrivent entrelacés
+avec les trades dans le même Ticker et donnent la limite exacte en vigueur à
+chaque trade pour le classement de l'agresseur (sinon : meilleure limite du DOM).
+ib_insync regroupe tout ce qui arrive dans un même paquet TCP dans un seul
+`pendingTickersEvent` : on traite ce lot d'un bloc (trades, puis opérations
+insert / update / delete du carnet, appliquées en place) et on mesure la durée
+de chaque lot. En fin de lot, l'Aggregator journalise les
+ticks et publie les instantanés des symboles touchés (seule chose que lit l'UI).
+
+ib_insync horodate les TickByTickAllLast à la réception du paquet (wrapper.lastTime)
+et ignore l'heure d'échange transmise par IB (secondes entières) : le wrapper de
+l'IB attaché est instrumenté pour la réinjecter (heure de réception conservée si
+elle tombe dans la même seconde, pour garder la précision sub-seconde). Après un
+arriéré de reconnexion ou un blocage, les trades gardent ainsi l'heure du tape.
+
+Après une reconnexion, l'instance IB peut avoir été recréée (auto-heal) : le
+handler est rattaché à l'IB courant sur on_connected / on_resubscribed.
+"""
+import logging
+import time
+from datetime import datetime, timezone
+
+log = logging.getLogger("FeedPump")
+
+SLOW_BATCH_MS = 50.0       # au-delà, un lot est signalé comme lent
+SLOW_LOG_EVERY_SEC = 30.0  # au plus un warning de lenteur par période
+
+
+class FeedPump:
+    def __init__(self, ib_manager, aggregator, contracts_map, depth_rows=10, depth_symbols=None, smart_depth=False, bid_ask_symbols=()):
+        self.ibm = ib_manager
+        self.aggr = aggregator
+        self.contracts_map = dict(contracts_map)
+        self.depth_rows = int(depth_rows)
+        # IB limite le nombre de carnets L2 simultanés : None = tous les contrats
+        self.depth_symbols = set(self.contracts_map) if depth_symbols is None else set(depth_symbols)
+        self.smart_depth = smart_depth
+        self.bid_ask_symbols = set(bid_ask_symbols or ()) & set(self.contracts_map) # une ligne TBT de plus par contrat
+        self.running = False
+
+        self._ib = None                                               # IB auquel le handler est attaché
+        self._sym_by_contract = {id(c): s for s, c in self.contracts_map.items()}
+        self._stats = {"batches": 0, "tickers": 0, "trades": 0, "depth": 0, "errors": 0,
+                       "last_ms": 0.0, "avg_ms": 0.0, "max_ms": 0.0, "last_batch": 0.0}
+        self._last_slow_log = 0.0
+
+    # ─────────────── Cycle de vie ───────────────
+    def start(self):
+        if self.running: return
+        self.running = True
+        self.ibm.on_connected.append(self._reattach)
+        self.ibm.on_resubscribed.append(self._reattach)
+        self.ibm.on_suspend.append(self._on_suspend)
+        self._attach(self.ibm.ib)
+        for sym, contract in self.contracts_map.items():
+            self.ibm.subscribe_tick_by_tick(f"tbt:{sym}", contract, "AllLast")
+            if sym in self.bid_ask_symbols: self.ibm.subscribe_tick_by_tick(f"tbtq:{sym}", contract, "BidAsk")
+            if sym in self.depth_symbols:
+                self.ibm.subscribe_depth(f"depth:{sym}", contract, numRows=self.depth_rows, isSmartDepth=self.smart_depth)
+        log.info("📶 [Feed] TBT %s | BidAsk %s | L2 %s", sorted(self.contracts_map), sorted(self.bid_ask_symbols), sorted(self.depth_symbols))
+
+    def stop(self):
+        if not self.running: return
+        self.running = False
+        for cbs in (self.ibm.on_connected, self.ibm.on_resubscribed):
+            if self._reattach in cbs: cbs.remove(self._reattach)
+        if self._on_suspend in self.ibm.on_suspend: self.ibm.on_suspend.remove(self._on_suspend)
+        for sym in self.contracts_map:
+            self.ibm.unsubscribe(f"tbt:{sym}")
+            self.ibm.unsubscribe(f"tbtq:{sym}")
+            self.ibm.unsubscribe(f"depth:{sym}")
+        self._detach()
+
+    def _on_suspend(self):
+        # Déconnexion : les carnets ne reçoivent plus de deltas ; IB renverra des insert à la resouscription
+        for sym in self.depth_symbols: self.aggr.clear_depth(sym)
+        self.aggr.end_batch()
+
+    def _reattach(self):
+        self._attach(self.ibm.ib)
+
+    def _attach(self, ib):
+        if ib is self._ib: return
+        self._detach()
+        ib.pendingTickersEvent += self._on_pending_tickers
+        self._ib = ib
+        _hook_exchange_time(ib)
+
+    def _detach(self):
+        if self._ib is not None:
+            try: self._ib.pendingTickersEvent -= self._on_pending_tickers
+            except Exception: pass
+        self._ib = None
+
+    # ─────────────── Traitement des lots ───────────────
+    def _symbol_of(self, ticker):
+        c = getattr(ticker, "contract", None)
+        if c is None: return None
+        sym = self._sym_by_contract.get(id(c))
+        if sym is None and getattr(c, "symbol", None) in self.contracts_map: sym = c.symbol
+        return sym
+
+    def _on_pending_tickers(self, tickers):
+        t0 = time.perf_counter(); trades = depth = 0
+        for t in tickers:
+            sym = self._symbol_of(t)
+            if sym is None: continue
+            try:
+                tbt = t.tickByTicks
+                if tbt:
+                    self.aggr.on_tick(sym, t); trades += len(tbt)
+                dom = t.domTicks
+                if dom:
+                    self.aggr.on_depth(sym, [(d.position, d.operation, d.side, d.price, d.size) for d in dom])
+                    depth += len(dom)
+            except Exception as e:
+                self._stats["errors"] += 1
+                log.error("[Feed] %s: %s", sym, e)
+        self.aggr.end_batch()
+        self._record(t0, len(tickers), trades, depth)
+
+    def _record(self, t0, n_tickers, trades, depth):
+        ms = (time.perf_counter() - t0) * 1000.0
+        st = self._stats
+        st["batches"] += 1; st["tickers"] += n_tickers; st["trades"] += trades; st["depth"] += depth
+        st["last_ms"] = ms; st["max_ms"] = max(st["max_ms"], ms); st["last_batch"] = time.time()
+        st["avg_ms"] = ms if st["batches"] == 1 else st["avg_ms"] * 0.95 + ms * 0.05  # moyenne exponentielle
+        if ms > SLOW_BATCH_MS and st["last_batch"] - self._last_slow_log > SLOW_LOG_EVERY_SEC:
+            self._last_slow_log = st["last_batch"]
+            log.warning("[Feed] Lot lent : %.1f ms (%d trades, %d maj L2)", ms, trades, depth)
+
+    def get_stats(self):
+        """Compteurs cumulés et durées des lots (ms)."""
+        return dict(self._stats)
+
+
+def _hook_exchange_time(ib):
+    """Réinjecte l'heure d'échange dans les TickByTickAllLast produits par ce wrapper (une seule fois par IB)."""
+    w = getattr(ib, "wrapper", None)
+    if w is None or getattr(w, "_exchange_time_hooked", False): return
+    orig = w.tickByTickAllLast
+
+    def tickByTickAllLast(reqId, tickType, time_, price, size, tickAttribLast, exchange, specialConditions):
+        orig(reqId, tickType, time_, price, size, tickAttribLast, exchange, specialConditions)
+        t = w.reqId2Ticker.get(reqId)
+        if t is None or not t.tickByTicks: return
+        rec = t.tickByTicks[-1]
+        arrival = rec.time.timestamp() if isinstance(rec.time, datetime) else float(time_)
+        ts = arrival if time_ <= arrival < time_ + 1 else float(time_)
+        t.tickByTicks[-1] = rec._replace(time=datetime.fromtimestamp(ts, timezone.utc))
+
+    w.tickByTickAllLast = tickByTickAllLast
+    w._exchange_time_hooked = True
@@ -0,0 +1,136 @@
+# engine/hist_scheduler.py
+"""
+Ordonnanceur des requêtes historiques IB (reqHistoricalDataAsync).
+
+Les requêtes sont lancées en parallèle, dans la limite des règles de pacing IB :
+  - au plus HIST_MAX_CONCURRENT requêtes en vol ;
+  - un seau à jetons (HIST_RATE_PER_SEC, rafale HIST_BURST) lisse le débit global ;
+  - pas deux requêtes identiques à moins de HIST_IDENTICAL_SEC : une requête identique
+    déjà en file ou en vol est fusionnée (même résultat), sinon elle attend ;
+  - au plus HIST_PER_CONTRACT_MAX requêtes par contrat sur HIST_PER_CONTRACT_SEC.
+
+La file est servie par priorité (par défaut la taille de barre en secondes : M1 avant
+D1), puis dans l'ordre d'arrivée. Tout se passe dans la boucle asyncio, sans tâche
+de fond : chaque fin de requête ou échéance de pacing relance la distribution.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+from collections import defaultdict, deque
+from typing import Callable, Optional
+
+from engine.bar_cache import bar_seconds, contract_key
+
+log = logging.getLogger("HistScheduler")
+
+HIST_MAX_CONCURRENT = 8
+HIST_RATE_PER_SEC = 2.0       # au-delà, IB ralentit lui-même les barres > 30 s (soft throttling)
+HIST_BURST = 10
+HIST_IDENTICAL_SEC = 15.0
+HIST_PER_CONTRACT_MAX = 5     # IB : 6 requêtes ou plus sur un contrat en 2 s = violation
+HIST_PER_CONTRACT_SEC = 2.0
+
+
+class _Job:
+    __slots__ = ("key", "ckey", "args", "future", "queued_at")
+
+    def __init__(self, key, ckey, args, future, queued_at):
+        self.key = key; self.ckey = ckey; self.args = args; self.future = future; self.queued_at = queued_at
+
+
+class HistoricalScheduler:
+    def __init__(self, ib_manager, max_concurrent: int = HIST_MAX_CONCURRENT, rate_per_sec: float = HIST_RATE_PER_SEC,
+                 burst: int = HIST_BURST, clock: Callable[[], float] = time.monotonic):
+        self.ib_manager = ib_manager
+        self.max_concurrent = max_concurrent
+        self.rate = rate_per_sec
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst); self._refill_at = clock()
+        self._queue = []                        # [(priorité, n°, job)] trié
+        self._seq = itertools.count()
+        self._pending = {}                      # clé identique -> job en file ou en vol
+        self._last_sent = {}                    # clé identique -> heure d'envoi
+        self._per_contract = defaultdict(deque) # contrat -> heures d'envoi récentes
+        self._in_flight = 0
+        self._timer = None
+        self.stats = {"sent": 0, "coalesced": 0, "failed": 0, "throttled": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+    async def request(self, contract, duration: str, bar_size: str, what: str = "TRADES", use_rth: bool = False,
+                      priority: Optional[float] = None):
+        """Barres historiques (lève l'exception de la requête IB en cas d'échec)."""
+        key = (contract_key(contract), duration, bar_size, what, use_rth)
+        job = self._pending.get(key)
+        if job is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(job.future)
+        job = self._pending[key] = _Job(key, key[0], (contract, duration, bar_size, what, use_rth),
+                                        asyncio.get_running_loop().create_future(), self._clock())
+        prio = bar_seconds(bar_size) if priority is None else priority
+        bisect.insort(self._queue, (prio, next(self._seq), job)) # n° unique : les jobs ne sont jamais comparés
+        self._pump()
+        return await asyncio.shield(job.future)
+
+    # ─────────────── Distribution ───────────────
+    def _pump(self) -> None:
+        if self._timer is not None: self._timer.cancel(); self._timer = None
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._refill_at) * self.rate); self._refill_at = now
+        retry = None
+        for entry in list(self._queue):
+            if self._in_flight >= self.max_concurrent: break
+            job = entry[2]
+            wait = self._pacing_wait(job, now)
+            if wait > 0:
+                retry = wait if retry is None else min(retry, wait)
+                continue
+            if self._tokens < 1.0:
+                wait = (1.0 - self._tokens) / self.rate
+                retry = wait if retry is None else min(retry, wait)
+                self.stats["throttled"] += 1
+                break
+            self._queue.remove(entry); self._dispatch(job, now)
+        if retry is not None:
+            self._timer = asyncio.get_running_loop().call_later(retry, self._pump)
+
+    def _pacing_wait(self, job: _Job, now: float) -> float:
+        wait = self._last_sent.get(job.key, float("-inf")) + HIST_IDENTICAL_SEC - now
+        sent = self._per_contract[job.ckey]
+        while sent and sent[0] <= now - HIST_PER_CONTRACT_SEC: sent.popleft()
+        if len(sent) >= HIST_PER_CONTRACT_MAX: wait = max(wait, sent[0] + HIST_PER_CONTRACT_SEC - now)
+        return wait
+
+    def _dispatch(self, job: _Job, now: float) -> None:
+        self._tokens -= 1.0; self._in_flight += 1
+        self._last_sent[job.key] = now; self._per_contract[job.ckey].append(now)
+        waited = now - job.queued_at
+        self.stats["sent"] += 1; self.stats["wait_total"] += waited; self.stats["wait_max"] = max(self.stats["wait_max"], waited)
+        asyncio.get_running_loop().create_task(self._run(job))
+
+    async def _run(self, job: _Job) -> None:
+        contract, duration, bar_size, what, use_rth = job.args
+        try:
+            bars = await self.ib_manager.ib.reqHistoricalDataAsync(
+                contract, endDateTime='', durationStr=duration,
+                barSizeSetting=bar_size, whatToShow=what, useRTH=use_rth, formatDate=1
+            )
+            if not job.future.done(): job.future.set_result(bars)
+        except Exception as e:
+            self.stats["failed"] += 1
+            if not job.future.done(): job.future.set_exception(e)
+            job.future.exception() # évite l'avertissement "exception never retrieved" sans attente
+        finally:
+            self._in_flight -= 1
+            self._pending.pop(job.key, None)
+            self._pump()
+
+    def get_stats(self) -> dict:
+        sent = self.stats["sent"]
+        return {"queued": len(self._queue), "in_flight": self._in_flight, "sent": sent,
+                "coalesced": self.stats["coalesced"], "failed": self.stats["failed"], "throttled": self.stats["throttled"],
+                "wait_avg_ms": 1000.0 * self.stats["wait_total"] / sent if sent else 0.0,
+                "wait_max_ms": 1000.0 * self.stats["wait_max"]}
@@ -0,0 +1,87 @@
+# engine/indicators.py
+"""
+Indicateurs incrémentaux du radar : RSI (moyennes simples des hausses / baisses
+sur 14 variations, comme rolling(14).mean()) et EMA 20 (ewm(span=20, adjust=False)).
+
+Les barres fermées sont intégrées une seule fois. La dernière barre de la série
+est en cours : sa clôture reste provisoire et peut être remplacée par le dernier
+prix du tape (on_price) tant que la barre n'est pas écoulée. Une mise à jour ou
+un prix coûte O(période), sans DataFrame.
+
+L'EMA démarre à la première barre vue, pas au début de la fenêtre glissante :
+l'écart avec un ewm recalculé sur la fenêtre est de l'ordre de (1 - 2/21)^n.
+"""
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Optional
+
+from engine.bar_cache import bar_ts
+
+RSI_PERIOD = 14
+EMA_SPAN = 20
+
+
+class IncrementalIndicators:
+    __slots__ = ("period", "alpha", "bar_sec", "_gains", "_losses", "_prev", "_ema", "_closed_date",
+                 "_forming_ts", "close", "version")
+
+    def __init__(self, bar_sec: float = 60, period: int = RSI_PERIOD, span: int = EMA_SPAN):
+        self.period = period
+        self.alpha = 2.0 / (span + 1)
+        self.bar_sec = bar_sec
+        self.close: Optional[float] = None   # clôture provisoire de la barre en cours
+        self.version = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._gains = deque(maxlen=self.period - 1)   # variations des barres fermées (la 14e est la barre en cours)
+        self._losses = deque(maxlen=self.period - 1)
+        self._prev = None          # clôture de la dernière barre fermée
+        self._ema = None           # EMA à la dernière barre fermée
+        self._closed_date = None
+        self._forming_ts = None
+
+    def _commit(self, close: float) -> None:
+        if self._prev is not None:
+            d = close - self._prev
+            self._gains.append(d if d > 0 else 0.0); self._losses.append(-d if d < 0 else 0.0)
+            self._ema += self.alpha * (close - self._ema)
+        else: # comme delta.where(delta > 0, 0) : la première variation (NaN) compte pour 0
+            self._gains.append(0.0); self._losses.append(0.0); self._ema = close
+        self._prev = close
+
+    def update(self, bars) -> None:
+        """Synchronise sur une série de barres triées : seules les barres fermées nouvelles sont intégrées."""
+        if not bars: return
+        closed = bars[:-1]; last = self._closed_date
+        if closed and (last is None or closed[-1].date != last):
+            p = len(closed) - 1
+            while last is not None and p >= 0 and closed[p].date > last: p -= 1
+            if last is None or p < 0 or closed[p].date != last:   # discontinuité : on repart de la série
+                self._reset(); p = -1
+            for b in closed[p + 1:]: self._commit(float(b.close))
+            self._closed_date = closed[-1].date
+        self._forming_ts = bar_ts(bars[-1].date)
+        self.close = float(bars[-1].close); self.version += 1
+
+    def on_price(self, price: float, now: float) -> bool:
+        """Clôture provisoire = dernier prix ; ignoré si la barre en cours est déjà écoulée (nouvelle barre attendue)."""
+        if self._forming_ts is None or now >= self._forming_ts + self.bar_sec or price == self.close: return False
+        self.close = float(price); self.version += 1
+        return True
+
+    @property
+    def ema(self) -> Optional[float]:
+        if self.close is None: return None
+        return self.close if self._ema is None else self._ema + self.alpha * (self.close - self._ema)
+
+    @property
+    def rsi(self) -> float:
+        """RSI à la clôture provisoire (nan tant que 14 variations ne sont pas disponibles, ou sans mouvement)."""
+        if self.close is None or self._prev is None or len(self._gains) < self.period - 1: return math.nan
+        d = self.close - self._prev
+        gain = sum(self._gains) + (d if d > 0 else 0.0); loss = sum(self._losses) + (-d if d < 0 else 0.0)
+        if loss == 0: return 100.0 if gain > 0 else math.nan
+        return 100.0 - 100.0 / (1.0 + gain / loss)
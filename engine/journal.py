@@ -0,0 +1,153 @@
+# engine/journal.py
+"""
+Journal de session en écriture seule (write-ahead) + checkpoints compacts.
+
+Chaque tick ingéré est ajouté, par lot, au fichier binaire du symbole sous la
+forme d'un enregistrement fixe de 17 octets (ts f8, index de tick i4, taille f4,
+direction i1) : le fichier est directement lisible comme tableau NumPy
+structuré (np.fromfile / np.memmap avec JOURNAL_DTYPE).
+
+Le checkpoint ne contient que les agrégats de session (VBP, delta, VWAP) et le
+nombre d'enregistrements du journal qu'ils couvrent : au redémarrage on le
+recharge puis on rejoue seulement la queue du journal. Il est écrit dans un
+fichier temporaire puis renommé (atomique), il n'est donc jamais à moitié écrit.
+
+Un crash peut laisser un enregistrement tronqué (taille du fichier non multiple
+de 17) ou des enregistrements finaux remplis de zéros : ils sont détectés et
+tronqués à la réouverture.
+"""
+from __future__ import annotations
+
+import glob
+import os
+import pickle
+from typing import Dict, List, Optional
+
+import numpy as np
+
+JOURNAL_DTYPE = np.dtype([("ts", "<f8"), ("px", "<i4"), ("size", "<f4"), ("dir", "i1")])  # compact : pas d'alignement
+RECORD_BYTES = JOURNAL_DTYPE.itemsize
+
+# Enregistrements relus en fin de fichier pour détecter une queue remplie de zéros
+_RECOVER_SCAN = 4096
+
+
+class TickJournal:
+    """Un fichier par symbole : <data_dir>/journal_<session>_<sym>.bin"""
+
+    def __init__(self, data_dir: str, session: str):
+        self.data_dir = data_dir
+        self.session = session
+        self._files = {}                         # sym -> fichier ouvert en ajout
+        self._buf: Dict[str, List[tuple]] = {}   # sym -> enregistrements en attente du prochain flush
+        self._count: Dict[str, int] = {}         # sym -> enregistrements valides sur disque
+
+    def path(self, sym: str) -> str:
+        return os.path.join(self.data_dir, f"journal_{self.session}_{sym}.bin")
+
+    def symbols(self) -> List[str]:
+        prefix = os.path.join(self.data_dir, f"journal_{self.session}_")
+        return sorted(p[len(prefix):-4] for p in glob.glob(glob.escape(prefix) + "*.bin"))
+
+    # ─────────────── Écriture ───────────────
+    def append(self, sym: str, ts: float, px: int, size: float, direction: int) -> None:
+        buf = self._buf.get(sym)
+        if buf is None: buf = self._buf[sym] = []
+        buf.append((ts, px, size, direction))
+
+    def extend(self, sym: str, ts, px, size, direction) -> None:
+        """Ajout d'un lot (colonnes NumPy de même longueur)."""
+        buf = self._buf.get(sym)
+        if buf is None: buf = self._buf[sym] = []
+        buf.extend(zip(ts.tolist(), px.tolist(), size.tolist(), direction.tolist()))
+
+    def flush(self) -> int:
+        """Écrit les enregistrements en attente (un write par symbole). Pas de fsync : voir sync()."""
+        written = 0
+        for sym, buf in self._buf.items():
+            if not buf: continue
+            f = self._file(sym)
+            f.write(np.array(buf, dtype=JOURNAL_DTYPE).tobytes()); f.flush()
+            self._count[sym] += len(buf); written += len(buf)
+            buf.clear()
+        return written
+
+    def sync(self) -> None:
+        """fsync des fichiers ouverts ; appelable depuis le thread de checkpoint (un fichier fermé entre-temps est ignoré)."""
+        for f in list(self._files.values()):
+            try: os.fsync(f.fileno())
+            except (OSError, ValueError): pass
+
+    def seed(self, sym: str, n: int) -> None:
+        """Enregistrements déjà sur disque à la reprise : le symbole figure dans counts() même sans nouveau tick."""
+        if sym not in self._files: self._count[sym] = n
+
+    def counts(self) -> Dict[str, int]:
+        """Enregistrements durables par symbole (après flush)."""
+        return dict(self._count)
+
+    def reset(self, sym: str) -> None:
+        """Vide le journal d'un symbole (remise à zéro de session)."""
+        self._buf.pop(sym, None)
+        f = self._files.pop(sym, None)
+        if f is not None: f.close()
+        open(self.path(sym), "wb").close()
+        self._count[sym] = 0
+
+    def close(self) -> None:
+        self.flush()
+        for f in self._files.values(): f.close()
+        self._files.clear()
+
+    def _file(self, sym: str):
+        f = self._files.get(sym)
+        if f is None:
+            self._count[sym] = self.recover(sym)  # jamais d'ajout derrière un enregistrement tronqué
+            f = self._files[sym] = open(self.path(sym), "ab")
+        return f
+
+    # ─────────────── Lecture / reprise ───────────────
+    def recover(self, sym: str) -> int:
+        """Tronque un enregistrement final partiel ou une queue de zéros ; retourne le nombre d'enregistrements valides."""
+        path = self.path(sym)
+        if not os.path.exists(path): return 0
+        size = os.path.getsize(path)
+        n = size // RECORD_BYTES
+        if n:
+            k = min(n, _RECOVER_SCAN)
+            with open(path, "rb") as f:
+                f.seek((n - k) * RECORD_BYTES)
+                tail = np.frombuffer(f.read(k * RECORD_BYTES), dtype=JOURNAL_DTYPE)
+            valid = np.flatnonzero((tail["size"] > 0) & (tail["ts"] > 0))
+            n -= k - (int(valid[-1]) + 1 if len(valid) else 0)
+        if n * RECORD_BYTES != size:
+            with open(path, "r+b") as f: f.truncate(n * RECORD_BYTES)
+        return n
+
+    def load(self, sym: str, start: int = 0) -> np.ndarray:
+        """
+        Enregistrements [start:] du symbole (après récupération), en tableau structuré
+        mappé en lecture seule : seules les pages effectivement lues sont chargées.
+        """
+        n = self.recover(sym)
+        if start >= n: return np.empty(0, dtype=JOURNAL_DTYPE)
+        return np.memmap(self.path(sym), dtype=JOURNAL_DTYPE, mode="r", offset=start * RECORD_BYTES, shape=(n - start,))
+
+
+# ─────────────── Checkpoints ───────────────
+def write_checkpoint(path: str, state: dict) -> int:
+    """Écriture atomique (fichier temporaire + fsync + rename) ; retourne la taille écrite."""
+    tmp = path + ".tmp"
+    data = pickle.dumps(state, protocol=4)
+    with open(tmp, "wb") as f:
+        f.write(data); f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(data)
+
+
+def read_checkpoint(path: str) -> Optional[dict]:
+    if not os.path.exists(path): return None
+    try:
+        with open(path, "rb") as f: return pickle.load(f)
+    except Exception:
+        return None
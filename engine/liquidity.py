@@ -0,0 +1,83 @@
+# engine/liquidity.py
+"""
+Historique de la liquidité au carnet (heatmap) : anneau de lignes typées.
+
+À chaque échantillon (au plus tous les 'resolution' s), la taille au carnet
+(bids + asks) est copiée dans une ligne uint16 couvrant ±half_span ticks autour
+d'un centre (meilleur bid, sinon dernier trade). Chaque ligne garde son centre
+et son heure : la fenêtre affichée est ré-alignée à la lecture, en vectoriel.
+
+Mémoire fixe : (history_sec / resolution) x (2 x half_span + 1) x 2 octets,
+soit ~23 Mo par symbole avec les valeurs par défaut (2 h à 250 ms sur ±200 ticks).
+
+Écriture par le thread moteur, lecture sans verrou par le thread UI : la ligne
+la plus ancienne (en cours de remplacement quand l'anneau est plein) est ignorée
+et une ligne n'est comptée qu'une fois écrite.
+"""
+from __future__ import annotations
+
+from typing import Mapping, Optional
+
+import numpy as np
+
+LIQUIDITY_HISTORY_SEC = 7200
+LIQUIDITY_RESOLUTION_SEC = 0.25
+LIQUIDITY_HALF_SPAN = 200       # ticks de part et d'autre du centre
+LIQUIDITY_MAX_GAP_SEC = 5.0     # au-delà, une colonne sans échantillon reste vide
+_MAX_SIZE = np.iinfo(np.uint16).max
+
+
+class LiquidityHistory:
+    __slots__ = ("resolution", "half_span", "grid", "ts", "center", "head", "count", "version", "_next")
+
+    def __init__(self, history_sec: float = LIQUIDITY_HISTORY_SEC, resolution: float = LIQUIDITY_RESOLUTION_SEC,
+                 half_span: int = LIQUIDITY_HALF_SPAN):
+        n = max(2, int(history_sec / resolution))
+        self.resolution = float(resolution)
+        self.half_span = int(half_span)
+        self.grid = np.zeros((n, 2 * self.half_span + 1), dtype=np.uint16)
+        self.ts = np.zeros(n, dtype=np.float64)
+        self.center = np.zeros(n, dtype=np.int32)
+        self.head = 0       # prochaine ligne écrite
+        self.count = 0      # lignes valides
+        self.version = 0
+        self._next = float("-inf")
+
+    @property
+    def nbytes(self) -> int:
+        return self.grid.nbytes + self.ts.nbytes + self.center.nbytes
+
+    def sample(self, now: float, bids: Mapping[int, int], asks: Mapping[int, int], center: int) -> bool:
+        """Ajoute une ligne si la résolution est écoulée ; retourne True si échantillonné."""
+        if now < self._next: return False
+        self._next = now + self.resolution
+        i = self.head; row = self.grid[i]; lo = center - self.half_span; w = row.shape[0]
+        row[:] = 0
+        for levels in (bids, asks):
+            for k, size in levels.items():
+                j = k - lo
+                if 0 <= j < w: row[j] = min(int(row[j]) + int(size), _MAX_SIZE)
+        self.center[i] = center; self.ts[i] = now
+        self.head = (i + 1) % len(self.ts); self.count = min(self.count + 1, len(self.ts))
+        self.version += 1
+        return True
+
+    def window(self, t0: float, t1: float, cols: int, lo: int, hi: int) -> Optional[np.ndarray]:
+        """
+        Matrice (hi - lo + 1, cols) uint16 de la taille au carnet : ligne 0 = index de tick 'hi',
+        colonne j = dernier échantillon avant la fin de la tranche j de [t0, t1].
+        """
+        n = len(self.ts); count = self.count; head = self.head
+        if count == n: count -= 1 # la plus ancienne peut être en cours de remplacement
+        if count <= 0 or cols <= 0 or hi < lo: return None
+        idx = (head - count + np.arange(count)) % n # ordre chronologique
+        tss = self.ts[idx]
+        times = t0 + (np.arange(cols) + 1) * ((t1 - t0) / cols)
+        pos = np.searchsorted(tss, times, side="right") - 1
+        ok_t = (pos >= 0) & (times - tss[np.maximum(pos, 0)] <= LIQUIDITY_MAX_GAP_SEC)
+        rows = idx[np.maximum(pos, 0)]
+        col = np.arange(hi, lo - 1, -1)[:, None] - (self.center[rows] - self.half_span)[None, :]
+        ok = ok_t[None, :] & (col >= 0) & (col < self.grid.shape[1])
+        out = self.grid[rows[None, :], np.clip(col, 0, self.grid.shape[1] - 1)]
+        out[~ok] = 0
+        return out
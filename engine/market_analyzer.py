@@ -1,47 +1,97 @@
 # engine/market_analyzer.py
 import asyncio
 import logging
+import time
+from collections import defaultdict
 import pandas as pd
 import numpy as np
 from ib_insync import Contract, util
 
+from engine.bar_cache import BarCache, bar_seconds, bar_ts
+from engine.hist_scheduler import HistoricalScheduler
+from engine.indicators import IncrementalIndicators
+from engine.resample import resample_bars
+
 log = logging.getLogger("MarketAnalyzer")
 
+# Unité -> (durée, taille de barre) de la fenêtre analysée
+TIMEFRAMES = {
+    "M1":  ("28800 S", "1 min"),   # couvre toute barre H4 en cours : base du ré-échantillonnage
+    "M5":  ("2 D", "5 mins"),
+    "M15": ("5 D", "15 mins"),
+    "M30": ("5 D", "30 mins"),
+    "H1":  ("10 D", "1 hour"),
+    "H4":  ("20 D", "4 hours"),
+    "D1":  ("60 D", "1 day"),
+}
+DERIVED_TIMEFRAMES = ("M5", "M15", "M30", "H1", "H4")  # reconstruites localement depuis les M1
+RADAR_CYCLE_SEC = 5       # une requête delta M1 par symbole et par cycle
+D1_REFRESH_SEC = 60
+LIVE_INDICATOR_SEC = 0.25 # cadence max des RSI / EMA intrabar (dernier prix du tape)
+
 class MarketAnalyzer:
-    def __init__(self, ib_manager, tick_sizes_map):
+    def __init__(self, ib_manager, tick_sizes_map, data_dir="./data"):
         self.ib_manager = ib_manager
         self.tick_sizes_map = tick_sizes_map
+        self.bar_cache = BarCache(data_dir) # backfill une fois, puis delta depuis la dernière barre
+        self.hist = HistoricalScheduler(ib_manager) # requêtes parallèles sous les règles de pacing IB
         self.radar_data = {} 
         self.is_running = False
+        self._version = defaultdict(int) # incrémenté à chaque nouvelle analyse d'un symbole
+        self._listeners = []
+        self._scanned = {}  # (sym, tf) -> signature de la dernière fenêtre analysée
+        self._d1_due = {}
+        self._indicators = {}  # (sym, tf) -> IncrementalIndicators
+        self._live_price = None; self._live_dirty = set()
 
     async def start_radar_loop(self, contracts_map):
         """Lance la surveillance continue (Multi-Scale + Precision Session)"""
         self.is_running = True
         log.info("📡 [Radar] Démarrage du scan multi-timeframe étendu (M1->D1)...")
-        
-        # Liste COMPLÈTE des TFs à surveiller
-        timeframes = ["M1", "M5", "M15", "M30", "H1", "H4", "D1"]
 
         while self.is_running:
-            for sym, contract in contracts_map.items():
-                # 1. Analyse des Structures (FVG, RSI, EMA) sur chaque TF
-                for tf in timeframes:
-                    await self._scan_timeframe(sym, contract, tf)
-                    # Petite pause pour fluidité
-                    await asyncio.sleep(0.05) 
-                
-                # 2. Analyse du Contexte Session (Une fois par cycle)
-                await self._scan_session_levels(sym, contract)
-            
-            # Pause de cycle (15s pour respecter le Pacing IB)
-            await asyncio.sleep(15) 
+            t0 = time.monotonic()
+            await self._radar_cycle(contracts_map)
+            await asyncio.sleep(max(1.0, RADAR_CYCLE_SEC - (time.monotonic() - t0)))
+
+    async def _radar_cycle(self, contracts_map):
+        # Symboles en parallèle : l'ordonnanceur sert les M1 en premier et fait respecter le pacing
+        await asyncio.gather(*(self._scan_symbol(sym, contract) for sym, contract in contracts_map.items()))
+        self.bar_cache.save()
+
+    async def _scan_symbol(self, sym, contract):
+        # 1. Une seule requête intraday (delta M1) ; M5..H4 et la session en sont dérivés
+        d1 = None
+        if time.monotonic() >= self._d1_due.get(sym, 0.0): # D1 depuis IB, à cadence lente, en parallèle des M1
+            self._d1_due[sym] = time.monotonic() + D1_REFRESH_SEC
+            d1 = asyncio.ensure_future(self.bar_cache.get(contract, *TIMEFRAMES["D1"], self._fetch_history))
+        m1 = await self.bar_cache.get(contract, *TIMEFRAMES["M1"], self._fetch_history)
+        self._scan_timeframe(sym, "M1", m1)
+        for tf in DERIVED_TIMEFRAMES:
+            self._scan_timeframe(sym, tf, await self._derived_bars(contract, *TIMEFRAMES[tf], m1))
 
-    async def _scan_session_levels(self, sym, contract):
+        # 2. Contexte session (bougies 15m)
+        self._scan_session_levels(sym, await self._derived_bars(contract, "3 D", "15 mins", m1))
+        if d1 is not None: self._scan_timeframe(sym, "D1", await d1)
+
+    async def _derived_bars(self, contract, duration, bar_size, m1):
+        """
+        Fenêtre d'une unité dérivée : backfill IB une fois, puis queue reconstruite depuis les M1.
+        Si le cache s'arrête avant le début des M1 (arrêt prolongé), on repasse par une requête delta.
+        """
+        cached = self.bar_cache.peek(contract, duration, bar_size)
+        if not cached or not m1 or bar_ts(cached[-1].date) + bar_seconds(bar_size) < bar_ts(m1[0].date):
+            return await self.bar_cache.get(contract, duration, bar_size, self._fetch_history)
+        return self.bar_cache.merge(contract, duration, bar_size, resample_bars(m1, bar_seconds(bar_size)))
+
+    def _scan_session_levels(self, sym, bars):
         """
         Scan précis des niveaux institutionnels avec bougies 15m
         """
-        bars = await self._fetch_history(contract, "3 D", "15 mins")
         if not bars: return
+        sig = (len(bars), bars[-1].date, bars[-1].close, bars[-1].high, bars[-1].low)
+        if self._scanned.get((sym, "SESSION")) == sig: return
+        self._scanned[(sym, "SESSION")] = sig
 
         df = util.df(bars)
         if df is None or len(df) < 20: return
@@ -102,36 +152,21 @@ class MarketAnalyzer:
         if levels["Globex Open"] and levels["Settlement"]: levels["Gap Maint"] = levels["Globex Open"] - levels["Settlement"]
         else: levels["Gap Maint"] = 0.0
 
-        if sym not in self.radar_data: self.radar_data[sym] = {}
-        self.radar_data[sym]["SESSION"] = levels
-
-    async def _scan_timeframe(self, sym, contract, tf):
-        params = {
-            "M1":  ("14400 S", "1 min"),
-            "M5":  ("2 D", "5 mins"),
-            "M15": ("5 D", "15 mins"),
-            "M30": ("5 D", "30 mins"),
-            "H1":  ("10 D", "1 hour"),
-            "H4":  ("20 D", "4 hours"),
-            "D1":  ("60 D", "1 day"),   
-        }
-        duration, bar_size = params.get(tf, ("2 D", "1 hour"))
-        
-        bars = await self._fetch_history(contract, duration, bar_size)
+        self._publish(sym, "SESSION", levels)
+
+    def _scan_timeframe(self, sym, tf, bars):
         if not bars: return
+        sig = (len(bars), bars[-1].date, bars[-1].close, bars[-1].high, bars[-1].low)
+        if self._scanned.get((sym, tf)) == sig: return # rien de nouveau depuis le dernier cycle
+        self._scanned[(sym, tf)] = sig
+        ind = self._indicators.get((sym, tf))
+        if ind is None: ind = self._indicators[(sym, tf)] = IncrementalIndicators(bar_seconds(TIMEFRAMES[tf][1]))
+        ind.update(bars) # seules les barres fermées nouvelles sont intégrées
 
         df = util.df(bars)
         if df is None or len(df) < 30: return
 
         tick_size = self.tick_sizes_map.get(sym, 0.25)
-
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        current_rsi = 100 - (100 / (1 + rs.iloc[-1]))
-        
-        ema_20 = df['close'].ewm(span=20, adjust=False).mean().iloc[-1]
         
         # STRUCTURES
         fvgs = self._detect_smart_fvgs(df, tick_size)
@@ -139,19 +174,57 @@ class MarketAnalyzer:
         # PATTERNS INTELLIGENTS (Avec Persistance)
         patterns = self._detect_smart_patterns(df, tick_size)
         
-        if sym not in self.radar_data: self.radar_data[sym] = {}
-        self.radar_data[sym][tf] = {
-            "rsi": current_rsi,
-            "ema_20": ema_20,
+        self._publish(sym, tf, {
+            "rsi": ind.rsi,
+            "ema_20": ind.ema,
             "fvgs": fvgs,
             "patterns": patterns, 
             "last_close": df['close'].iloc[-1],
             "updated": pd.Timestamp.now()
-        }
+        })
 
     def get_radar_snapshot(self, symbol):
         return self.radar_data.get(symbol, {})
 
+    def version(self, symbol):
+        return self._version[symbol]
+
+    def add_change_listener(self, cb):
+        """cb(sym) appelé depuis la boucle asyncio après chaque analyse publiée."""
+        self._listeners.append(cb)
+
+    def _publish(self, sym, key, value):
+        self._publish_many(sym, {key: value})
+
+    def _publish_many(self, sym, updates):
+        # Copie puis remplacement : le dict lu par l'UI n'est jamais modifié en place
+        self.radar_data[sym] = {**self.radar_data.get(sym, {}), **updates}
+        self._version[sym] += 1
+        for cb in self._listeners: cb(sym)
+
+    # ─────────────── RSI / EMA intrabar ───────────────
+    def attach_live_prices(self, aggregator):
+        """Suit le dernier prix du tape : le listener ne fait que marquer le symbole (thread moteur)."""
+        self._live_price = aggregator.get_last_price
+        aggregator.add_change_listener(self._live_dirty.add)
+
+    async def start_live_indicator_loop(self):
+        while True:
+            await asyncio.sleep(LIVE_INDICATOR_SEC)
+            dirty = set(self._live_dirty); self._live_dirty.clear() # vidé en place : le listener garde ce set
+            for sym in dirty:
+                price = self._live_price(sym) if self._live_price else None
+                if price is not None: self.on_price(sym, price)
+
+    def on_price(self, sym, price, now=None):
+        """Applique un prix à la barre en cours de chaque unité du symbole ; publie les RSI / EMA qui ont bougé."""
+        now = time.time() if now is None else now
+        current = self.radar_data.get(sym, {}); updates = {}
+        for (s, tf), ind in self._indicators.items():
+            if s != sym or tf not in current or not ind.on_price(price, now): continue
+            updates[tf] = {**current[tf], "rsi": ind.rsi, "ema_20": ind.ema, "last_close": price}
+        if updates: self._publish_many(sym, updates)
+
     def _snap(self, val, step):
         if step <= 0: return val
         return round(val / step) * step
@@ -254,42 +327,47 @@ class MarketAnalyzer:
         return []
 
     def _detect_smart_fvgs(self, df, tick_size):
+        """
+        FVG (gap entre la mèche de c1 et celle de c3) sur les 100 dernières bougies fermées, le plus récent en premier.
+        Un gap est invalidé si la mèche d'une bougie suivante dépasse sa borne opposée, et 'mitigated'
+        si une mèche y est entrée : min / max cumulés depuis la fin, donc O(n).
+        """
+        n = len(df)
+        if n < 5: return []
+        MIN_GAP_TICKS = 1
+        high = df['high'].to_numpy(dtype=np.float64); low = df['low'].to_numpy(dtype=np.float64)
+        i = np.arange(max(2, n - 100), n - 1)
+        min_gap = MIN_GAP_TICKS * tick_size
+        up = high[i - 2] < low[i]
+        bull = up & (low[i] - high[i - 2] >= min_gap)
+        bear = ~up & (low[i - 2] > high[i]) & (low[i - 2] - high[i] >= min_gap)
+        # Extrêmes de toutes les bougies postérieures à c3
+        low_after = np.minimum.accumulate(low[::-1])[::-1]; high_after = np.maximum.accumulate(high[::-1])[::-1]
+
         fvgs = []
-        if len(df) < 5: return []
-        MIN_GAP_TICKS = 1 
-        start_index = max(2, len(df)-100) 
-        for i in range(start_index, len(df)-1): 
-            c1 = df.iloc[i-2]; c2 = df.iloc[i-1]; c3 = df.iloc[i]
-            pot = None; gap_size = 0
-            if c1['high'] < c3['low']:
-                gap_size = c3['low'] - c1['high']
-                if gap_size >= (MIN_GAP_TICKS * tick_size):
-                    pot = {"type": "BULL", "top": self._snap(c3['low'], tick_size), "bot": self._snap(c1['high'], tick_size), "time": c2['date'], "mitigated": False}
-            elif c1['low'] > c3['high']:
-                gap_size = c1['low'] - c3['high']
-                if gap_size >= (MIN_GAP_TICKS * tick_size):
-                    pot = {"type": "BEAR", "top": self._snap(c1['low'], tick_size), "bot": self._snap(c3['high'], tick_size), "time": c2['date'], "mitigated": False}
-            if pot:
-                is_alive = True
-                for j in range(i + 1, len(df)):
-                    bar = df.iloc[j]
-                    if pot['type'] == "BULL":
-                        if bar['low'] < pot['bot']: is_alive = False; break
-                        if bar['low'] <= pot['top']: pot['mitigated'] = True
-                    elif pot['type'] == "BEAR":
-                        if bar['high'] > pot['top']: is_alive = False; break
-                        if bar['high'] >= pot['bot']: pot['mitigated'] = True
-                if is_alive: fvgs.append(pot)
+        for k in np.flatnonzero(bull | bear).tolist():
+            c = int(i[k]); after_lo = low_after[c + 1]; after_hi = high_after[c + 1]
+            if bull[k]:
+                top = self._snap(df['low'].iloc[c], tick_size); bot = self._snap(df['high'].iloc[c - 2], tick_size)
+                if after_lo < bot: continue
+                fvgs.append({"type": "BULL", "top": top, "bot": bot, "time": df['date'].iloc[c - 1], "mitigated": bool(after_lo <= top)})
+            else:
+                top = self._snap(df['low'].iloc[c - 2], tick_size); bot = self._snap(df['high'].iloc[c], tick_size)
+                if after_hi > top: continue
+                fvgs.append({"type": "BEAR", "top": top, "bot": bot, "time": df['date'].iloc[c - 1], "mitigated": bool(after_hi >= bot)})
         return fvgs[::-1]
 
     async def _fetch_history(self, contract, duration, bar_size):
         if not self.ib_manager.is_connected(): return None
         try:
-            return await self.ib_manager.ib.reqHistoricalDataAsync(
-                contract, endDateTime='', durationStr=duration,
-                barSizeSetting=bar_size, whatToShow='TRADES', useRTH=False, formatDate=1
-            )
-        except: return None
+            return await self.hist.request(contract, duration, bar_size)
+        except Exception as e:
+            log.debug(f"Historique {contract.symbol} {duration} {bar_size} indisponible : {e}")
+            return None
+
+    def get_history_stats(self):
+        """File des requêtes historiques (profondeur, attentes) et cache de barres."""
+        return {**self.hist.get_stats(), "cache": self.bar_cache.get_stats()}
     
     # Méthodes de compatibilité
     async def initialize_symbol(self, s, c): pass 
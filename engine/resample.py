@@ -0,0 +1,61 @@
+# engine/resample.py
+"""
+Ré-échantillonnage local des barres M1 en unités supérieures (M5 ... H4).
+
+Les tranches sont alignées sur l'ouverture de session CME (18:00 heure de New
+York), comme la session de l'Aggregator : une barre ne chevauche jamais la
+pause de 17:00-18:00, et une H4 démarre à 18:00, 22:00, 02:00... Le calcul se
+fait en heure murale de New York, donc il reste juste après un changement
+d'heure (la bourse est fermée au moment du changement).
+
+Les dates IB sans fuseau (formatDate=1 selon la version) sont lues comme heure
+de New York, celle de la session TWS.
+"""
+from __future__ import annotations
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+from ib_insync import BarData
+
+CME_TZ = "America/New_York"
+SESSION_OPEN = pd.Timedelta(hours=18)
+
+
+def session_buckets(dates, seconds: int) -> pd.DatetimeIndex:
+    """Début de la tranche de 'seconds' (alignée sur 18:00 NY) contenant chaque date, dans le fuseau d'entrée."""
+    idx = pd.DatetimeIndex(dates)
+    wall = idx if idx.tz is None else idx.tz_convert(CME_TZ).tz_localize(None)
+    sess = (wall - SESSION_OPEN).floor("D") + SESSION_OPEN
+    step = pd.Timedelta(seconds=seconds)
+    start = sess + ((wall - sess) // step) * step
+    return idx - (wall - start)
+
+
+def resample_bars(bars: List[BarData], seconds: int) -> List[BarData]:
+    """
+    Agrège des barres M1 (triées) en barres de 'seconds'. La première tranche est écartée
+    si les M1 ne la couvrent pas depuis son début : elle serait incomplète.
+    """
+    if not bars: return []
+    dates = [b.date for b in bars]
+    start = session_buckets(dates, seconds)
+    o = np.array([b.open for b in bars]); h = np.array([b.high for b in bars]); l = np.array([b.low for b in bars])
+    c = np.array([b.close for b in bars]); v = np.array([b.volume for b in bars], dtype=np.float64)
+    avg = np.array([b.average for b in bars]); cnt = np.array([b.barCount for b in bars], dtype=np.int64)
+
+    code = start.asi8
+    first = np.flatnonzero(np.r_[True, code[1:] != code[:-1]])   # indice de la première M1 de chaque tranche
+    if start[0] != pd.DatetimeIndex(dates[:1])[0]: first = first[1:]
+    if not len(first): return []
+    cut = first[0]
+    first = first - cut; o, h, l, c, v, avg, cnt = (a[cut:] for a in (o, h, l, c, v, avg, cnt))
+    last = np.r_[first[1:], len(o)] - 1
+    vol = np.add.reduceat(v, first)
+    pv = np.add.reduceat(avg * v, first)
+    return [BarData(date=d, open=float(op), high=float(hi), low=float(lo), close=float(cl), volume=float(vo),
+                    average=float(p / vo) if vo else float(cl), barCount=int(n))
+            for d, op, hi, lo, cl, vo, p, n in zip(start[cut:][first].to_pydatetime(), o[first],
+                                                      np.maximum.reduceat(h, first), np.minimum.reduceat(l, first),
+                                                      c[last], vol, pv, np.add.reduceat(cnt, first))]
@@ -0,0 +1,105 @@
+# engine/session_store.py
+"""
+Cumuls de session par niveau de prix (VBP, delta) en tableaux denses.
+
+Un LevelArray couvre la plage d'index de tick [lo, lo + len) : une mise à jour
+est une écriture dans un tableau et le rejeu d'un journal un simple np.add.at.
+Il se lit comme un dict {index de tick: valeur} restreint aux niveaux non nuls.
+
+Au checkpoint, chaque tableau est écrit dans un .npy de génération numérotée.
+L'écriture passe par un fichier temporaire puis un renommage, pour rester
+atomique. Au redémarrage, le .npy est ouvert en mmap copy-on-write : rien
+n'est lu avant d'être consulté, et les ajouts restent en mémoire privée
+jusqu'au checkpoint suivant. Le fichier mappé n'est jamais réécrit.
+"""
+from __future__ import annotations
+
+import glob
+import os
+from collections.abc import MutableMapping
+
+import numpy as np
+
+GROW_MARGIN = 256  # ticks ajoutés de part et d'autre à chaque agrandissement
+
+
+class LevelArray(MutableMapping):
+    __slots__ = ("lo", "arr")
+
+    def __init__(self, arr=None, lo: int = 0):
+        self.arr = arr if arr is not None else np.zeros(0, dtype=np.float64)
+        self.lo = int(lo)
+
+    def _ensure(self, lo: int, hi: int) -> None:
+        """Garantit que [lo, hi] est couvert (copie en mémoire si agrandissement)."""
+        n = len(self.arr)
+        if n and lo >= self.lo and hi < self.lo + n: return
+        new_lo = (min(lo, self.lo) if n else lo) - GROW_MARGIN
+        new_hi = (max(hi, self.lo + n - 1) if n else hi) + GROW_MARGIN
+        arr = np.zeros(new_hi - new_lo + 1, dtype=np.float64)
+        if n: arr[self.lo - new_lo:self.lo - new_lo + n] = self.arr
+        self.arr = arr; self.lo = new_lo
+
+    # Accès type defaultdict(float) : un niveau absent vaut 0
+    def __getitem__(self, p) -> float:
+        i = p - self.lo
+        return float(self.arr[i]) if 0 <= i < len(self.arr) else 0.0
+
+    def __setitem__(self, p, v) -> None:
+        self._ensure(p, p); self.arr[p - self.lo] = v
+
+    def __delitem__(self, p) -> None:
+        i = p - self.lo
+        if 0 <= i < len(self.arr): self.arr[i] = 0.0
+
+    def __contains__(self, p) -> bool:
+        i = p - self.lo
+        return 0 <= i < len(self.arr) and self.arr[i] != 0.0
+
+    def get(self, p, default=None):
+        return self[p] if p in self else default
+
+    def __iter__(self):
+        return iter((np.flatnonzero(self.arr) + self.lo).tolist())
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.arr))
+
+    def items(self):
+        nz = np.flatnonzero(self.arr)
+        return list(zip((nz + self.lo).tolist(), self.arr[nz].tolist()))
+
+    def add(self, idx: np.ndarray, weights: np.ndarray) -> None:
+        """Cumul vectorisé (rejeu de journal)."""
+        if not len(idx): return
+        self._ensure(int(idx.min()), int(idx.max()))
+        np.add.at(self.arr, idx.astype(np.int64) - self.lo, weights)
+
+
+# ─────────────── Fichiers .npy par génération ───────────────
+def levels_path(data_dir: str, session: str, sym: str, kind: str, gen: int) -> str:
+    return os.path.join(data_dir, f"levels_{session}_{sym}_{kind}_{gen}.npy")
+
+
+def save_levels(path: str, levels: LevelArray) -> int:
+    """Écrit le tableau (fichier temporaire + fsync + rename) ; retourne la taille écrite."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, np.asarray(levels.arr, dtype=np.float64)); f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def open_levels(path: str, lo: int) -> LevelArray:
+    """Ouverture en place (mmap copy-on-write, pagination à la demande)."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0: return LevelArray()
+    arr = np.load(path, mmap_mode="c")
+    return LevelArray(arr if len(arr) else None, lo)
+
+
+def purge_levels(data_dir: str, session: str, keep_gen: int) -> None:
+    """Supprime les générations obsolètes (un fichier encore mappé est laissé pour la fois suivante)."""
+    for path in glob.glob(os.path.join(glob.escape(data_dir), f"levels_{glob.escape(session)}_*.npy")):
+        if path.endswith(f"_{keep_gen}.npy"): continue
+        try: os.remove(path)
+        except OSError: pass
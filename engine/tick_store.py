@@ -0,0 +1,147 @@
+# engine/tick_store.py
+"""
+Stockage colonnaire des ticks (ts, prix en index de tick, taille, direction).
+
+Les colonnes sont des tableaux NumPy typés ; la zone vivante [start, end) est
+toujours contiguë, ce qui permet d'exposer des vues sans copie. Quand la fin du
+tableau est atteinte, on compacte (si l'éviction a libéré au moins la moitié) ou
+on double la capacité : l'ajout et l'éviction restent en O(1) amorti. Avec une
+capacité maximale, le tableau ne grandit jamais au-delà : on compacte en place,
+et c'est à l'appelant d'évincer avant d'ajouter (OverflowError sinon).
+
+Chaque tick reçoit un numéro de séquence absolu (jamais réutilisé) pour que les
+fenêtres glissantes puissent pointer dans le store malgré les compactions.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+TS_DTYPE = np.float64
+PX_DTYPE = np.int32
+SIZE_DTYPE = np.float32
+DIR_DTYPE = np.int8
+
+# Octets par tick (hors sur-capacité)
+TICK_BYTES = sum(np.dtype(d).itemsize for d in (TS_DTYPE, PX_DTYPE, SIZE_DTYPE, DIR_DTYPE))
+
+
+class TickStore:
+    __slots__ = ("_ts", "_px", "_size", "_dir", "_start", "_end", "_base_seq", "max_capacity")
+
+    def __init__(self, capacity: int = 4096, max_capacity: int | None = None):
+        self.max_capacity = max(1, int(max_capacity)) if max_capacity else None
+        capacity = max(16, int(capacity))
+        if self.max_capacity: capacity = min(capacity, self.max_capacity)
+        self._ts = np.empty(capacity, dtype=TS_DTYPE)
+        self._px = np.empty(capacity, dtype=PX_DTYPE)
+        self._size = np.empty(capacity, dtype=SIZE_DTYPE)
+        self._dir = np.empty(capacity, dtype=DIR_DTYPE)
+        self._start = 0
+        self._end = 0
+        self._base_seq = 0  # séquence absolue du slot _start
+
+    # ─────────────── Taille / séquences ───────────────
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def capacity(self) -> int:
+        return len(self._ts)
+
+    @property
+    def nbytes(self) -> int:
+        return self.capacity * TICK_BYTES
+
+    @property
+    def first_seq(self) -> int:
+        return self._base_seq
+
+    @property
+    def end_seq(self) -> int:
+        return self._base_seq + (self._end - self._start)
+
+    def slot(self, seq: int) -> int:
+        """Index physique d'une séquence vivante (pour un accès direct aux colonnes brutes)."""
+        return self._start + (seq - self._base_seq)
+
+    # ─────────────── Vues sans copie ───────────────
+    @property
+    def ts(self) -> np.ndarray:
+        return self._ts[self._start:self._end]
+
+    @property
+    def px(self) -> np.ndarray:
+        return self._px[self._start:self._end]
+
+    @property
+    def size(self) -> np.ndarray:
+        return self._size[self._start:self._end]
+
+    @property
+    def direction(self) -> np.ndarray:
+        return self._dir[self._start:self._end]
+
+    def columns(self, from_seq: int | None = None):
+        """(ts, px, size, dir) depuis la séquence donnée (vues)."""
+        i = self._start if from_seq is None else self.slot(max(from_seq, self._base_seq))
+        e = self._end
+        return self._ts[i:e], self._px[i:e], self._size[i:e], self._dir[i:e]
+
+    # ─────────────── Mutation ───────────────
+    def append(self, ts: float, px: int, size: float, direction: int) -> None:
+        if self._end == len(self._ts):
+            self._make_room(1)
+        e = self._end
+        self._ts[e] = ts; self._px[e] = px; self._size[e] = size; self._dir[e] = direction
+        self._end = e + 1
+
+    def extend(self, ts, px, size, direction) -> None:
+        n = len(ts)
+        if n == 0:
+            return
+        if self._end + n > len(self._ts):
+            self._make_room(n)
+        e = self._end
+        self._ts[e:e + n] = ts; self._px[e:e + n] = px
+        self._size[e:e + n] = size; self._dir[e:e + n] = direction
+        self._end = e + n
+
+    def drop(self, n: int) -> int:
+        """Évince les n plus vieux ticks (déplacement d'index, pas de copie)."""
+        n = max(0, min(int(n), len(self)))
+        self._start += n
+        self._base_seq += n
+        if self._start == self._end:
+            self._start = self._end = 0
+        return n
+
+    def drop_before(self, ts_limit: float) -> int:
+        """Évince les ticks dont ts < ts_limit (ts supposés croissants)."""
+        return self.drop(int(np.searchsorted(self.ts, ts_limit, side="left")))
+
+    def _make_room(self, n: int) -> None:
+        live = self._end - self._start
+        cap = len(self._ts)
+        if self._start and live + n <= cap // 2:
+            new_cap = cap  # assez de place libérée à gauche : simple compaction
+        else:
+            new_cap = cap
+            while live + n > new_cap // 2:
+                new_cap *= 2
+            if self.max_capacity: new_cap = max(cap, min(new_cap, self.max_capacity))
+            if live + n > new_cap: raise OverflowError(f"TickStore plein ({new_cap} ticks) : évincer avant d'ajouter")
+        for name in ("_ts", "_px", "_size", "_dir"):
+            old = getattr(self, name)
+            arr = old if new_cap == cap else np.empty(new_cap, dtype=old.dtype)
+            arr[:live] = old[self._start:self._end]
+            setattr(self, name, arr)
+        self._start, self._end = 0, live
+
+    # ─────────────── Persistance ───────────────
+    def __getstate__(self):
+        ts, px, size, direction = self.columns()
+        return {"ts": ts.copy(), "px": px.copy(), "size": size.copy(), "dir": direction.copy(), "max_capacity": self.max_capacity}
+
+    def __setstate__(self, state):
+        self.__init__(len(state["ts"]) * 2, state.get("max_capacity"))
+        self.extend(state["ts"], state["px"], state["size"], state["dir"])
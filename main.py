@@ -8,8 +8,11 @@ from ui.dashboard import ModernDashboard
 from core.logger import setup_logging
 
 # Intervalle de rafraîchissement écran en millisecondes
-# 100ms = 10 FPS (Très fluide pour l'oeil, très léger pour le CPU)
+# 100ms = 10 FPS (Très fluide pour l'oeil, très léger pour le CPU) quand le marché bouge ;
+# sans nouvelle donnée, l'intervalle s'allonge progressivement jusqu'au plancher idle.
 GUI_REFRESH_RATE_MS = 100 
+GUI_IDLE_REFRESH_MS = 500
+GUI_IDLE_BACKOFF = 1.5
 
 def start_async_loop(loop, controller, logger):
     """Fonction qui tourne dans un thread séparé pour gérer IB"""
@@ -47,12 +50,19 @@ def main():
     # On ne lie PLUS directement le tick au refresh.
     # controller.on_ui_update = trigger_refresh  <-- ON ENLÈVE ÇA
     
-    # Nouvelle méthode : La boucle de jeu (Game Loop)
+    # Nouvelle méthode : La boucle de jeu (Game Loop), cadencée par les notifications du moteur
+    data_changed = threading.Event()
+    controller.aggregator.add_change_listener(lambda sym: data_changed.set())
+    controller.analyzer.add_change_listener(lambda sym: data_changed.set())
+    delay = [GUI_REFRESH_RATE_MS]
+
     def gui_loop():
-        # 1. On met à jour l'interface
+        busy = data_changed.is_set(); data_changed.clear()
+        # 1. On met à jour l'interface (les widgets inchangés sont sautés)
         dashboard.refresh()
-        # 2. On reprogramme la prochaine mise à jour dans X ms
-        root.after(GUI_REFRESH_RATE_MS, gui_loop)
+        # 2. On reprogramme la prochaine mise à jour : rapide si le marché bouge, sinon on ralentit
+        delay[0] = GUI_REFRESH_RATE_MS if busy else min(GUI_IDLE_REFRESH_MS, int(delay[0] * GUI_IDLE_BACKOFF))
+        root.after(delay[0], gui_loop)
     
     # On lance la boucle
     gui_loop()
@@ -2,13 +2,15 @@
 import os
 import glob
 
-print("🧹 Nettoyage des données corrompues...")
+print("🧹 Nettoyage des données de session (journaux, checkpoints, anciens pickles)...")
 
 # Chemin vers le dossier data
 data_dir = os.path.join(os.getcwd(), "data")
 
 if os.path.exists(data_dir):
-    files = glob.glob(os.path.join(data_dir, "*.pkl"))
+    files = []
+    for pattern in ("*.pkl", "*.pkl.tmp", "journal_*.bin", "*.ckpt", "*.ckpt.tmp", "levels_*.npy", "levels_*.npy.tmp"):
+        files += glob.glob(os.path.join(data_dir, pattern))
     if not files:
         print("✅ Aucun fichier à supprimer.")
     for f in files:
@@ -0,0 +1,87 @@
+"""Stand-in minimal d'ib_insync.IB pour piloter le flux live sans TWS.
+
+Reproduit ce dont dépendent IBResilientManager et FeedPump : un Ticker unique
+par contrat partagé entre souscriptions, les listes tickByTicks / domTicks
+remplacées après chaque `pendingTickersEvent`, et les opérations L2
+insert/update/delete appliquées par position comme dans le wrapper IB.
+"""
+
+from datetime import datetime, timezone
+
+from eventkit import Event
+from ib_insync import DOMLevel, MktDepthData, Ticker, TickByTickAllLast
+from ib_insync.objects import TickAttribLast
+
+
+class FakeIB:
+    def __init__(self, connected=True):
+        self.connected = connected
+        self.connectedEvent = Event("connectedEvent")
+        self.disconnectedEvent = Event("disconnectedEvent")
+        self.pendingTickersEvent = Event("pendingTickersEvent")
+        self.requests = []  # (méthode, symbole)
+        self._tickers = {}
+        self._pending = set()
+
+    # ─────────────── API IB utilisée ───────────────
+    def isConnected(self):
+        return self.connected
+
+    async def connectAsync(self, host, port, clientId=1, timeout=8):
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+    def reqMarketDataType(self, kind):
+        pass
+
+    def _ticker(self, contract):
+        t = self._tickers.get(id(contract))
+        if t is None:
+            t = self._tickers[id(contract)] = Ticker(contract=contract, ticks=[], tickByTicks=[],
+                                                     domBids=[], domAsks=[], domTicks=[])
+        return t
+
+    def reqMktData(self, contract, genericTickList="", snapshot=False, regulatorySnapshot=False, mktDataOptions=None):
+        self.requests.append(("reqMktData", contract.symbol)); return self._ticker(contract)
+
+    def reqTickByTickData(self, contract, tickType, numberOfTicks=0, ignoreSize=False):
+        self.requests.append(("reqTickByTickData", contract.symbol)); return self._ticker(contract)
+
+    def reqMktDepth(self, contract, numRows=5, isSmartDepth=False, mktDepthOptions=None):
+        self.requests.append(("reqMktDepth", contract.symbol)); return self._ticker(contract)
+
+    def cancelMktData(self, contract):
+        self.requests.append(("cancelMktData", getattr(contract, "symbol", None)))
+
+    def cancelTickByTickData(self, contract, tickType):
+        self.requests.append(("cancelTickByTickData", contract.symbol))
+
+    def cancelMktDepth(self, contract, isSmartDepth=False):
+        self.requests.append(("cancelMktDepth", contract.symbol))
+
+    # ─────────────── Simulation du flux ───────────────
+    def trade(self, contract, price, size):
+        t = self._ticker(contract)
+        t.last = price; t.lastSize = size
+        t.tickByTicks.append(TickByTickAllLast(1, datetime.now(timezone.utc), price, size, TickAttribLast(), "CME", ""))
+        self._pending.add(t)
+
+    def depth(self, contract, position, operation, side, price, size):
+        """operation : 0 insert, 1 update, 2 delete ; side : 0 ask, 1 bid."""
+        t = self._ticker(contract)
+        dom = t.domBids if side else t.domAsks
+        if operation == 0: dom.insert(position, DOMLevel(price, size, ""))
+        elif operation == 1: dom[position] = DOMLevel(price, size, "")
+        elif position < len(dom): price = dom.pop(position).price; size = 0
+        t.domTicks.append(MktDepthData(datetime.now(timezone.utc), position, "", operation, side, price, size))
+        self._pending.add(t)
+
+    def flush(self):
+        """Émet le lot courant puis vide les listes, comme le wrapper ib_insync."""
+        if not self._pending: return
+        pending, self._pending = self._pending, set()
+        self.pendingTickersEvent.emit(pending)
+        for t in pending:
+            t.ticks = []; t.tickByTicks = []; t.domTicks = []
@@ -0,0 +1,331 @@
+"""Tests des profils glissants de l'Aggregator."""
+
+import random
+
+import numpy as np
+import pytest
+from collections import defaultdict
+
+import engine.aggregator as agg_mod
+from engine.aggregator import RollingProfile
+
+
+class _Clock:
+    def __init__(self, t=1_000_000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def _history(rp):
+    ts, px, size, direc = rp.store.columns()
+    return list(zip(ts.tolist(), (p * rp.tick_size for p in px.tolist()), size.tolist(), direc.tolist()))
+
+
+def _scan_profile(history, mode, value, now):
+    """Référence : ancien parcours complet de l'historique."""
+    data, delta, cum = defaultdict(float), defaultdict(float), 0
+    for ts, px, size, direc in reversed(history):
+        if mode == "time" and ts < now - value * 60:
+            break
+        data[px] += size
+        delta[px] += size * direc
+        cum += size
+        if mode == "vol" and cum >= value:
+            break
+    return dict(data), dict(delta)
+
+
+def test_window_accumulators_match_full_scan(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(agg_mod.time, "time", clock)
+    rp = RollingProfile(windows=agg_mod.DEFAULT_PROFILE_WINDOWS)
+    rng = random.Random(7)
+    px = 80000  # index de tick
+    for _ in range(3000):
+        clock.t += rng.random() * 2
+        px += rng.choice((-1, 0, 1))
+        rp.add(px, float(rng.randint(1, 20)), rng.choice((1, -1)))
+
+    for mode, value in (("time", 5), ("time", 30), ("vol", 10000), ("vol", 500)):
+        vol, delta = rp.get_profile(mode.capitalize(), value)
+        ref_vol, ref_delta = _scan_profile(_history(rp), mode, value, clock.t)
+        assert vol.keys() == ref_vol.keys()
+        for p in ref_vol:
+            assert abs(vol[p] - ref_vol[p]) < 1e-6
+            assert abs(delta[p] - ref_delta[p]) < 1e-6
+
+
+def _scan_candles(history, mode, value):
+    """Référence : ancienne reconstruction complète des bougies."""
+    candles, cur, bucket_end = [], None, None
+    for ts, px, size, direc in history:
+        is_new = False
+        if mode == "time":
+            if bucket_end is None or ts >= bucket_end:
+                is_new = bucket_end is not None
+                bucket_end = (int(ts) // value) * value + value
+        elif cur and cur["vol"] >= value:
+            is_new = True
+        if is_new:
+            candles.append(cur)
+            cur = None
+        if cur is None:
+            cur = {"open": px, "high": px, "low": px, "close": px, "vol": 0, "delta": 0, "ts": ts}
+        cur["high"] = max(cur["high"], px)
+        cur["low"] = min(cur["low"], px)
+        cur["close"] = px
+        cur["vol"] += size
+        cur["delta"] += size * direc
+    return (candles + [cur])[-100:]
+
+
+def test_candles_and_vwap_match_full_scan(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(agg_mod.time, "time", clock)
+    rp = RollingProfile()
+    rng = random.Random(3)
+    px = 20000
+    for _ in range(2000):
+        clock.t += rng.random() * 3
+        px += rng.choice((-1, 0, 1))
+        rp.add(px, float(rng.randint(1, 9)), rng.choice((1, -1)))
+
+    hist = _history(rp)
+    for mode, value in (("time", 60), ("time", 5), ("vol", 250)):
+        got = rp.get_candles(mode, value)
+        ref = _scan_candles(hist, mode, value)
+        assert len(got) == len(ref)
+        for g, r in zip(got, ref):
+            for k in ("open", "high", "low", "close", "ts"):
+                assert abs(g[k] - r[k]) < 1e-9
+            assert abs(g["vol"] - r["vol"]) < 1e-6 and abs(g["delta"] - r["delta"]) < 1e-6
+
+    recent = [h for h in hist if h[0] >= clock.t - 600]
+    ref_vwap = sum(p * s for _, p, s, _ in recent) / sum(s for _, _, s, _ in recent)
+    assert abs(rp.get_vwap(10) - ref_vwap) < 1e-6
+
+
+def test_time_window_ages_out_without_new_ticks(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(agg_mod.time, "time", clock)
+    rp = RollingProfile(windows=(("time", 5),))
+    rp.add(400, 3.0, 1)
+    assert rp.get_profile("Time", 5)[0] == {100.0: 3.0}
+    clock.t += 301
+    assert rp.get_profile("Time", 5)[0] == {}
+
+
+def test_live_candle_series_match_rebuild(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(agg_mod.time, "time", clock)
+    aggr = agg_mod.Aggregator(None, tick_size_map={"NQ": 0.25})
+    rng = random.Random(11)
+    px = 21000.0
+    for i in range(1500):
+        clock.t += rng.random() * 4
+        px += rng.choice((-0.25, 0, 0.25))
+        aggr._ingest("NQ", px, float(rng.randint(1, 5)), source="TBT")
+        if i == 700:  # série enregistrée en cours de route : rattrapage puis incrémental
+            aggr.get_candles_data("NQ", "vol", 120)
+
+    rp = aggr.rolling_profiles["NQ"]
+    for mode, value in (("time", 60), ("time", 300), ("vol", 120)):
+        live = aggr.get_candles_data("NQ", mode, value)
+        rebuilt = rp.get_candles(mode, value)
+        assert live and len(live) == len(rebuilt)
+        for c_live, c_ref in zip(live, rebuilt):
+            assert dict(c_live) == pytest.approx(c_ref)
+
+
+def test_session_keys_are_tick_indices():
+    aggr = agg_mod.Aggregator(None, tick_size_map={"MES": 0.25})
+    aggr._ingest("MES", 6000.25, 2.0, source="TBT")
+    aggr._ingest("MES", 6000.2500001, 1.0, source="TBT")
+    aggr.on_dom_update("MES", [(6000.0, 5), (5999.75, 3)], [(6000.5, 4)])
+    assert dict(aggr.volume_by_price["MES"]) == {24001: 3.0}
+    assert aggr.get_session_vbp("MES") == {6000.25: 3.0}
+    assert aggr.get_last_tick("MES") == 24001 and aggr.get_last_price("MES") == 6000.25
+    assert dict(aggr.dom["MES"]["bids"]) == {24000: 5, 23999: 3}
+
+
+def test_speed_and_vwap_accumulators(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(agg_mod.time, "time", clock)
+    aggr = agg_mod.Aggregator(None, tick_size_map={"ES": 0.25})
+    trades = []
+    rng = random.Random(5)
+    for _ in range(800):
+        clock.t += rng.random()
+        px, size = 6000 + 0.25 * rng.randint(-8, 8), float(rng.randint(1, 4))
+        aggr._ingest("ES", px, size, source="TBT")
+        trades.append((clock.t, px, size))
+
+    clock.t += 20  # lecture pendant une accalmie : les fenêtres vieillissent quand même
+    last_min = [t for t in trades if t[0] >= clock.t - 60]
+    assert aggr.get_speed("ES") == pytest.approx(sum(s for _, _, s in last_min))
+    last_hour = [t for t in trades if t[0] >= clock.t - 3600]
+    ref = sum(p * s for _, p, s in last_hour) / sum(s for _, _, s in last_hour)
+    assert aggr.get_rolling_vwap("ES", 60) == pytest.approx(ref)
+
+
+def test_eviction_is_time_bounded_and_capped(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(agg_mod.time, "time", clock)
+    rp = RollingProfile(max_history_sec=600, windows=(("vol", 50),), max_ticks=1000)
+    for i in range(5000):
+        clock.t += 0.5
+        rp.add(400 + i % 7, 1.0, 1)
+    stats = rp.memory_stats()
+    assert stats["ticks"] <= 1000 and stats["capped"] > 0
+    assert rp.get_profile("Vol", 50)[0] == _scan_profile(_history(rp), "vol", 50, clock.t)[0]
+
+    # Marché calme : la lecture suffit à tenir l'horizon
+    clock.t += 600 + agg_mod.EVICT_BATCH_SEC + 1
+    rp.get_vwap(60)
+    assert len(rp) == 0 and rp.memory_stats()["evicted"] > 0
+
+
+def test_byte_cap_bounds_allocated_memory(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(agg_mod.time, "time", clock)
+    cap = 1_700_000
+    rp = RollingProfile(max_history_sec=10 ** 9, windows=(("vol", 5000),), max_bytes=cap)
+    rng = np.random.default_rng(3)
+    for i in range(200_000):
+        clock.t += 0.01; rp.add(400 + i % 11, 1.0, 1)
+        assert i % 997 or rp.memory_stats()["allocated_bytes"] <= cap
+    for _ in range(20):   # lots, dont un plus gros que le plafond
+        n = int(rng.integers(1000, 40_000)) if _ else 150_000
+        ts = clock.t + np.arange(1, n + 1) * 0.01; clock.t = float(ts[-1])
+        rp.add_batch(ts, (400 + np.arange(n) % 13).astype(np.int32), np.ones(n, dtype=np.float32), np.ones(n, dtype=np.int8))
+        stats = rp.memory_stats()
+        assert stats["allocated_bytes"] <= cap and stats["bytes"] <= cap and stats["capped"] > 0
+    assert rp.get_profile("Vol", 5000)[0] == _scan_profile(_history(rp), "vol", 5000, clock.t)[0]
+
+
+def test_ladder_grouping_and_cache(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(agg_mod.time, "time", clock)
+    aggr = agg_mod.Aggregator(None, tick_size_map={"NQ": 0.25})
+    rng = random.Random(9)
+    for _ in range(500):
+        clock.t += 0.3
+        aggr._ingest("NQ", 20000 + 0.25 * rng.randint(-12, 12), float(rng.randint(1, 3)), source="TBT")
+    aggr.on_dom_update("NQ", [(19999.75 - 0.25 * i, 10 + i) for i in range(10)], [(20000.25 + 0.25 * i, 5) for i in range(10)])
+    aggr.publish()
+
+    ladder = aggr.get_ladder("NQ", 4)
+    raw_vol, raw_delta = aggr.get_rolling_ticks("NQ", "Time", 5)
+    ref_vol, ref_delta = defaultdict(float), defaultdict(float)
+    for p, v in raw_vol.items():
+        ref_vol[agg_mod.group_bucket(p, 4)] += v
+        ref_delta[agg_mod.group_bucket(p, 4)] += raw_delta[p]
+    assert ladder.vol["s"] == pytest.approx(dict(ref_vol))
+    assert ladder.delta == pytest.approx(dict(ref_delta))
+    ref_bids = defaultdict(float)
+    for p, z in aggr.dom["NQ"]["bids"].items():
+        ref_bids[agg_mod.group_bucket(p, 4)] += z
+    assert ladder.bids == pytest.approx(dict(ref_bids))
+
+    assert aggr.get_ladder("NQ", 4) is ladder  # rien n'a bougé : cache
+    aggr._ingest("NQ", 20000.0, 1.0, source="TBT")
+    assert aggr.get_ladder("NQ", 4) is ladder  # pas encore publié
+    aggr.publish()
+    assert aggr.get_ladder("NQ", 4) is not ladder
+
+
+def test_snapshots_are_immutable_and_published_per_batch(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(agg_mod.time, "time", clock)
+    aggr = agg_mod.Aggregator(None, tick_size_map={"NQ": 0.25})
+    notified = []
+    aggr.add_change_listener(notified.append)
+    for i in range(50):
+        clock.t += 1.0
+        aggr._ingest("NQ", 20000 + 0.25 * (i % 7), 2.0, source="TBT")
+    aggr.on_dom_update("NQ", [(19999.75, 10)], [(20000.25, 5)])
+    assert aggr.snapshot("NQ") is None and notified == []
+    aggr.publish()
+    assert notified == ["NQ"]
+
+    snap = aggr.snapshot("NQ")
+    assert snap.last_tick == 80000 and snap.last_price == 20000.0
+    assert snap.version == aggr.version("NQ")
+    assert dict(snap.vol["s"]) == aggr.get_rolling_ticks("NQ", "time", 5)[0]
+    assert snap.speed == aggr.get_speed("NQ") and snap.vwap_60 == aggr.get_rolling_vwap("NQ", 60)
+    assert list(snap.candles[("time", 60)]) == aggr.get_candles_data("NQ", "time", 60)
+    assert dict(snap.bids) == {79999: 10}
+    with pytest.raises(TypeError): snap.vol["s"][80000] = 1.0
+    with pytest.raises(TypeError): snap.bids[1] = 1
+
+    # Le moteur continue : l'instantané publié ne bouge pas tant qu'on ne republie pas
+    frozen = (dict(snap.vol["s"]), dict(snap.bids), len(snap.candles[("time", 5)]))
+    clock.t += 1.0
+    aggr._ingest("NQ", 20003.0, 9.0, source="TBT")
+    aggr.on_dom_update("NQ", [(19999.0, 1)], [])
+    assert (dict(snap.vol["s"]), dict(snap.bids), len(snap.candles[("time", 5)])) == frozen
+    assert aggr.snapshot("NQ") is snap
+
+    # Republication périodique sans changement : nouvel instantané (fenêtres vieillies), pas de notification
+    aggr.publish(); notified.clear()
+    clock.t += 6 * 60  # fenêtre courte = 5 min
+    aggr.publish(refresh_all=True)
+    assert notified == [] and aggr.snapshot("NQ").vol["s"] == {}
+
+
+def test_ingest_batch_matches_per_tick_ingest(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(agg_mod.time, "time", clock)
+    ref = agg_mod.Aggregator(None, tick_size_map={"NQ": 0.25})
+    bat = agg_mod.Aggregator(None, tick_size_map={"NQ": 0.25})
+    rng = random.Random(21)
+    px = 20000.0
+    for _ in range(300):
+        clock.t += rng.random() * 6
+        prices, sizes = [], []
+        for _ in range(rng.randint(1, 40)):  # rafale : plusieurs trades au même horodatage
+            px += rng.choice((-0.25, 0.0, 0.0, 0.25))
+            prices.append(px); sizes.append(float(rng.choice((1, 2, 5, 0, 6000))))
+        for p, s in zip(prices, sizes):
+            if s > 0: ref._ingest("NQ", p, s, source="TBT")
+        bat.ingest_batch("NQ", prices, sizes)
+
+    assert dict(bat.volume_by_price["NQ"]) == pytest.approx(dict(ref.volume_by_price["NQ"]))
+    assert dict(bat.delta_session["NQ"]) == pytest.approx(dict(ref.delta_session["NQ"]))
+    assert bat.last_tick["NQ"] == ref.last_tick["NQ"] and bat.get_vwap("NQ") == pytest.approx(ref.get_vwap("NQ"))
+    assert bat.rolling_profiles["NQ"].store.columns()[3].tolist() == ref.rolling_profiles["NQ"].store.columns()[3].tolist()
+    for key in agg_mod.LADDER_WINDOWS.values():
+        got, want = bat.get_rolling_data("NQ", *key), ref.get_rolling_data("NQ", *key)
+        assert got[0] == pytest.approx(want[0]) and got[1] == pytest.approx(want[1])
+    for value in (5, 60, 300):
+        live, want = bat.get_candles_data("NQ", "time", value), ref.get_candles_data("NQ", "time", value)
+        assert [dict(c) for c in live] == pytest.approx([dict(c) for c in want])
+
+
+def test_aggressor_from_quote_with_tick_rule_fallback(monkeypatch):
+    from types import SimpleNamespace as NS
+    nan = float("nan")
+    clock = _Clock()
+    monkeypatch.setattr(agg_mod.time, "time", clock)
+    aggr = agg_mod.Aggregator(None, tick_size_map={"NQ": 0.25})
+    dirs = lambda: aggr.rolling_profiles["NQ"].store.columns()[3].tolist()
+
+    # Limite par trade : ask levé, bid frappé au même prix, puis sans limite (règle du tick), puis limite croisée
+    aggr.ingest_batch("NQ", [20000.0, 20000.0, 20000.5, 20000.25], [1, 2, 3, 4],
+                      bids=[19999.75, 20000.0, nan, 20000.5], asks=[20000.0, 20000.25, nan, 20000.25])
+    assert dirs() == [1, -1, 1, -1]
+    assert aggr.get_aggressor_stats("NQ") == {"quote": 2, "tick_rule": 2}
+    assert dict(aggr.delta_session["NQ"]) == {80000: -1.0, 80002: 3.0, 80001: -4.0}
+
+    # Sans limite explicite : meilleure limite du DOM ; un trade dans le spread retombe sur la règle du tick
+    aggr.on_dom_update("NQ", [(20000.0, 5), (19999.75, 9)], [(20000.5, 7)])
+    aggr.ingest_batch("NQ", [20000.0, 20000.25, 20000.5], [1, 1, 1])
+    assert dirs()[4:] == [-1, 1, 1]
+
+    # TBT BidAsk entrelacé avec les trades : chaque trade est classé sur la limite en vigueur
+    tbt = [NS(bidPrice=20001.0, askPrice=20001.25), NS(price=20001.0, size=2, time=None),
+           NS(bidPrice=20000.75, askPrice=20001.0), NS(price=20001.0, size=2, time=None)]
+    aggr.on_tick("NQ", NS(tickByTicks=tbt))
+    assert dirs()[7:] == [-1, 1]
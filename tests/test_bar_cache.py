@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("ib_insync")
+
+from ib_insync import BarData, Contract
+
+from engine.bar_cache import BarCache, delta_duration, duration_seconds
+
+T0 = datetime(2026, 10, 14, 12, 0, tzinfo=timezone.utc)
+
+
+class _History:
+    """Flux M1 synthétique : la barre en cours évolue jusqu'à la minute suivante."""
+    def __init__(self):
+        self.now = T0; self.requests = []
+
+    def bars(self, duration):
+        end = self.now.replace(second=0); n = duration_seconds(duration) // 60 + 1
+        out = []
+        for i in range(n - 1, -1, -1):
+            d = end - timedelta(minutes=i); px = 100.0 + d.minute + (self.now.second / 100 if i == 0 else 0)
+            out.append(BarData(date=d, open=px, high=px + 1, low=px - 1, close=px, volume=10))
+        return out
+
+    async def fetch(self, contract, duration, bar_size):
+        self.requests.append(duration)
+        return self.bars(duration)
+
+
+def test_backfill_then_delta_and_restart(tmp_path):
+    hist = _History(); c = Contract(symbol="NQ", secType="FUT", conId=42)
+    cache = BarCache(str(tmp_path), clock=lambda: hist.now.timestamp())
+    first = asyncio.run(cache.get(c, "14400 S", "1 min", hist.fetch))
+    assert hist.requests == ["14400 S"] and len(first) == 241
+
+    hist.now += timedelta(minutes=3, seconds=20)
+    bars = asyncio.run(cache.get(c, "14400 S", "1 min", hist.fetch))
+    assert hist.requests[-1] == delta_duration(200, 60) == "260 S"
+    expected = hist.bars("14400 S")
+    assert [b.date for b in bars] == [b.date for b in expected]
+    assert bars[-1].close == expected[-1].close   # barre en cours rafraîchie
+    assert cache.get_stats()["delta"] == 1
+
+    # Même taille de barre, autre durée : backfill de cette durée, cache partagé
+    short = asyncio.run(cache.get(c, "3600 S", "1 min", hist.fetch))
+    assert hist.requests[-1] == "3600 S" and len(short) == 61 and short[-1].date == bars[-1].date
+    assert len(asyncio.run(cache.get(c, "14400 S", "1 min", hist.fetch))) == 241
+
+    assert cache.save() > 0 and cache.save() == 0
+    hist.now += timedelta(minutes=1)
+    again = BarCache(str(tmp_path), clock=lambda: hist.now.timestamp())
+    n = len(hist.requests)
+    bars = asyncio.run(again.get(c, "14400 S", "1 min", hist.fetch))
+    assert len(hist.requests) == n + 1 and hist.requests[-1].endswith(" S") and hist.requests[-1] != "14400 S"
+    assert [b.date for b in bars] == [b.date for b in hist.bars("14400 S")]
+
+
+def test_stale_cache_refetches_full_window_and_failure_keeps_cache():
+    hist = _History(); c = Contract(symbol="ES", secType="FUT")
+    cache = BarCache(None, clock=lambda: hist.now.timestamp())
+    asyncio.run(cache.get(c, "3600 S", "1 min", hist.fetch))
+    hist.now += timedelta(hours=3)
+    asyncio.run(cache.get(c, "3600 S", "1 min", hist.fetch))
+    assert hist.requests == ["3600 S", "3600 S"]
+
+    async def down(*a): return None
+    bars = asyncio.run(cache.get(c, "3600 S", "1 min", down))
+    assert len(bars) == 61 and cache.get_stats()["failed"] == 1
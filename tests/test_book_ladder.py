@@ -0,0 +1,130 @@
+import random
+import types
+
+import config
+
+import engine.aggregator as agg_mod
+from ui import book
+
+
+class _FakeTree:
+    """Treeview minimal : ordre des lignes, valeurs/tags et compteur d'appels."""
+
+    def __init__(self):
+        self.order = []; self.cells = {}; self.calls = 0; self._n = 0
+
+    def get_children(self):
+        self.calls += 1; return tuple(self.order)
+
+    def delete(self, *iids):
+        self.calls += 1
+        for i in iids: self.order.remove(i); self.cells.pop(i)
+
+    def insert(self, parent, index, values=(), tags=()):
+        self.calls += 1; self._n += 1; iid = f"I{self._n}"
+        self.order.append(iid); self.cells[iid] = (tuple(values), tuple(tags))
+        return iid
+
+    def item(self, iid, values=(), tags=()):
+        self.calls += 1; self.cells[iid] = (tuple(values), tuple(tags))
+
+    def move(self, iid, parent, index):
+        self.calls += 1; self.order.remove(iid)
+        if index == "end": self.order.append(iid)
+        else: self.order.insert(index, iid)
+
+    def see(self, iid):
+        self.calls += 1
+
+    def rows(self):
+        return [self.cells[i] for i in self.order]
+
+
+class _Label:
+    def __init__(self): self.calls = 0; self.text = None
+    def config(self, **kw): self.calls += 1; self.text = kw.get("text")
+
+
+def _widget(aggr, markers):
+    ctrl = types.SimpleNamespace(
+        get_dom_levels=lambda s: [],
+        get_trading_markers=lambda s: markers, get_aggregator=lambda: aggr, state_version=lambda s: 0)
+    w = book.MultiHorizonWidget.__new__(book.MultiHorizonWidget)
+    w.__dict__.update(controller=ctrl, aggr=aggr, sym="NQ", tick_size=0.25, is_active=True, _anchor_price=None,
+                      _last_user_scroll=0.0, _scroll_timeout=15.0, current_display_prices=[], lbl_info=_Label(),
+                      _info_text=None, _need_see=True, _opts={"struct": True, "vol": True, "grp": 1},
+                      _drawn_sig=None, _drawn_at=0.0)
+    w.trees = {k: _FakeTree() for k in ("ctx", "s", "m", "l", "bid", "px", "ask", "delta")}
+    w.tree_list = list(w.trees.values())
+    w._rows = book._LadderRows(w.trees, book.LADDER_ROWS)
+    return w
+
+
+def _fresh_rows(w):
+    """Rendu de référence : même état, lignes allouées à neuf."""
+    ref = _widget(w.aggr, w.controller.get_trading_markers("NQ"))
+    ref._anchor_price = w._anchor_price; ref._opts = dict(w._opts)
+    ref.update_data()
+    return {k: t.rows() for k, t in ref.trees.items()}
+
+
+def test_ladder_diff_rendering_matches_full_redraw():
+    aggr = agg_mod.Aggregator(None, tick_size_map={"NQ": 0.25})
+    rng = random.Random(3); px = 20000.0
+    markers = {}
+    w = _widget(aggr, markers)
+    for _ in range(20):
+        for _ in range(rng.randint(1, 40)):
+            px += rng.choice((-0.25, 0.0, 0.25)) * rng.randint(1, 8)
+            aggr._ingest("NQ", px, float(rng.randint(1, 5)), source="TBT")
+        aggr.on_dom_update("NQ", [(px - 0.25 * i, 10 + i) for i in range(1, 11)],
+                           [(px + 0.25 * i, 20 + i) for i in range(1, 11)])
+        markers.clear(); markers[px] = "ENTRY"
+        aggr.publish()
+        w.update_data()
+        assert {k: t.rows() for k, t in w.trees.items()} == _fresh_rows(w)
+        assert all(len(t.order) == book.LADDER_ROWS for t in w.tree_list)
+
+    # Frame inchangée : aucun appel Tk
+    before = sum(t.calls for t in w.tree_list) + w.lbl_info.calls
+    w.update_data()
+    assert sum(t.calls for t in w.tree_list) + w.lbl_info.calls == before
+
+
+def test_ladder_anchor_shift_moves_rows():
+    trees = {k: _FakeTree() for k in ("px", "bid")}
+    rows = book._LadderRows(trees, 5)
+    col = lambda top: [((str(top - r),), ()) for r in range(5)]
+    rows.render(100, 1, {"px": col(100), "bid": col(100)})
+    prev = 100
+    for top in (102, 99, 99, 110, 108):
+        moved = rows.render(top, 1, {"px": col(top), "bid": col(top)})
+        assert trees["px"].rows() == col(top) and trees["bid"].rows() == col(top)
+        assert moved == (top != prev); prev = top
+    # Décalage de 2 lignes : 2 move + 2 item par colonne
+    calls = trees["px"].calls
+    rows.render(106, 1, {"px": col(106), "bid": col(106)})
+    assert trees["px"].calls - calls == 4
+    # Changement de groupement : pas de décalage, tout est rediffé
+    assert rows.render(106, 4, {"px": col(106), "bid": col(106)}) is True
+
+
+def test_refresh_skips_unchanged_symbol(monkeypatch):
+    aggr = agg_mod.Aggregator(None, tick_size_map={"NQ": 0.25})
+    aggr._ingest("NQ", 20000.0, 1.0, source="TBT"); aggr.publish()
+    notified = []
+    aggr.add_change_listener(notified.append)
+    w = _widget(aggr, {})
+    now = [1000.0]
+    monkeypatch.setattr(book.time, "time", lambda: now[0])
+
+    assert w.refresh() is True
+    assert w.refresh() is False
+    aggr._ingest("NQ", 20000.25, 1.0, source="TBT")
+    assert w.refresh() is False  # pas encore publié
+    aggr.publish()
+    assert notified == ["NQ"]
+    assert w.refresh() is True
+    # Sans nouvelle donnée, redessin forcé après le délai maximal
+    now[0] += config.GUI_REFRESH_MAX_AGE_SEC
+    assert w.refresh() is True and w.refresh() is False
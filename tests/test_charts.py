@@ -0,0 +1,82 @@
+import types
+
+import engine.aggregator as agg_mod
+from ui import charts
+
+
+class _FakeCanvas:
+    """Canvas minimal : items vivants et compteur d'appels par méthode."""
+
+    def __init__(self):
+        self.items = {}; self.calls = {}; self._n = 0
+
+    def _count(self, name): self.calls[name] = self.calls.get(name, 0) + 1
+
+    def winfo_width(self): return 300
+    def winfo_height(self): return 250
+
+    def delete(self, what):
+        self._count("delete"); self.items.clear()
+
+    def __getattr__(self, name):
+        if not name.startswith("create_"): raise AttributeError(name)
+        def create(*args, **kw):
+            self._count("create"); self._n += 1; self.items[self._n] = (name, args, kw); return self._n
+        return create
+
+    def coords(self, item, *args):
+        self._count("coords"); assert item in self.items
+
+    def itemconfigure(self, item, **kw):
+        self._count("itemconfigure"); assert item in self.items
+
+    def reset(self): self.calls = {}
+
+
+class _Var:
+    def __init__(self, v): self.v = v
+    def get(self): return self.v
+
+
+def _chart(aggr):
+    analyzer = types.SimpleNamespace(get_radar_snapshot=lambda s: {}, version=lambda s: 0)
+    ctrl = types.SimpleNamespace(analyzer=analyzer, get_aggregator=lambda: aggr)
+    c = charts.MiniChartWidget.__new__(charts.MiniChartWidget)
+    c.__dict__.update(controller=ctrl, aggr=aggr, sym="NQ", mode_var=_Var("5s"), heat_var=_Var(False),
+                      _drawn_sig=None, _drawn_at=0.0, _layout=None, _scale=None, _live=None)
+    c.canvas = _FakeCanvas()
+    return c
+
+
+def test_forming_candle_moves_persistent_items(monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(agg_mod.time, "time", lambda: clock[0])
+    aggr = agg_mod.Aggregator(None, tick_size_map={"NQ": 0.25})
+    px = 20000.0
+    for i in range(42):  # 8 bougies de 5 s + une en formation
+        clock[0] += 1.0; px += 0.25 if i % 3 else -0.5
+        aggr.ingest_batch("NQ", [px], [1.0])
+    aggr.publish()
+    chart = _chart(aggr); cv = chart.canvas
+    chart.update_chart()
+    assert cv.calls["delete"] == 1 and cv.calls["create"] > 20
+
+    # Tick dans la bougie en formation, sans nouvel extrême : pas de relayout, quelques déplacements
+    forming = aggr.snapshot("NQ").candles[("time", 5)][-1]
+    inside = forming["low"] if forming["close"] != forming["low"] else forming["high"]
+    assert inside != forming["close"]
+    cv.reset(); clock[0] += 0.5
+    aggr.ingest_batch("NQ", [inside], [2.0]); aggr.publish()
+    chart.update_chart()
+    assert "create" not in cv.calls and "delete" not in cv.calls
+    assert sum(cv.calls.values()) <= 8
+
+    # Rien de neuf : aucun appel Tk
+    cv.reset(); chart.update_chart()
+    assert cv.calls == {}
+
+    # Nouvelle bougie : la liste change, relayout complet
+    cv.reset(); clock[0] += 5.0
+    aggr.ingest_batch("NQ", [px], [1.0]); aggr.publish()
+    chart.update_chart()
+    assert cv.calls["delete"] == 1
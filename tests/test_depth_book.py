@@ -0,0 +1,60 @@
+import random
+
+from engine.aggregator import Aggregator
+from engine.depth_book import ASK, BID, DELETE, INSERT, UPDATE, DepthBook
+
+
+def _reference(rows, tick):
+    """Référence : agrégation complète des lignes, comme l'ancien on_dom_update."""
+    out = {}
+    for price, size in rows:
+        if size > 0: k = int(round(price / tick)); out[k] = out.get(k, 0) + int(size)
+    return out
+
+
+def test_incremental_ops_match_full_rebuild():
+    rng = random.Random(5)
+    book = DepthBook(0.25); ref = {ASK: [], BID: []}
+    for _ in range(5000):
+        side = rng.choice((ASK, BID)); rows = ref[side]
+        op = rng.choice((INSERT, UPDATE, DELETE)) if rows else INSERT
+        pos = rng.randrange(len(rows) + (op == INSERT)) if rows else 0
+        price = 20000 + (1 if side == ASK else -1) * 0.25 * rng.randint(0, 12); size = rng.randint(1, 40)
+        if op == INSERT: rows.insert(pos, (price, size))
+        elif op == UPDATE: rows[pos] = (price, size)
+        else: rows.pop(pos)
+        book.apply(pos, op, side, price, size)
+
+        if rng.random() < 0.05 or _ == 4999:
+            for sd in (ASK, BID):
+                want = _reference(ref[sd], 0.25)
+                assert book.levels[sd] == want and book.depth(sd) == sum(want.values())
+                assert book.best(sd) == (int(round(ref[sd][0][0] / 0.25)) if ref[sd] else None)
+            b, a = book.depth(BID), book.depth(ASK)
+            assert book.imbalance() == ((b - a) / (b + a) if b + a else 0.0)
+
+
+def test_top_levels_merge_rows_and_cumulate():
+    book = DepthBook(0.25)
+    for pos, (px, sz) in enumerate(((20000.0, 5), (20000.0, 3), (19999.75, 4), (19999.5, 10))):
+        book.apply(pos, INSERT, BID, px, sz)
+    book.apply(0, INSERT, ASK, 20000.25, 6)
+    assert book.top(BID, 2) == [(80000, 8), (79999, 4)]
+    assert book.depth(BID, 2) == 12 and book.depth(BID) == 22
+    assert book.imbalance(1) == (8 - 6) / 14
+
+
+def test_aggregator_applies_depth_deltas_and_freezes_snapshots():
+    aggr = Aggregator(None, tick_size_map={"NQ": 0.25})
+    aggr.on_depth("NQ", [(0, INSERT, BID, 19999.75, 10), (0, INSERT, ASK, 20000.0, 4)])
+    aggr.publish(); snap = aggr.snapshot("NQ")
+    assert dict(snap.bids) == {79999: 10} and dict(snap.asks) == {80000: 4}
+    assert snap.imbalance == (10 - 4) / 14
+
+    aggr.on_depth("NQ", [(0, UPDATE, BID, 19999.75, 2), (0, DELETE, ASK, 20000.0, 0)])
+    assert dict(snap.bids) == {79999: 10}              # l'instantané publié n'a pas bougé
+    aggr.publish(); snap2 = aggr.snapshot("NQ")
+    assert dict(snap2.bids) == {79999: 2} and dict(snap2.asks) == {} and snap2.imbalance == 1.0
+
+    aggr.clear_depth("NQ"); aggr.publish()
+    assert dict(aggr.snapshot("NQ").bids) == {}
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("ib_insync")
+
+from ib_insync import IB, Contract
+from ib_insync.objects import TickAttribLast
+
+import core.ib_resilient_manager as ibrm_mod
+from core.ib_resilient_manager import IBResilientManager
+from engine.aggregator import Aggregator
+from engine.feed import FeedPump, _hook_exchange_time
+from fake_ib import FakeIB
+
+
+def _setup():
+    ibm = IBResilientManager(auto_connect=False)
+    ibm.ib = FakeIB()
+    contracts = {"NQ": Contract(symbol="NQ", secType="FUT"), "ES": Contract(symbol="ES", secType="FUT")}
+    aggr = Aggregator(None, tick_size_map={"NQ": 0.25, "ES": 0.25})
+    pump = FeedPump(ibm, aggr, contracts, depth_symbols=["NQ"])
+    pump.start()
+    return ibm, aggr, pump, contracts
+
+
+def test_pump_subscribes_and_drains_batches():
+    ibm, aggr, pump, c = _setup()
+    fake = ibm.ib
+    assert sorted(fake.requests) == [("reqMktDepth", "NQ"), ("reqTickByTickData", "ES"), ("reqTickByTickData", "NQ")]
+
+    fake.trade(c["NQ"], 20000.0, 2); fake.trade(c["NQ"], 20000.25, 1); fake.trade(c["ES"], 5000.0, 3)
+    fake.depth(c["NQ"], 0, 0, 1, 19999.75, 10); fake.depth(c["NQ"], 0, 0, 0, 20000.5, 7)
+    fake.flush()
+    assert aggr.get_session_vbp("NQ") == {20000.0: 2.0, 20000.25: 1.0}
+    assert aggr.get_session_vbp("ES") == {5000.0: 3.0}
+    assert dict(aggr.dom["NQ"]["bids"]) == {79999: 10} and dict(aggr.dom["NQ"]["asks"]) == {80002: 7}
+
+    # Lot suivant : nouvelle liste tickByTicks (plus courte) -> rien de perdu ni de compté deux fois
+    fake.trade(c["NQ"], 20000.25, 4)
+    fake.depth(c["NQ"], 0, 2, 1, 0, 0)
+    fake.flush()
+    assert aggr.get_session_vbp("NQ") == {20000.0: 2.0, 20000.25: 5.0}
+    assert dict(aggr.dom["NQ"]["bids"]) == {}
+
+    st = pump.get_stats()
+    assert st["batches"] == 2 and st["trades"] == 4 and st["depth"] == 3 and st["errors"] == 0
+    assert st["max_ms"] >= st["last_ms"] >= 0.0
+
+    pump.stop()
+    fake.trade(c["NQ"], 20000.0, 1); fake.flush()
+    assert aggr.get_session_vbp("NQ")[20000.0] == 2.0
+    assert ("cancelTickByTickData", "NQ") in fake.requests and ("cancelMktDepth", "NQ") in fake.requests
+
+
+def test_pump_survives_reconnect_with_new_ib(monkeypatch):
+    monkeypatch.setattr(ibrm_mod, "MIN_STABLE_WINDOW_SEC", 0)
+    ibm, aggr, pump, c = _setup()
+    old = ibm.ib
+    old.trade(c["NQ"], 20000.0, 1); old.flush()
+
+    # Auto-heal : nouvelle instance IB, reconnexion puis resouscription de tous les flux
+    ibm.ib = FakeIB(connected=False); ibm._attach_handlers()
+    asyncio.run(ibm._on_disconnect_sequence())
+    new = ibm.ib
+    assert sorted(new.requests) == [("reqMktDepth", "NQ"), ("reqTickByTickData", "ES"), ("reqTickByTickData", "NQ")]
+
+    new.trade(c["NQ"], 20000.0, 2); new.flush()
+    old.trade(c["NQ"], 20000.0, 100); old.flush()  # l'ancienne instance n'est plus écoutée
+    assert aggr.get_session_vbp("NQ") == {20000.0: 3.0}
+
+
+def test_exchange_time_survives_backlog():
+    ib = IB(); w = ib.wrapper
+    _hook_exchange_time(ib); _hook_exchange_time(ib)   # idempotent
+    c = Contract(symbol="NQ", secType="FUT")
+    w.startTicker(7, c, "tickByTick"); t = w.reqId2Ticker[7]
+    arrival = time.time(); sec = int(arrival)
+    w.lastTime = datetime.fromtimestamp(arrival, timezone.utc)   # tout le paquet reçu au même instant
+    for exch, px in ((sec - 60, 20000.0), (sec - 61, 20000.25), (sec, 20000.5)):  # arriéré (dont 1 hors ordre) puis live
+        w.tickByTickAllLast(7, 1, exch, px, 1, TickAttribLast(), "CME", "")
+    assert [r.time.timestamp() for r in t.tickByTicks] == pytest.approx([sec - 60, sec - 61, arrival])
+
+    aggr = Aggregator(None, tick_size_map={"NQ": 0.25})
+    aggr.on_tick("NQ", t)
+    assert aggr.rolling_profiles["NQ"].store.ts.tolist() == pytest.approx([sec - 60, sec - 60, arrival])  # ts croissants
+    st = aggr.get_clock_stats("NQ")
+    assert st["clamped"] == 1 and st["max_ms"] >= 61000 and 0 <= st["last_ms"] < 1000
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+pytest.importorskip("ib_insync")
+
+from ib_insync import BarData, util
+
+from engine.market_analyzer import MarketAnalyzer
+
+
+def _legacy_fvgs(an, df, tick_size):
+    """Implémentation d'origine (iloc, O(n²)) : référence de l'équivalence."""
+    fvgs = []
+    if len(df) < 5: return []
+    MIN_GAP_TICKS = 1
+    start_index = max(2, len(df)-100)
+    for i in range(start_index, len(df)-1):
+        c1 = df.iloc[i-2]; c2 = df.iloc[i-1]; c3 = df.iloc[i]
+        pot = None; gap_size = 0
+        if c1['high'] < c3['low']:
+            gap_size = c3['low'] - c1['high']
+            if gap_size >= (MIN_GAP_TICKS * tick_size):
+                pot = {"type": "BULL", "top": an._snap(c3['low'], tick_size), "bot": an._snap(c1['high'], tick_size), "time": c2['date'], "mitigated": False}
+        elif c1['low'] > c3['high']:
+            gap_size = c1['low'] - c3['high']
+            if gap_size >= (MIN_GAP_TICKS * tick_size):
+                pot = {"type": "BEAR", "top": an._snap(c1['low'], tick_size), "bot": an._snap(c3['high'], tick_size), "time": c2['date'], "mitigated": False}
+        if pot:
+            is_alive = True
+            for j in range(i + 1, len(df)):
+                bar = df.iloc[j]
+                if pot['type'] == "BULL":
+                    if bar['low'] < pot['bot']: is_alive = False; break
+                    if bar['low'] <= pot['top']: pot['mitigated'] = True
+                elif pot['type'] == "BEAR":
+                    if bar['high'] > pot['top']: is_alive = False; break
+                    if bar['high'] >= pot['bot']: pot['mitigated'] = True
+            if is_alive: fvgs.append(pot)
+    return fvgs[::-1]
+
+
+def _df(rng, n, step, tick):
+    t0 = datetime(2026, 10, 14, 14, 0, tzinfo=timezone.utc); px = 20000.0; bars = []
+    for k in range(n):
+        o = px; c = o + rng.normal(0, step); h = max(o, c) + abs(rng.normal(0, step / 2)); l = min(o, c) - abs(rng.normal(0, step / 2))
+        if tick: o, h, l, c = (round(v / tick) * tick for v in (o, h, l, c))
+        bars.append(BarData(date=t0 + timedelta(minutes=5 * k), open=o, high=h, low=l, close=c, volume=10)); px = c
+    return util.df(bars)
+
+
+@pytest.mark.parametrize("n", [4, 5, 6, 40, 101, 102, 250])
+def test_vectorized_fvgs_match_legacy(n):
+    an = MarketAnalyzer(None, {}, data_dir=None)
+    rng = np.random.default_rng(n); seen = set()
+    for step, tick in ((4.0, 0.25), (1.0, 0.25), (6.0, 0.0), (0.3, 0.1)):
+        for _ in range(3):
+            df = _df(rng, n, step, tick)
+            new = an._detect_smart_fvgs(df, tick)
+            assert new == _legacy_fvgs(an, df, tick)
+            seen.update((f["type"], f["mitigated"]) for f in new)
+    if n >= 101: assert len(seen) == 4 # le jeu couvre BULL / BEAR, mitigés ou non
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("ib_insync")
+
+from ib_insync import Contract
+
+import engine.hist_scheduler as hs
+from engine.hist_scheduler import HistoricalScheduler
+
+
+class _IB:
+    def __init__(self, delay=0.02):
+        self.delay = delay; self.calls = []; self.active = 0; self.max_active = 0
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime, durationStr, barSizeSetting, **kw):
+        self.calls.append((contract.symbol, durationStr, barSizeSetting, time.monotonic()))
+        self.active += 1; self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if durationStr == "fail": raise RuntimeError("pacing violation")
+            return [f"{contract.symbol}:{durationStr}:{barSizeSetting}"]
+        finally:
+            self.active -= 1
+
+
+def _sched(ib, **kw):
+    return HistoricalScheduler(type("IBM", (), {"ib": ib})(), **kw)
+
+
+def test_concurrency_cap_priority_and_coalescing():
+    ib = _IB(); s = _sched(ib, max_concurrent=2, rate_per_sec=1000, burst=100)
+    nq = Contract(symbol="NQ", conId=1); es = Contract(symbol="ES", conId=2)
+
+    async def run():
+        return await asyncio.gather(
+            s.request(nq, "60 D", "1 day"), s.request(es, "60 D", "1 day"),   # partent tout de suite
+            s.request(nq, "20 D", "4 hours"), s.request(nq, "28800 S", "1 min"), s.request(es, "28800 S", "1 min"),
+            s.request(nq, "28800 S", "1 min"))                                 # identique : fusionnée
+    res = asyncio.run(run())
+    assert ib.max_active == 2 and len(ib.calls) == 5
+    assert [c[2] for c in ib.calls] == ["1 day", "1 day", "1 min", "1 min", "4 hours"]  # M1 avant H4
+    assert res[3] == res[5] == ["NQ:28800 S:1 min"]
+    st = s.get_stats()
+    assert st["sent"] == 5 and st["coalesced"] == 1 and st["queued"] == 0 and st["in_flight"] == 0 and st["wait_max_ms"] > 0
+
+
+def test_pacing_identical_requests_and_token_bucket(monkeypatch):
+    monkeypatch.setattr(hs, "HIST_IDENTICAL_SEC", 0.2)
+    ib = _IB(delay=0.0); s = _sched(ib, rate_per_sec=20, burst=2)
+    nq = Contract(symbol="NQ", conId=1)
+
+    async def run():
+        await s.request(nq, "300 S", "1 min")
+        await s.request(nq, "300 S", "1 min")   # identique à moins de 0,2 s : attend
+        await asyncio.gather(*(s.request(nq, f"{n} S", "1 min") for n in (60, 120, 180)))
+    asyncio.run(run())
+    t = [c[3] for c in ib.calls]
+    assert t[1] - t[0] >= 0.19
+    assert s.get_stats()["throttled"] > 0 and t[-1] - t[2] >= 0.04   # jetons épuisés : 20 / s
+
+
+def test_failure_is_raised_to_every_waiter():
+    ib = _IB(); s = _sched(ib)
+    nq = Contract(symbol="NQ", conId=1)
+
+    async def run():
+        return await asyncio.gather(s.request(nq, "fail", "1 min"), s.request(nq, "fail", "1 min"), return_exceptions=True)
+    res = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in res) and len(ib.calls) == 1
+    assert s.get_stats()["failed"] == 1
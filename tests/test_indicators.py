@@ -0,0 +1,104 @@
+import asyncio
+import math
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine.market_analyzer as ma_mod
+
+pytest.importorskip("ib_insync")
+
+from ib_insync import BarData
+
+from engine.indicators import IncrementalIndicators
+from engine.market_analyzer import MarketAnalyzer
+
+T0 = datetime(2026, 10, 14, 14, 0, tzinfo=timezone.utc)
+
+
+def _bars(closes, start=T0):
+    return [BarData(date=start + timedelta(minutes=k), open=c, high=c + 1, low=c - 1, close=c) for k, c in enumerate(closes)]
+
+
+def _pandas(closes):
+    """Calcul d'origine de _scan_timeframe sur la série complète."""
+    s = pd.Series(closes, dtype=float); delta = s.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    return 100 - (100 / (1 + (gain / loss).iloc[-1])), s.ewm(span=20, adjust=False).mean().iloc[-1]
+
+
+def _check(ind, closes):
+    rsi, ema = _pandas(closes)
+    assert (math.isnan(ind.rsi) and math.isnan(rsi)) or ind.rsi == pytest.approx(rsi, abs=1e-9)
+    assert ind.ema == pytest.approx(ema, rel=1e-12)
+
+
+def test_incremental_rsi_ema_match_full_recompute():
+    rng = np.random.default_rng(7)
+    closes = list(np.round(20000 + np.cumsum(rng.normal(0, 2, 120)) * 4) / 4)
+    ind = IncrementalIndicators(60)
+    for n in range(1, len(closes) + 1):
+        live = closes[:n]
+        live[-1] += 0.5; ind.update(_bars(live)); _check(ind, live)    # barre en cours
+        live[-1] -= 0.5; ind.update(_bars(live)); _check(ind, live)    # même barre, clôture révisée
+    assert not math.isnan(ind.rsi)
+
+    # Trou dans la série (ex. backfill après un arrêt) : reconstruction depuis la nouvelle série
+    other = list(closes[::-1]); ind.update(_bars(other, T0 + timedelta(days=1))); _check(ind, other)
+    flat = [100.0] * 30; ind.update(_bars(flat)); _check(ind, flat); assert math.isnan(ind.rsi)
+
+
+def test_intrabar_price_updates_forming_bar_only():
+    closes = [100.0 + (k % 5) for k in range(40)]
+    ind = IncrementalIndicators(60); ind.update(_bars(closes))
+    forming = (T0 + timedelta(minutes=39)).timestamp()
+    assert ind.on_price(103.25, forming + 30)
+    _check(ind, closes[:-1] + [103.25])
+    assert not ind.on_price(103.25, forming + 31)          # prix inchangé
+    assert not ind.on_price(99.0, forming + 60)            # barre écoulée : on attend la suivante
+    _check(ind, closes[:-1] + [103.25])
+
+
+def test_analyzer_publishes_live_rsi_ema():
+    an = MarketAnalyzer(None, {"NQ": 0.25}, data_dir=None)
+    seen = []; an.add_change_listener(seen.append)
+    closes = [100.0 + (k % 7) * 0.25 for k in range(60)]
+    an._scan_timeframe("NQ", "M1", _bars(closes))
+    before = an.get_radar_snapshot("NQ")["M1"]; v = an.version("NQ")
+    _check(an._indicators[("NQ", "M1")], closes)
+
+    now = (T0 + timedelta(minutes=59, seconds=10)).timestamp()
+    an.on_price("NQ", 105.0, now)
+    after = an.get_radar_snapshot("NQ")["M1"]
+    assert an.version("NQ") == v + 1 and after["last_close"] == 105.0 and after["fvgs"] is before["fvgs"]
+    assert (after["rsi"], after["ema_20"]) == pytest.approx(_pandas(closes[:-1] + [105.0]))
+    an.on_price("NQ", 105.0, now + 1); an.on_price("ES", 1.0, now)
+    assert an.version("NQ") == v + 1 and seen.count("NQ") == v + 1
+
+
+def test_live_indicator_loop_follows_every_notification(monkeypatch):
+    monkeypatch.setattr(ma_mod, "LIVE_INDICATOR_SEC", 0.01)
+    closes = [100.0 + (k % 7) * 0.25 for k in range(60)]
+    start = datetime.fromtimestamp(ma_mod.time.time() - 59 * 60, tz=timezone.utc)  # barre en cours ouverte à l'instant
+    prices = {}
+    aggr = type("Aggr", (), {"listeners": [], "get_last_price": lambda self, s: prices.get(s),
+                              "add_change_listener": lambda self, cb: self.listeners.append(cb)})()
+    an = MarketAnalyzer(None, {"NQ": 0.25}, data_dir=None)
+    an.attach_live_prices(aggr)
+    an._scan_timeframe("NQ", "M1", _bars(closes, start))
+
+    async def run():
+        task = asyncio.ensure_future(an.start_live_indicator_loop())
+        seen = []
+        for px in (101.0, 102.5, 99.75, 103.0, 100.5):
+            prices["NQ"] = px
+            for cb in aggr.listeners: cb("NQ")   # publication de l'Aggregator
+            await asyncio.sleep(0.05)
+            seen.append(an.get_radar_snapshot("NQ")["M1"]["last_close"])
+            assert an.get_radar_snapshot("NQ")["M1"]["rsi"] == pytest.approx(_pandas(closes[:-1] + [px])[0])
+        task.cancel()
+        return seen
+    assert asyncio.run(run()) == [101.0, 102.5, 99.75, 103.0, 100.5]
@@ -0,0 +1,148 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+import engine.aggregator as agg_mod
+from engine.journal import JOURNAL_DTYPE, RECORD_BYTES, TickJournal
+
+
+class _Clock:
+    def __init__(self, t=1_000_000.0): self.t = t
+    def __call__(self): return self.t
+
+
+def _feed(aggr, clock, n, seed=1):
+    rng = random.Random(seed); px = 20000.0
+    for i in range(n):
+        clock.t += 0.5; px += rng.choice((-0.25, 0.0, 0.25))
+        aggr._ingest("NQ", px, float(rng.randint(1, 5)), source="TBT")
+        if i % 50 == 49: aggr.end_batch()
+    aggr.end_batch()
+    if aggr._saver is not None: aggr._saver.join()   # checkpoint écrit en arrière-plan
+
+
+def _state(aggr):
+    return (dict(aggr.volume_by_price["NQ"]), dict(aggr.delta_session["NQ"]), aggr.last_tick["NQ"],
+            aggr.get_rolling_ticks("NQ", "time", 30), pytest.approx(aggr.get_vwap("NQ")))
+
+
+@pytest.fixture
+def persisted(tmp_path, monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(agg_mod.time, "time", clock)
+    monkeypatch.setattr(agg_mod, "_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(agg_mod.atexit, "register", lambda fn: None)
+    make = lambda: agg_mod.Aggregator(None, persist=True, autosave_secs=60, tick_size_map={"NQ": 0.25})
+    return clock, make, tmp_path
+
+
+def test_record_layout():
+    assert RECORD_BYTES == 17
+    assert JOURNAL_DTYPE.names == ("ts", "px", "size", "dir")
+
+
+def test_restart_replays_checkpoint_and_journal_tail(persisted):
+    clock, make, _ = persisted
+    aggr = make()
+    _feed(aggr, clock, 1000)   # 500 s : checkpoints intermédiaires en arrière-plan
+    aggr._dump_session()
+    _feed(aggr, clock, 10, seed=5)   # queue non couverte par le checkpoint
+    assert aggr._journal.counts()["NQ"] == 1010
+    assert agg_mod.read_checkpoint(aggr._checkpoint_path)["offsets"]["NQ"] == 1000
+    expected = _state(aggr)
+    aggr._journal.close()
+
+    restarted = make()
+    assert _state(restarted) == expected
+    assert restarted.snapshot("NQ").last_tick == expected[2]
+
+    # La reprise continue le même journal
+    _feed(restarted, clock, 10, seed=2)
+    assert restarted._journal.counts()["NQ"] == 1020
+
+
+def test_idle_symbol_is_not_replayed_twice_after_restarts(persisted):
+    clock, _, _ = persisted
+    make = lambda: agg_mod.Aggregator(None, persist=True, autosave_secs=60, tick_size_map={"NQ": 0.25, "ES": 0.25})
+    aggr = make()
+    for px in (5000.0, 5000.25): clock.t += 1; aggr._ingest("ES", px, 5.0, source="TBT")
+    _feed(aggr, clock, 20)
+    aggr._dump_session(); aggr._journal.close()
+    es = dict(aggr.volume_by_price["ES"]); vwap = pytest.approx(aggr.get_vwap("ES"))
+    assert sum(es.values()) == 10.0
+
+    for seed in (2, 3):   # ES ne reçoit plus rien : il doit garder son offset dans chaque checkpoint
+        restarted = make()
+        assert dict(restarted.volume_by_price["ES"]) == es and restarted.get_vwap("ES") == vwap
+        _feed(restarted, clock, 20, seed=seed)
+        restarted._dump_session(); restarted._journal.close()
+        assert agg_mod.read_checkpoint(restarted._checkpoint_path)["offsets"]["ES"] == 2
+    assert dict(make().volume_by_price["ES"]) == es
+
+
+def test_restart_maps_session_levels_in_place(persisted):
+    clock, make, tmp_path = persisted
+    aggr = make()
+    _feed(aggr, clock, 400)
+    aggr._dump_session()
+    expected = _state(aggr)
+    aggr._journal.close()
+
+    restarted = make()
+    vbp = restarted.volume_by_price["NQ"]
+    assert isinstance(vbp.arr, np.memmap) and isinstance(restarted.delta_session["NQ"].arr, np.memmap)
+    assert _state(restarted) == expected
+    # Les ajouts restent privés (copy-on-write) : le fichier de la génération n'est pas modifié
+    before = np.load(agg_mod.levels_path(str(tmp_path), restarted._SESSION, "NQ", "vbp", restarted._checkpoint_gen)).sum()
+    _feed(restarted, clock, 5, seed=3)
+    after = np.load(agg_mod.levels_path(str(tmp_path), restarted._SESSION, "NQ", "vbp", restarted._checkpoint_gen)).sum()
+    assert before == after and sum(restarted.volume_by_price["NQ"].values()) > before
+    restarted._dump_session()
+    assert len(list(tmp_path.glob("levels_*.npy"))) == 2   # une seule génération conservée (vbp + delta)
+
+
+def test_background_checkpoint_writes_captured_state(persisted):
+    clock, make, tmp_path = persisted
+    aggr = make()
+    _feed(aggr, clock, 200)
+    cap = aggr._capture_checkpoint()
+    captured = sum(aggr.volume_by_price["NQ"].values())
+    _feed(aggr, clock, 10, seed=4)                        # le moteur continue pendant l'écriture
+    aggr._write_checkpoint(cap)
+    saved = np.load(agg_mod.levels_path(str(tmp_path), aggr._SESSION, "NQ", "vbp", cap["gen"]))
+    assert saved.sum() == pytest.approx(captured) and captured < sum(aggr.volume_by_price["NQ"].values())
+    assert agg_mod.read_checkpoint(aggr._checkpoint_path)["offsets"]["NQ"] == 200
+
+    clock.t += 61; aggr.end_batch()                       # autosave dû : ne bloque pas le lot
+    aggr._saver.join()
+    st = aggr.get_save_stats()
+    assert st["gen"] == aggr._checkpoint_gen and st["last_bytes"] > 0 and st["last_ms"] > 0 and not st["pending"]
+
+
+def test_torn_trailing_record_is_truncated(persisted):
+    clock, make, tmp_path = persisted
+    aggr = make()
+    _feed(aggr, clock, 100)
+    aggr._journal.close()
+    path = aggr._journal.path("NQ")
+    with open(path, "ab") as f: f.write(b"\x01" * 9)                    # écriture interrompue
+    assert TickJournal(str(tmp_path), aggr._SESSION).recover("NQ") == 100
+    assert os.path.getsize(path) == 100 * RECORD_BYTES
+    with open(path, "ab") as f: f.write(bytes(3 * RECORD_BYTES))        # blocs remis à zéro par le FS
+    assert TickJournal(str(tmp_path), aggr._SESSION).recover("NQ") == 100
+
+    restarted = make()
+    assert sum(restarted.volume_by_price["NQ"].values()) == pytest.approx(sum(aggr.volume_by_price["NQ"].values()))
+
+
+def test_reset_session_truncates_journal(persisted):
+    clock, make, _ = persisted
+    aggr = make()
+    _feed(aggr, clock, 100)
+    aggr.reset_session("NQ")
+    assert os.path.getsize(aggr._journal.path("NQ")) == 0
+    aggr._journal.close()
+    restarted = make()
+    assert "NQ" not in restarted.last_tick and not restarted.volume_by_price.get("NQ")
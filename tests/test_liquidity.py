@@ -0,0 +1,43 @@
+import numpy as np
+
+import engine.aggregator as agg_mod
+from engine.depth_book import ASK, BID, INSERT
+from engine.liquidity import LiquidityHistory
+from ui.heatmap import heat_ppm
+
+
+def test_ring_is_bounded_and_realigns_on_read():
+    hist = LiquidityHistory(history_sec=10, resolution=0.25, half_span=5)
+    assert hist.grid.shape == (40, 11) and hist.grid.dtype == np.uint16
+    t = 1000.0
+    assert hist.sample(t, {100: 7}, {101: 3}, center=100)
+    assert not hist.sample(t + 0.1, {100: 9}, {}, center=100)      # sous la résolution
+    assert hist.sample(t + 0.25, {102: 70000}, {}, center=103)      # recentré ; taille saturée en uint16
+
+    m = hist.window(t, t + 0.4, 2, 99, 103)                         # lignes : ticks 103..99
+    assert m[:, 0].tolist() == [0, 0, 3, 7, 0]
+    assert m[:, 1].tolist() == [0, 65535, 0, 0, 0]
+
+    for i in range(200): hist.sample(t + 1 + i * 0.25, {100: i + 1}, {}, center=100)
+    assert hist.count == 40 and hist.nbytes == hist.grid.nbytes + hist.ts.nbytes + hist.center.nbytes
+    m = hist.window(t + 1, t + 51, 200, 100, 100)
+    assert m[0, -1] == 200 and m[0, 0] == 0                         # le début est sorti de l'anneau
+
+
+def test_aggregator_samples_books_at_publication(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(agg_mod.time, "time", lambda: clock[0])
+    aggr = agg_mod.Aggregator(None, tick_size_map={"NQ": 0.25})
+    aggr.on_depth("NQ", [(0, INSERT, BID, 19999.75, 10), (0, INSERT, ASK, 20000.0, 4)])
+    aggr.publish()
+    clock[0] += 1.0; aggr.publish(refresh_all=True)                   # sans tick : la ligne continue
+    assert aggr.liquidity_version("NQ") == 2
+    m = aggr.get_liquidity_window("NQ", 999.0, 1001.0, 4, 79999, 80000)
+    assert m[:, 1:].tolist() == [[4, 4, 4], [10, 10, 10]]
+
+
+def test_heat_image_is_scaled_ppm():
+    data = heat_ppm(np.array([[0, 5], [100, 0]], dtype=np.uint16), tick_px=3, slot_px=2)
+    header, pixels = data.split(b"\n", 1)
+    assert header == b"P6 4 6 255" and len(pixels) == 4 * 6 * 3
+    assert pixels[:3] == b"\xff\xff\xff"                             # niveau vide : fond blanc
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+pytest.importorskip("ib_insync")
+
+from ib_insync import BarData, Contract
+
+from engine import hist_scheduler
+from engine.bar_cache import bar_seconds, duration_seconds
+from engine.market_analyzer import TIMEFRAMES, MarketAnalyzer
+from engine.resample import resample_bars, session_buckets
+
+NY = ZoneInfo("America/New_York")
+
+
+def _m1(start, n):
+    out = []
+    for i in range(n):
+        d = start + timedelta(minutes=i)
+        if (d.astimezone(NY) if d.tzinfo else d).hour == 17: continue  # pause CME
+        k = int(d.timestamp() // 60); px = 100 + (k % 37) * 0.25  # prix fonction de la minute seule
+        out.append(BarData(date=d, open=px, high=px + 0.5, low=px - 0.5, close=px + 0.25, volume=1 + k % 5, average=px, barCount=2))
+    return out
+
+
+def test_buckets_follow_cme_session_open_across_dst():
+    # 14:30 NY (été, UTC-4) et 14:30 NY (hiver, UTC-5) : H4 démarrant à 14:00 NY, H1 à 14:00, M30 à 14:30
+    for d in (datetime(2026, 10, 14, 18, 30, tzinfo=timezone.utc), datetime(2026, 11, 11, 19, 30, tzinfo=timezone.utc)):
+        h4, h1, m30 = (session_buckets([d], s)[0].to_pydatetime().astimezone(NY) for s in (14400, 3600, 1800))
+        assert (h4.hour, h4.minute, h1.hour, m30.minute) == (14, 0, 14, 30)
+    # Après l'ouverture de 18:00 NY, la tranche H4 redémarre à 18:00 (pas 16:00 / 20:00)
+    d = datetime(2026, 10, 14, 19, 10)  # sans fuseau : heure de New York
+    assert session_buckets([d], 14400)[0].to_pydatetime() == datetime(2026, 10, 14, 18, 0)
+    assert session_buckets([datetime(2026, 10, 15, 1, 59)], 14400)[0].to_pydatetime() == datetime(2026, 10, 14, 22, 0)
+
+
+def test_resample_ohlcv_and_partial_first_bucket():
+    start = datetime(2026, 10, 14, 13, 57)  # heure NY sans fuseau : 3 M1 avant la tranche M5 de 14:00
+    bars = _m1(start, 23)
+    out = resample_bars(bars, 300)
+    assert [b.date for b in out] == [datetime(2026, 10, 14, 14, m) for m in (0, 5, 10, 15)]
+    chunk = bars[3:8]; b = out[0]
+    assert (b.open, b.high, b.low, b.close) == (chunk[0].open, max(x.high for x in chunk), min(x.low for x in chunk), chunk[-1].close)
+    assert b.volume == sum(x.volume for x in chunk) and b.barCount == 10
+    assert b.average == pytest.approx(sum(x.average * x.volume for x in chunk) / b.volume)
+    assert out[-1].date == datetime(2026, 10, 14, 14, 15) and out[-1].volume == sum(x.volume for x in bars[18:])  # tranche en cours
+
+    # La pause 17:00-18:00 sépare les sessions : pas de H4 à cheval
+    h4 = resample_bars(_m1(datetime(2026, 10, 14, 14, 0), 8 * 60), 14400)
+    assert [b.date for b in h4] == [datetime(2026, 10, 14, 14, 0), datetime(2026, 10, 14, 18, 0)]
+    assert h4[0].barCount == 2 * 180
+
+
+class _IB:
+    """Historique synthétique : M1 jusqu'à maintenant, unités supérieures ré-échantillonnées, D1 calendaire."""
+    def __init__(self):
+        self.requests = []
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime, durationStr, barSizeSetting, **kw):
+        self.requests.append((contract.symbol, durationStr, barSizeSetting))
+        now = datetime.fromtimestamp(time.time(), tz=timezone.utc).replace(second=0, microsecond=0)
+        if barSizeSetting == "1 day":
+            n = duration_seconds(durationStr) // 86400
+            return [BarData(date=(now - timedelta(days=i)).date(), open=1, high=2, low=0, close=1) for i in range(n, -1, -1)]
+        minutes = duration_seconds(durationStr) // 60
+        m1 = _m1(now - timedelta(minutes=minutes), minutes + 1)
+        return m1 if barSizeSetting == "1 min" else resample_bars(m1, bar_seconds(barSizeSetting))
+
+
+def test_radar_cycle_derives_intraday_timeframes_from_m1(tmp_path, monkeypatch):
+    monkeypatch.setattr(hist_scheduler, "HIST_PER_CONTRACT_SEC", 0.0)  # backfill sans attente de pacing
+    ib = _IB()
+    ibm = type("IBM", (), {"ib": ib, "is_connected": lambda self: True})()
+    an = MarketAnalyzer(ibm, {"NQ": 0.25}, data_dir=str(tmp_path))
+    contracts = {"NQ": Contract(symbol="NQ", secType="FUT", conId=1)}
+
+    asyncio.run(an._radar_cycle(contracts))
+    assert len(ib.requests) == len(TIMEFRAMES) + 1 # backfill de chaque unité + fenêtre de session
+    assert set(an.get_radar_snapshot("NQ")) >= set(TIMEFRAMES)
+
+    ib.requests.clear()
+    asyncio.run(an._radar_cycle(contracts))
+    assert [r[2] for r in ib.requests] == ["1 min"] and ib.requests[0][1].endswith(" S")
+
+    # La queue dérivée localement coïncide avec ce qu'IB aurait renvoyé
+    for tf in ("M5", "H1", "H4"):
+        duration, bar_size = TIMEFRAMES[tf]
+        local = an.bar_cache.peek(contracts["NQ"], duration, bar_size)[-3:]
+        remote = asyncio.run(ib.reqHistoricalDataAsync(contracts["NQ"], "", duration, bar_size))[-3:]
+        assert [(b.date, b.open, b.high, b.low, b.close, b.volume) for b in local] == \
+               [(b.date, b.open, b.high, b.low, b.close, b.volume) for b in remote]
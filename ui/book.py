@@ -4,6 +4,7 @@ from tkinter import ttk
 import time
 import math
 from ui.panels import UnifiedControlPanel
+from engine.aggregator import group_bucket
 import config
 
 # --- PALETTE ---
@@ -31,16 +32,66 @@ SL_BG_COLOR = "#ffcdd2"  # Couleur de fond pour le Ghost SL
 PALETTE_SUP = ["#e8f5e9", "#c8e6c9", "#a5d6a7", "#81c784", "#66bb6a", "#4caf50", "#43a047", "#388e3c", "#2e7d32", "#1b5e20"]
 PALETTE_RES = ["#ffebee", "#ffcdd2", "#ef9a9a", "#e57373", "#ef5350", "#f44336", "#e53935", "#d32f2f", "#c62828", "#b71c1c"]
 
-def _safe_snap(val, step):
-    if step <= 0: return val
-    try: return round(val / step) * step
-    except: return val
+LADDER_ROWS = 40
 
 def _safe_int(val):
     if val is None: return 0
     try: return int(float(val))
     except: return 0
 
+class _LadderRows:
+    """
+    Lignes du DOM allouées une seule fois par colonne.
+    À chaque frame on compare (valeurs, tags) cellule par cellule avec l'état
+    affiché et on ne pousse à Tk que les différences. Quand l'ancre se déplace
+    de k lignes, les k lignes sorties de l'écran sont déplacées à l'autre bout
+    (k appels `move`) au lieu de tout réécrire. Une frame inchangée = 0 appel Tk.
+    """
+
+    def __init__(self, trees, rows):
+        self.trees = trees; self.rows = rows
+        self.iids = {}; self.shown = {}
+        self.top = None; self.layout = None
+
+    def _allocate(self):
+        for k, t in self.trees.items():
+            old = t.get_children()
+            if old: t.delete(*old)
+            self.iids[k] = [t.insert("", "end", values=("",)) for _ in range(self.rows)]
+            self.shown[k] = [(("",), ())] * self.rows
+
+    def _shift(self, k):
+        """k > 0 : l'ancre monte (les lignes du bas passent en haut) ; k < 0 : l'inverse."""
+        for key, t in self.trees.items():
+            iids = self.iids[key]; shown = self.shown[key]
+            if k > 0:
+                for iid in reversed(iids[-k:]): t.move(iid, "", 0)
+            else:
+                for iid in iids[:-k]: t.move(iid, "", "end")
+            self.iids[key] = iids[-k:] + iids[:-k]; self.shown[key] = shown[-k:] + shown[:-k]
+
+    def render(self, top, layout, cells):
+        """
+        top : index de groupe de la première ligne ; layout : clé invalidant le
+        décalage (ex. facteur de groupement) ; cells : {colonne: [(values, tags)] * rows}.
+        Retourne True si les lignes ont été (ré)alignées sur un nouveau top.
+        """
+        if not self.iids: self._allocate()
+        moved = top != self.top or layout != self.layout
+        if moved and self.top is not None and layout == self.layout and abs(top - self.top) < self.rows:
+            self._shift(top - self.top)
+        self.top = top; self.layout = layout
+        for key, new in cells.items():
+            t = self.trees[key]; iids = self.iids[key]; shown = self.shown[key]
+            for r, cell in enumerate(new):
+                if shown[r] != cell:
+                    t.item(iids[r], values=cell[0], tags=cell[1]); shown[r] = cell
+        return moved
+
+    def center_item(self):
+        return self.iids["px"][self.rows // 2]
+
+
 class MultiHorizonWidget(ttk.Frame):
     def __init__(self, parent, controller, symbol):
         super().__init__(parent)
@@ -71,8 +122,26 @@ class MultiHorizonWidget(ttk.Frame):
         
         self.trees = {} 
         self.tree_list = []
+        self._info_text = None
+        self._need_see = True
+        self._drawn_sig = None; self._drawn_at = 0.0
         
         self._setup_ui()
+        self._rows = _LadderRows(self.trees, LADDER_ROWS)
+        self._bind_options()
+
+    def _bind_options(self):
+        """Miroirs Python des options UI, tenus à jour par trace (lus à chaque frame sans appel Tcl)."""
+        self._opts = {}
+        def sync(*_):
+            self._opts["struct"] = bool(self.show_struct.get())
+            self._opts["vol"] = bool(self.show_vol.get())
+            try: self._opts["grp"] = int(self.panel.group_var.get()) if hasattr(self.panel, 'group_var') else 1
+            except (ValueError, tk.TclError): self._opts["grp"] = 1
+            self._drawn_sig = None # option modifiée : prochain refresh forcé
+        sync()
+        for var in (self.show_struct, self.show_vol, getattr(self.panel, 'group_var', None)):
+            if var is not None: var.trace_add("write", sync)
 
     def _configure_styles(self):
         self.style.configure("Book.Treeview", 
@@ -202,7 +271,7 @@ class MultiHorizonWidget(ttk.Frame):
         self.lbl_price_header.config(fg=col)
         self.update_data()
     def _center_view(self, event=None):
-        self._last_user_scroll = 0; self._anchor_price = None; self.update_data()
+        self._last_user_scroll = 0; self._anchor_price = None; self._need_see = True; self.update_data()
         
     def _on_dom_click(self, event, action):
         self._last_user_scroll = time.time() 
@@ -235,149 +304,142 @@ class MultiHorizonWidget(ttk.Frame):
         menu.add_command(label="Move TP Here", command=lambda: self.controller.modify_order_price(self.sym, "TP", clicked_price), foreground="blue")
         menu.tk_popup(event.x_root, event.y_root)
 
-    def _group_data(self, vbp, delta_map, factor):
-        if factor <= 1: return vbp, delta_map
-        g_vol, g_delta = {}, {}
-        block = self.tick_size * factor
-        for p, vol in vbp.items():
-            p_grp = _safe_snap(p, block)
-            g_vol[p_grp] = g_vol.get(p_grp, 0) + vol
-            g_delta[p_grp] = g_delta.get(p_grp, 0) + delta_map.get(p, 0)
-        return g_vol, g_delta
+    def _price_bucket(self, price, grp):
+        return group_bucket(int(round(price / self.tick_size)), grp)
+
+    def refresh(self):
+        """Appelé par la boucle GUI : ne redessine que si le symbole a changé (ou après GUI_REFRESH_MAX_AGE_SEC)."""
+        snap = self.aggr.snapshot(self.sym)
+        sig = (snap.version if snap else None, self.controller.state_version(self.sym))
+        now = time.time()
+        if sig == self._drawn_sig and now - self._drawn_at < config.GUI_REFRESH_MAX_AGE_SEC: return False
+        self._drawn_sig = sig; self._drawn_at = now
+        self.update_data()
+        return True
 
     def update_data(self):
         try:
-            last_px = self.aggr.get_last_price(self.sym)
-            if not last_px: return
+            # Lecture exclusive de l'instantané publié par le moteur (jamais des structures vivantes)
+            snap = self.aggr.snapshot(self.sym)
+            if snap is None or snap.last_tick is None: return
+            last_tick = snap.last_tick; last_px = snap.last_price
             
-            grp = int(self.panel.group_var.get()) if hasattr(self.panel, 'group_var') else 1
+            # Toutes les clés (volumes, DOM, lignes) sont des index de groupe entiers :
+            # le prix flottant n'apparaît qu'au moment d'écrire le texte.
+            # Les options UI sont lues dans leurs miroirs Python (aucun appel Tcl).
+            grp = max(1, self._opts["grp"])
             eff_tick = self.tick_size * grp
-            last_px_snap = _safe_snap(last_px, eff_tick)
+            last_b = group_bucket(last_tick, grp)
             
-            spd = self.controller.get_market_speed(self.sym)
+            spd = snap.speed
             icon = "●" if self.is_active else "○"
-            self.lbl_info.config(text=f"{icon} {self.sym} | {last_px:.2f} | {_safe_int(spd)}/m")
+            info = f"{icon} {self.sym} | {last_px:.2f} | {_safe_int(spd)}/m"
+            if info != self._info_text:
+                self.lbl_info.config(text=info); self._info_text = info
 
+            # Ancre conservée en index de tick (indépendante du groupement)
             if self._anchor_price is None or (time.time() - self._last_user_scroll > self._scroll_timeout):
-                 if self._anchor_price:
-                     dist = abs(last_px_snap - self._anchor_price) / eff_tick
-                     if dist > 15: self._anchor_price = last_px_snap
-                 else: self._anchor_price = last_px_snap
+                 if self._anchor_price is not None:
+                     dist = abs(last_tick - self._anchor_price) / grp
+                     if dist > 15: self._anchor_price = last_tick
+                 else: self._anchor_price = last_tick
 
             # --- RECUPERATION DES NIVEAUX COCHÉS PAR L'UTILISATEUR ---
             # C'est la seule source de vérité pour l'affichage des niveaux custom
             # Cela remplace toute la logique "intelligente" précédente
             user_levels = []
-            if self.show_struct.get():
+            if self._opts["struct"]:
                 user_levels = self.controller.get_dom_levels(self.sym)
             
-            # On les indexe par prix pour un accès rapide
+            # On les indexe par groupe pour un accès rapide
             levels_map = {} 
             for lvl in user_levels:
-                # On snap le niveau sur la grille actuelle
-                p_snap = _safe_snap(lvl['price'], eff_tick)
-                levels_map[p_snap] = lvl # {type: 'sup', label: '...'}
-
-            # --- DATA VOL & DOM ---
-            vol_data = {"s": {}, "m": {}, "l": {}}
-            delta_data = {}
-            max_vol = 1
-            if self.show_vol.get():
-                try:
-                    r_s, d_s = self.aggr.get_rolling_data(self.sym, "Time", 5)
-                    r_m, _   = self.aggr.get_rolling_data(self.sym, "Time", 30)
-                    r_l, _   = self.aggr.get_rolling_data(self.sym, "Vol", 10000)
-                    g_s, gd_s = self._group_data(r_s, d_s, grp)
-                    g_m, _    = self._group_data(r_m, {}, grp)
-                    g_l, _    = self._group_data(r_l, {}, grp)
-                    vol_data = {"s": g_s, "m": g_m, "l": g_l}
-                    delta_data = gd_s
-                    all_vals = list(g_s.values()) + list(g_m.values()) + list(g_l.values())
-                    if all_vals: max_vol = max(all_vals)
-                except: pass
-
-            dom = self.aggr.dom.get(self.sym, {})
-            bids = dom.get('bids', {}); asks = dom.get('asks', {})
+                levels_map[self._price_bucket(lvl['price'], grp)] = lvl # {type: 'sup', label: '...'}
+
+            # --- DATA VOL & DOM (pré-groupés par le moteur, en cache jusqu'au prochain tick) ---
+            ladder = self.aggr.get_ladder(self.sym, grp, with_volume=self._opts["vol"], snap=snap)
+            vol_data = ladder.vol; delta_data = ladder.delta; max_vol = ladder.max_vol
+            bids = ladder.bids; asks = ladder.asks
             
-            # --- RENDU ---
-            rows = 40
-            center_step = round(self._anchor_price / eff_tick)
-            for t in self.tree_list: t.delete(*t.get_children())
+            # --- RENDU (diff cellule par cellule, voir _LadderRows) ---
+            rows = LADDER_ROWS
+            center_b = group_bucket(self._anchor_price, grp)
             
-            markers = self.controller.get_trading_markers(self.sym)
+            markers = {self._price_bucket(mp, grp): m for mp, m in self.controller.get_trading_markers(self.sym).items()}
+            self.current_display_prices = []
+            cells = {k: [] for k in self.trees}
             
             for i in range(rows // 2, -rows // 2, -1):
-                p = _safe_snap((center_step + i) * eff_tick, eff_tick)
+                b = center_b + i
+                p = b * eff_tick
+                self.current_display_prices.append(p)
                 
                 # 1. CTX (Vide ou Icône)
-                self.trees["ctx"].insert("", "end", values=("",))
+                cells["ctx"].append((("",), ()))
 
                 # 2. PRICE
                 p_str = f"{p:.2f}"
                 p_tags = []
-                if abs(p - last_px_snap) < (eff_tick/10): p_tags.append("current")
+                if b == last_b: p_tags.append("current")
                 
                 # Trading Markers
-                if p in markers: p_tags.append(markers[p]) 
+                if b in markers: p_tags.append(markers[b]) 
                 
                 # Highlight si niveau sélectionné (Background)
-                if p in levels_map:
-                    lvl_info = levels_map[p]
+                if b in levels_map:
+                    lvl_info = levels_map[b]
                     if lvl_info['type'] == 'sup': p_tags.append("lvl_sup_px")
                     else: p_tags.append("lvl_res_px")
 
-                self.trees["px"].insert("", "end", values=(p_str,), tags=tuple(p_tags))
+                cells["px"].append(((p_str,), tuple(p_tags)))
 
                 # 3. VOLUMES
                 for k in ["s", "m", "l"]:
-                    v = vol_data[k].get(p, 0)
+                    v = vol_data[k].get(b, 0)
                     v_str = _safe_int(v) if v > 0 else ""
-                    tags = []
+                    tags = ()
                     if v > 0:
                         intensity = min(9, int((v / max_vol) * 9))
-                        tags.append(f"vol_{intensity}")
-                    self.trees[k].insert("", "end", values=(v_str,), tags=tuple(tags))
+                        tags = (f"vol_{intensity}",)
+                    cells[k].append(((v_str,), tags))
 
                 # 4. DOM (Bid/Ask)
-                b_sz = 0; a_sz = 0
-                if grp == 1: b_sz = bids.get(p, 0); a_sz = asks.get(p, 0)
-                else: 
-                    for bp, bz in bids.items(): 
-                        if abs(bp - p) < (eff_tick/2): b_sz += bz
-                    for ap, az in asks.items(): 
-                        if abs(ap - p) < (eff_tick/2): a_sz += az
+                b_sz = bids.get(b, 0); a_sz = asks.get(b, 0)
                 
                 # Absorption / Dom logic
                 b_tag = "dom_bid"; a_tag = "dom_ask"
-                d_val = delta_data.get(p, 0)
-                if vol_data["s"].get(p,0) > (max_vol*0.3):
-                    if d_val < 0 and abs(d_val) > (vol_data["s"].get(p,0)*0.6): b_tag = "absorb_bid"
-                    if d_val > 0 and abs(d_val) > (vol_data["s"].get(p,0)*0.6): a_tag = "absorb_ask"
+                d_val = delta_data.get(b, 0)
+                if vol_data["s"].get(b,0) > (max_vol*0.3):
+                    if d_val < 0 and abs(d_val) > (vol_data["s"].get(b,0)*0.6): b_tag = "absorb_bid"
+                    if d_val > 0 and abs(d_val) > (vol_data["s"].get(b,0)*0.6): a_tag = "absorb_ask"
 
-                self.trees["bid"].insert("", "end", values=(_safe_int(b_sz) if b_sz else "",), tags=(b_tag,))
-                self.trees["ask"].insert("", "end", values=(_safe_int(a_sz) if a_sz else "",), tags=(a_tag,))
+                cells["bid"].append(((_safe_int(b_sz) if b_sz else "",), (b_tag,)))
+                cells["ask"].append(((_safe_int(a_sz) if a_sz else "",), (a_tag,)))
 
                 # 5. DELTA / LEVELS
                 # C'est ici qu'on affiche les labels des niveaux choisis
                 d_str = ""
-                d_tags = []
+                d_tags = ()
                 
-                if p in levels_map:
-                    lvl_info = levels_map[p]
+                if b in levels_map:
+                    lvl_info = levels_map[b]
                     d_str = lvl_info['label'] # Affiche le nom (ex: "M5 Sweep")
-                    if lvl_info['type'] == 'sup': d_tags.append("lvl_sup")
-                    else: d_tags.append("lvl_res")
+                    d_tags = ("lvl_sup",) if lvl_info['type'] == 'sup' else ("lvl_res",)
                 else:
                     # Affichage Delta normal si pas de niveau
                     if d_val != 0: 
                         d_str = f"{_safe_int(d_val)}"
-                        d_tags.append("delta_pos" if d_val > 0 else "delta_neg")
+                        d_tags = ("delta_pos" if d_val > 0 else "delta_neg",)
 
-                self.trees["delta"].insert("", "end", values=(d_str,), tags=tuple(d_tags))
+                cells["delta"].append(((d_str,), d_tags))
 
-            if self._last_user_scroll > 0 and (time.time() - self._last_user_scroll < self._scroll_timeout): pass
-            else:
-                 mid_item = self.trees["px"].get_children()[rows//2]
+            moved = self._rows.render(center_b + rows // 2, grp, cells)
+
+            # Recentrage seulement quand les lignes ont bougé (et pas pendant un scroll manuel)
+            if self._last_user_scroll > 0 and (time.time() - self._last_user_scroll < self._scroll_timeout): self._need_see = True
+            elif moved or self._need_see:
+                 mid_item = self._rows.center_item()
                  for t in self.tree_list: t.see(mid_item)
+                 self._need_see = False
 
-        except Exception as e: pass
\ No newline at end of file
+        except Exception as e: pass
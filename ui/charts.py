@@ -1,6 +1,9 @@
 # ui/charts.py
+import time
 import tkinter as tk
 from tkinter import ttk
+import config
+from ui.heatmap import LiquidityHeatmap
 
 # --- PALETTE GRAPHIQUE ---
 COLOR_UP    = "#2e7d32"     # Vert (Bougie Haussière)
@@ -35,6 +38,9 @@ class MiniChartWidget(tk.Frame):
         
         # Ajout des TFs en secondes pour le trigger
         self.mode_var = tk.StringVar(value="5m")
+        self.heat_var = tk.BooleanVar(value=False)
+        self._drawn_sig = None; self._drawn_at = 0.0
+        self._layout = None; self._scale = None; self._live = None # items persistants (voir update_chart)
         self._setup_ui()
 
     def _setup_ui(self):
@@ -52,16 +58,42 @@ class MiniChartWidget(tk.Frame):
         cb.pack(side="right", padx=5)
         cb.bind("<<ComboboxSelected>>", lambda e: self.update_chart())
 
+        # Heatmap de liquidité L2 (à droite du graphique)
+        tk.Checkbutton(f_tool, text="L2", variable=self.heat_var, command=self._toggle_heatmap,
+                       bg=COLOR_BG, fg=COLOR_TXT, font=("Segoe UI", 8), bd=0, highlightthickness=0).pack(side="right")
+
         # Canvas
         self.canvas = tk.Canvas(self, bg=COLOR_BG, highlightthickness=0)
         self.canvas.pack(fill="both", expand=True)
         
         self.canvas.bind("<Double-1>", self._on_double_click)
+        self.canvas.bind("<Configure>", lambda e: setattr(self, "_drawn_sig", None))
+        self.heatmap = LiquidityHeatmap(self, self.controller, self.sym)
+
+    def _toggle_heatmap(self):
+        if self.heat_var.get(): self.heatmap.pack(side="right", fill="y", before=self.canvas)
+        else: self.heatmap.pack_forget()
 
     def _on_double_click(self, event):
         pass 
 
+    def refresh(self):
+        """Redessine seulement si ticks, radar ou TF ont changé (ou après GUI_REFRESH_MAX_AGE_SEC)."""
+        snap = self.aggr.snapshot(self.sym)
+        sig = (snap.version if snap else None, self.controller.analyzer.version(self.sym), self.mode_var.get())
+        now = time.time()
+        heat = self.heatmap.refresh() if self.heat_var.get() else False
+        if sig == self._drawn_sig and now - self._drawn_at < config.GUI_REFRESH_MAX_AGE_SEC: return heat
+        self._drawn_sig = sig; self._drawn_at = now
+        self.update_chart()
+        return True
+
     def update_chart(self):
+        """
+        Items Canvas persistants : la bougie en formation et l'étiquette de prix sont
+        déplacées à chaque frame ; le reste (fond, niveaux, bougies fermées) n'est
+        recréé que si l'échelle, la liste de bougies, le radar ou la taille changent.
+        """
         # 1. PARAMÈTRES (Mapping TF -> Secondes)
         tf_str = self.mode_var.get()
         
@@ -81,29 +113,43 @@ class MiniChartWidget(tk.Frame):
         elif seconds >= 300: radar_key = "M15" # >= 5m
 
         # 2. RÉCUPÉRATION DONNÉES
-        # CORRECTION MAJEURE: On passe 'seconds' comme résolution, pas comme durée totale.
-        # L'aggrégateur renvoie par défaut les 100 dernières bougies de cette résolution.
-        candles = self.aggr.get_candles_data(self.sym, "time", seconds)
+        # 'seconds' est la résolution, pas la durée totale : l'instantané publié par le
+        # moteur contient les 100 dernières bougies de chaque résolution du sélecteur.
+        snap = self.aggr.snapshot(self.sym)
+        candles = list(snap.candles.get(("time", seconds), ())) if snap else []
         radar = self.controller.analyzer.get_radar_snapshot(self.sym)
 
-        self.canvas.delete("all")
         w = self.canvas.winfo_width()
         h = self.canvas.winfo_height()
 
         if not candles: 
-            self.canvas.create_text(w/2, h/2, text="Waiting for ticks...", fill=COLOR_MUTED, font=("Segoe UI", 10))
+            if self._layout != "empty":
+                self.canvas.delete("all"); self._live = None; self._scale = None; self._layout = "empty"
+                self.canvas.create_text(w/2, h/2, text="Waiting for ticks...", fill=COLOR_MUTED, font=("Segoe UI", 10))
             return
 
-        # 3. CALCULS ÉCHELLE (Y) - BASÉ UNIQUEMENT SUR LES BOUGIES
-        prices = [c["high"] for c in candles] + [c["low"] for c in candles]
-        
-        max_p = max(prices)
-        min_p = min(prices)
-        rng = max_p - min_p
+        # 3. ÉCHELLE (Y) - BASÉE UNIQUEMENT SUR LES BOUGIES, conservée tant qu'elles y tiennent
+        min_p, max_p = self._fit_scale(candles)
+        fvgs = tuple((f['top'], f['bot'], f['type']) for f in radar.get(radar_key, {}).get("fvgs", [])) if radar else ()
+        session_lvls = radar.get("SESSION", {}) if radar else {}
+        layout = (w, h, seconds, min_p, max_p, len(candles), candles[0]["ts"], radar_key, fvgs, tuple(session_lvls.items()))
+        if layout != self._layout:
+            self._relayout(candles[:-1], len(candles), w, h, min_p, max_p, radar_key, fvgs, session_lvls)
+            self._layout = layout
+        self._draw_live(candles[-1])
+
+    def _fit_scale(self, candles):
+        """(min, max) affichés : marge de 10 %, recalculés si une bougie sort ou si l'échelle devient trop lâche."""
+        hi = max(c["high"] for c in candles); lo = min(c["low"] for c in candles)
+        cur = self._scale
+        if cur and cur[0] <= lo and hi <= cur[1] and (hi - lo) >= 0.6 * (cur[1] - cur[0]) / 1.2: return cur
+        rng = hi - lo
         if rng == 0: rng = 1
-        
-        max_p += rng * 0.1
-        min_p -= rng * 0.1
+        self._scale = (lo - rng * 0.1, hi + rng * 0.1)
+        return self._scale
+
+    def _relayout(self, closed, n_candles, w, h, min_p, max_p, radar_key, fvgs, session_lvls):
+        self.canvas.delete("all")
         rng = max_p - min_p
 
         pad_top = 20
@@ -116,23 +162,18 @@ class MiniChartWidget(tk.Frame):
         # 4. DESSIN : ARRIÈRE-PLAN (FVG & Niveaux)
         
         # A. FVG 
-        if radar:
-            fvgs = radar.get(radar_key, {}).get("fvgs", [])
-            for fvg in fvgs:
-                top, bot = fvg['top'], fvg['bot']
-                
-                y1 = to_y(top)
-                y2 = to_y(bot)
-                
-                col = COLOR_FVG_BULL if fvg['type'] == "BULL" else COLOR_FVG_BEAR
-                # Stipple retiré pour couleur plus franche, ou gardé léger
-                self.canvas.create_rectangle(0, y1, w, y2, fill=col, outline="", stipple="gray50")
-                
-                if 0 < y1 < h or 0 < y2 < h:
-                    self.canvas.create_text(5, y1, text=f"FVG {radar_key}", anchor="nw", fill=col, font=("Segoe UI", 6, "bold"))
+        for top, bot, kind in fvgs:
+            y1 = to_y(top)
+            y2 = to_y(bot)
+            
+            col = COLOR_FVG_BULL if kind == "BULL" else COLOR_FVG_BEAR
+            # Stipple retiré pour couleur plus franche, ou gardé léger
+            self.canvas.create_rectangle(0, y1, w, y2, fill=col, outline="", stipple="gray50")
+            
+            if 0 < y1 < h or 0 < y2 < h:
+                self.canvas.create_text(5, y1, text=f"FVG {radar_key}", anchor="nw", fill=col, font=("Segoe UI", 6, "bold"))
 
         # B. NIVEAUX SESSION
-        session_lvls = radar.get("SESSION", {}) if radar else {}
         for k, v in session_lvls.items():
             if k == "Gap": continue
             if v and isinstance(v, (int, float)):
@@ -160,8 +201,7 @@ class MiniChartWidget(tk.Frame):
                  self.canvas.create_line(0, y_pc, w, y_pc, fill=COLOR_GAP, dash=(1, 2))
                  self.canvas.create_text(10, y_pc+2, text=f"GAP {gap:+.2f}", anchor="nw", fill=COLOR_GAP, font=("Segoe UI", 7))
 
-        # 5. DESSIN : BOUGIES (Avant-Plan)
-        n_candles = len(candles)
+        # 5. DESSIN : BOUGIES FERMÉES (Avant-Plan)
         area_w = w - pad_right
         candle_w = area_w / max(n_candles, 10)
         candle_w = min(candle_w, 20) 
@@ -170,33 +210,59 @@ class MiniChartWidget(tk.Frame):
         self.canvas.create_line(0, to_y(max_p), w, to_y(max_p), fill=COLOR_GRID)
         self.canvas.create_line(0, to_y(min_p), w, to_y(min_p), fill=COLOR_GRID)
 
-        for i, c in enumerate(candles):
+        rect_w = max(1, candle_w - 2)
+        for i, c in enumerate(closed):
             cx = start_x + i * candle_w + (candle_w / 2)
-            
-            yh = to_y(c["high"])
-            yl = to_y(c["low"])
-            yo = to_y(c["open"])
-            yc = to_y(c["close"])
-            
-            col = COLOR_UP if c["close"] >= c["open"] else COLOR_DOWN
-            
-            self.canvas.create_line(cx, yh, cx, yl, fill=COLOR_WICK)
-            
-            rect_w = max(1, candle_w - 2)
-            x1 = cx - rect_w/2
-            x2 = cx + rect_w/2
-            
-            if abs(yo - yc) < 1: 
-                self.canvas.create_line(x1, yo, x2, yo, fill=col)
-            else:
-                self.canvas.create_rectangle(x1, yo, x2, yc, fill=col, outline=col)
-
-        # 6. PRIX ACTUEL
-        last_px = candles[-1]["close"]
-        y_last = to_y(last_px)
+            self._draw_candle(c, cx, rect_w, to_y)
+
+        # 6. ITEMS VIVANTS : bougie en formation + prix actuel (déplacés à chaque frame)
+        cx = start_x + (n_candles - 1) * candle_w + (candle_w / 2)
+        self._live = {
+            "to_y": to_y, "cx": cx, "rect_w": rect_w, "w": w, "pad_right": pad_right, "drawn": None,
+            "wick": self.canvas.create_line(cx, 0, cx, 0, fill=COLOR_WICK),
+            "body": self.canvas.create_rectangle(0, 0, 0, 0, fill=COLOR_UP, outline=COLOR_UP),
+            "line": self.canvas.create_line(0, 0, w, 0, fill=COLOR_MUTED, dash=(1, 3)),
+            "tag": self.canvas.create_rectangle(w-pad_right, 0, w, 0, fill=COLOR_UP, outline=""),
+            "txt": self.canvas.create_text(w-25, 0, text="", fill="white", font=("Segoe UI", 8, "bold")),
+        }
+
+    def _draw_candle(self, c, cx, rect_w, to_y):
+        yh = to_y(c["high"])
+        yl = to_y(c["low"])
+        yo = to_y(c["open"])
+        yc = to_y(c["close"])
+        
+        col = COLOR_UP if c["close"] >= c["open"] else COLOR_DOWN
+        
+        self.canvas.create_line(cx, yh, cx, yl, fill=COLOR_WICK)
         
-        self.canvas.create_line(0, y_last, w, y_last, fill=COLOR_MUTED, dash=(1, 3))
+        x1 = cx - rect_w/2
+        x2 = cx + rect_w/2
         
-        tag_bg = COLOR_UP if candles[-1]["close"] >= candles[-1]["open"] else COLOR_DOWN
-        self.canvas.create_rectangle(w-pad_right, y_last-9, w, y_last+9, fill=tag_bg, outline="")
-        self.canvas.create_text(w-25, y_last, text=f"{last_px:.2f}", fill="white", font=("Segoe UI", 8, "bold"))
\ No newline at end of file
+        if abs(yo - yc) < 1: 
+            self.canvas.create_line(x1, yo, x2, yo, fill=col)
+        else:
+            self.canvas.create_rectangle(x1, yo, x2, yc, fill=col, outline=col)
+
+    def _draw_live(self, c):
+        """Bougie en formation et étiquette de prix : coords / couleur des items existants, si elles ont changé."""
+        lv = self._live
+        ohlc = (c["open"], c["high"], c["low"], c["close"])
+        if ohlc == lv["drawn"]: return
+        to_y = lv["to_y"]; cx = lv["cx"]; half = lv["rect_w"] / 2; w = lv["w"]; pad_right = lv["pad_right"]
+        yo, yh, yl, yc = (to_y(p) for p in ohlc)
+        col = COLOR_UP if c["close"] >= c["open"] else COLOR_DOWN
+        recolor = lv["drawn"] is None or (lv["drawn"][3] >= lv["drawn"][0]) != (c["close"] >= c["open"])
+        y_last = yc
+
+        self.canvas.coords(lv["wick"], cx, yh, cx, yl)
+        if abs(yo - yc) < 1: yc = yo + 1 # corps plat : rectangle d'un pixel
+        self.canvas.coords(lv["body"], cx - half, yo, cx + half, yc)
+        self.canvas.coords(lv["line"], 0, y_last, w, y_last)
+        self.canvas.coords(lv["tag"], w-pad_right, y_last-9, w, y_last+9)
+        self.canvas.coords(lv["txt"], w-25, y_last)
+        self.canvas.itemconfigure(lv["txt"], text=f"{c['close']:.2f}")
+        if recolor:
+            self.canvas.itemconfigure(lv["body"], fill=col, outline=col)
+            self.canvas.itemconfigure(lv["tag"], fill=col)
+        lv["drawn"] = ohlc
@@ -28,7 +28,7 @@ class WallView(tk.Frame):
             self.widgets.append(wid_R)
 
     def refresh(self):
-        for w in self.widgets: w.update_data()
+        return any([w.refresh() for w in self.widgets])
 
 class ChartsWindow(tk.Toplevel):
     def __init__(self, controller):
@@ -71,7 +71,7 @@ class ChartsWindow(tk.Toplevel):
             self.maximized_chart = chart_widget
 
     def refresh(self):
-        for c in self.charts: c.update_chart()
+        return any([c.refresh() for c in self.charts])
 
 
 class RefreshGuard:
@@ -106,7 +106,7 @@ class FocusView(tk.Frame):
         self.wid.grid(row=0, column=0, sticky="nsew", padx=2, pady=2)
 
     def refresh(self):
-        self.wid.update_data()
+        return self.wid.refresh()
 
 class ModernDashboard(ttk.Notebook):
     def __init__(self, parent, controller):
@@ -116,6 +116,7 @@ class ModernDashboard(ttk.Notebook):
         self.refresh_guard = RefreshGuard()
         self.logger = logging.getLogger(__name__)
         self._exec_tab_base = " 🚀 EXÉCUTION "
+        self._exec_tab_shown = None
 
         # --- 1. NOUVEAU COCKPIT (PAR DÉFAUT) ---
         self.tab_exec = ExecutionView(self, controller)
@@ -161,34 +162,42 @@ class ModernDashboard(ttk.Notebook):
                 logger.exception("Echec du rafraîchissement du widget %s", widget_name)
             return False
 
-    def _update_exec_tab_status(self):
-        self.tab(self.tab_exec, text=f"{self._exec_tab_base}{self.refresh_guard.status_suffix}")
+    def _update_exec_tab_status(self, state):
+        # Appels Tk seulement si l'état ou le suffixe de l'onglet change
+        tab = (state, f"{self._exec_tab_base}{self.refresh_guard.status_suffix}")
+        if tab != self._exec_tab_shown:
+            self.tab(self.tab_exec, state=tab[0], text=tab[1])
+            self._exec_tab_shown = tab
 
     def refresh(self):
+        """
+        Rafraîchit les onglets ; chaque widget ne se redessine que si ses données
+        ont changé. Retourne True si au moins un widget a été redessiné.
+        """
         # Refresh priority (Onglet actif seulement serait une optimisation,
         # mais on refresh tout pour garantir la fluidité des données en arrière-plan)
+        changed = []
 
         # On refresh d'abord l'onglet Exécution s'il est visible (ou tout le temps pour les alertes)
         is_exec_ok = self._safe_refresh(
             "ExecutionView",
-            self.tab_exec.refresh,
+            lambda: changed.append(self.tab_exec.refresh()),
             self.logger,
             log_exception=False,
         )
 
         if is_exec_ok:
-            self.tab(self.tab_exec, state="normal")
             self.refresh_guard.record_success()
         else:
-            self.tab(self.tab_exec, state="disabled")
             self.refresh_guard.record_failure("ExecutionView")
 
-        self._update_exec_tab_status()
+        self._update_exec_tab_status("normal" if is_exec_ok else "disabled")
 
-        self._safe_refresh("WallView", self.tab_wall.refresh, self.logger)
-        self._safe_refresh("FocusView-NQ", self.tab_nq.refresh, self.logger)
-        self._safe_refresh("FocusView-ES", self.tab_es.refresh, self.logger)
+        self._safe_refresh("WallView", lambda: changed.append(self.tab_wall.refresh()), self.logger)
+        self._safe_refresh("FocusView-NQ", lambda: changed.append(self.tab_nq.refresh()), self.logger)
+        self._safe_refresh("FocusView-ES", lambda: changed.append(self.tab_es.refresh()), self.logger)
         # Le Labo a son propre auto-refresh interne, pas besoin de l'appeler ici
 
         if self.charts_window and tk.Toplevel.winfo_exists(self.charts_window):
-            self._safe_refresh("ChartsWindow", self.charts_window.refresh, self.logger)
+            self._safe_refresh("ChartsWindow", lambda: changed.append(self.charts_window.refresh()), self.logger)
+        return any(changed)
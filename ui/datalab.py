@@ -151,7 +151,8 @@ class DataLabView(tk.Frame):
         
         if source == "Aggr":
             if key == "VWAP":
-                v = aggregator.get_rolling_vwap(sym, 60)
+                snap = aggregator.snapshot(sym)
+                v = snap.vwap_60 if snap else None
                 if v: val_str = f"{v:.2f}"; raw_val = v
         
         elif source == "Sess":
@@ -184,8 +184,9 @@ class ContextPanel(tk.Frame):
 
     def _update_content(self):
         radar = self.controller.analyzer.get_radar_snapshot(self.sym)
-        last_px = self.controller.aggregator.get_last_price(self.sym)
-        vwap = self.controller.aggregator.get_rolling_vwap(self.sym, 60)
+        snap = self.controller.aggregator.snapshot(self.sym)
+        last_px = snap.last_price if snap else None
+        vwap = snap.vwap_60 if snap else None
         
         if not radar or not last_px: return
 
@@ -431,6 +432,9 @@ class ExecutionView(tk.Frame):
         self.chart_bot.mode_var.set("5m"); self.chart_bot.update_chart()
 
     def refresh(self):
-        if self.doom_widget: self.doom_widget.update_data()
-        if self.chart_top: self.chart_top.update_chart()
-        if self.chart_bot: self.chart_bot.update_chart()
\ No newline at end of file
+        """Retourne True si au moins un widget a été redessiné."""
+        changed = False
+        if self.doom_widget: changed |= self.doom_widget.refresh()
+        if self.chart_top: changed |= self.chart_top.refresh()
+        if self.chart_bot: changed |= self.chart_bot.refresh()
+        return changed
\ No newline at end of file
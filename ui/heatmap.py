@@ -0,0 +1,80 @@
+# ui/heatmap.py
+import time
+import tkinter as tk
+
+import numpy as np
+
+import config
+
+COLOR_BG = "#ffffff"
+COLOR_LAST = "#546e7a"  # ligne du dernier prix
+
+# Géométrie : pixels par tick (vertical) et par tranche de temps (horizontal)
+HEAT_TICK_PX = 3
+HEAT_SLOT_PX = 2
+HEAT_VIEW_SEC = 300  # durée affichée (s)
+
+
+def _palette():
+    """LUT 256 couleurs : fond blanc -> jaune -> orange -> rouge -> violet foncé."""
+    stops = np.array([(255, 255, 255), (255, 241, 118), (255, 167, 38), (229, 57, 53), (74, 20, 140)], dtype=np.float64)
+    x = np.linspace(0, len(stops) - 1, 256); i = np.minimum(x.astype(int), len(stops) - 2); f = (x - i)[:, None]
+    return (stops[i] * (1 - f) + stops[i + 1] * f).astype(np.uint8)
+
+_LUT = _palette()
+
+
+def heat_ppm(grid, tick_px=HEAT_TICK_PX, slot_px=HEAT_SLOT_PX):
+    """Matrice de tailles -> image PPM (P6) déjà à l'échelle : échelle log, normalisée sur le max visible."""
+    v = np.log1p(grid.astype(np.float32)); vmax = float(v.max()) or 1.0
+    rgb = _LUT[(v * (255.0 / vmax)).astype(np.uint8)]
+    rgb = np.repeat(np.repeat(rgb, tick_px, axis=0), slot_px, axis=1)
+    h, w = rgb.shape[:2]
+    return b"P6 %d %d 255\n" % (w, h) + rgb.tobytes()
+
+
+class LiquidityHeatmap(tk.Frame):
+    """
+    Heatmap de la liquidité au carnet (historique échantillonné par le moteur).
+    Une seule image Canvas, recalculée en NumPy puis blittée : pas un rectangle par cellule.
+    """
+    def __init__(self, parent, controller, symbol, width=160):
+        super().__init__(parent, bg=COLOR_BG, width=width)
+        self.controller = controller
+        self.sym = symbol
+        self.aggr = controller.get_aggregator()
+        self.pack_propagate(False)
+
+        self.canvas = tk.Canvas(self, bg=COLOR_BG, highlightthickness=0)
+        self.canvas.pack(fill="both", expand=True)
+        self._img = tk.PhotoImage(master=self)
+        self._item = self.canvas.create_image(0, 0, anchor="nw", image=self._img)
+        self._last_line = self.canvas.create_line(0, 0, 0, 0, fill=COLOR_LAST, dash=(1, 3))
+        self._drawn_sig = None; self._drawn_at = 0.0
+        self.canvas.bind("<Configure>", lambda e: setattr(self, "_drawn_sig", None))
+
+    def refresh(self):
+        """Redessine sur nouvel échantillon ou nouveau dernier prix (ou après GUI_REFRESH_MAX_AGE_SEC)."""
+        snap = self.aggr.snapshot(self.sym)
+        sig = (self.aggr.liquidity_version(self.sym), snap.last_tick if snap else None)
+        now = time.time()
+        if sig == self._drawn_sig and now - self._drawn_at < config.GUI_REFRESH_MAX_AGE_SEC: return False
+        self._drawn_sig = sig; self._drawn_at = now
+        self.render(snap, now)
+        return True
+
+    def render(self, snap, now):
+        w = self.canvas.winfo_width(); h = self.canvas.winfo_height()
+        rows = max(1, h // HEAT_TICK_PX); cols = max(1, w // HEAT_SLOT_PX)
+        center = snap.last_tick if snap else None
+        grid = None
+        if center is not None:
+            hi = center + rows // 2; lo = hi - rows + 1
+            grid = self.aggr.get_liquidity_window(self.sym, now - HEAT_VIEW_SEC, now, cols, lo, hi)
+        if grid is None:
+            self.canvas.itemconfigure(self._item, state="hidden"); self.canvas.coords(self._last_line, 0, 0, 0, 0)
+            return
+        self._img.configure(data=heat_ppm(grid), format="PPM")
+        self.canvas.itemconfigure(self._item, state="normal")
+        y = (hi - center) * HEAT_TICK_PX + HEAT_TICK_PX / 2
+        self.canvas.coords(self._last_line, 0, y, w, y)